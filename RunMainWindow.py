@@ -9,7 +9,6 @@ import sys
 import argparse
 import re
 import threading
-from datetime import datetime
 
 from PyQt5.QtWidgets import QMainWindow, QApplication, QInputDialog, QErrorMessage, QMessageBox
 from PyQt5.QtCore import QThreadPool
@@ -19,15 +18,22 @@ from view.TimeUpdater import TimeUpdater
 from view.FirmwareInstaller import FirmwareInstaller
 import view.MainWindow as Main
 from components.LDBoardTester import LDBoardTester
+from components.Clock import now
+from components.Journal import BatchJournal
+from components.IOUtilities import JOURNAL_PATH, SIMULATED_JOURNAL_PATH
 
 
 class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
-    def __init__(self, parent=None, debug=False):
+    def __init__(self, parent=None, debug=False, stop_on_failure=False, retest_failed=False, rolling=False):
         super(SeaLionGUI, self).__init__(parent)
         self.setupUi(self)
 
         # for signalling
         self.debug = debug
+        # rolling loading: a finished tray takes a new board while the others go on
+        self.rolling = rolling
+        self.worker = None
+        self.__swaps = list()   # finished trays waiting for the operator
         self.pause = False
         self.cancel = False
         self.test_start = None
@@ -40,6 +46,8 @@ class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
         self.objects = dict()
         for i in range(6):
             self.objects[i] = dict()
+            self.objects[i]['stop_on_failure'] = stop_on_failure
+            self.objects[i]['retest_failed'] = retest_failed
 
         # assign each object to the dictionary
         # LD2100 Tray 1 : GPIO address 3
@@ -155,6 +163,7 @@ class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
         self.update_debug_text(-1, "...")
         proceed = True
         for i in range(6):
+            self.objects[i]['checkpoint'] = None
             board = "Tray {}".format(i + 1)
             mac, ok = QInputDialog.getText(self, 'MAC', "Enter MAC Address ({})".format(board))
             if not ok:
@@ -185,30 +194,74 @@ class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
                 proceed = False
                 break
         if proceed:
-            # disable buttons
-            self.set_cmd_btn_diabled(-1, True)
-            self.set_info_btn_disabled(-1, True)
-            # enable pause/cancel
-            self.pause_btn.setDisabled(False)
-            self.cancel_btn.setDisabled(False)
-            # starting the worker
-            worker = SeaLionThread(self)
-            worker.signals.finished.connect(self._signal_test_finished)
-            worker.signals.alert.connect(self._signal_alert)
-            worker.signals.debug_update.connect(self._signal_debug_update)
-            worker.signals.update.connect(self._signal_update)
-            self.thread_pool.start(worker)
-            # test started
-            self.testing = True
-            self.test_start = datetime.now()
-            time_thread = TimeUpdater(self)
-            time_thread.signals.status_bar.connect(self._signal_status_bar)
-            self.thread_pool.start(time_thread)
+            self.__start_worker()
             return
         else:
             self.reset_trays()
         self.resume_btn.setDisabled(False)
 
+    def offer_resume(self) -> None:
+        """
+        Offers to resume the batch the journal says did not finish (crash, reboot, cancel).
+        Its trays keep their identifiers and results, and only their unfinished tests run.
+        :return: None
+        """
+        # debug runs have their own journal (see SeaLionThread)
+        path = SIMULATED_JOURNAL_PATH if self.debug else JOURNAL_PATH
+        checkpoint = BatchJournal.load(path)
+        if not checkpoint:
+            return
+        lines = ["The batch started {} did not finish.".format(checkpoint.started)]
+        for i, manifest in sorted(checkpoint.trays.items()):
+            lines.append("Tray {}: {} ({}), {} tests done{}".format(
+                i + 1, manifest['identifier'], manifest['serial'], len(checkpoint.steps[i]),
+                ", board at {}".format(checkpoint.ips[i]) if i in checkpoint.ips else ""))
+        lines.append("Resume it?")
+        answer = QMessageBox.question(self, "Resume batch", "\n".join(lines), QMessageBox.Yes | QMessageBox.No)
+        if answer != QMessageBox.Yes:
+            BatchJournal.abandon(path)
+            return
+        self.resume_btn.setDisabled(True)
+        self.update_progress(-1, 0, 1)
+        for i in range(6):
+            if i not in checkpoint.trays:
+                self.objects[i]["active"] = False
+                self.set_status(i, self.INACTIVE)
+                continue
+            self.objects[i].update(checkpoint.trays[i])
+            self.objects[i]["active"] = True
+            self.objects[i]["checkpoint"] = checkpoint
+            self.set_status(i, self.PASSING)
+            self.update_debug_text(i, "Resuming")
+        self.__start_worker()
+
+    def __start_worker(self) -> None:
+        """
+        Tests the active trays on a SeaLionThread.
+        :return: None
+        """
+        # disable buttons
+        self.set_cmd_btn_diabled(-1, True)
+        self.set_info_btn_disabled(-1, True)
+        # enable pause/cancel
+        self.pause_btn.setDisabled(False)
+        self.cancel_btn.setDisabled(False)
+        # starting the worker
+        worker = SeaLionThread(self)
+        worker.signals.finished.connect(self._signal_test_finished)
+        worker.signals.alert.connect(self._signal_alert)
+        worker.signals.debug_update.connect(self._signal_debug_update)
+        worker.signals.update.connect(self._signal_update)
+        worker.signals.tray_finished.connect(self._signal_tray_finished)
+        self.worker = worker
+        self.thread_pool.start(worker)
+        # test started
+        self.testing = True
+        self.test_start = now()
+        time_thread = TimeUpdater(self)
+        time_thread.signals.status_bar.connect(self._signal_status_bar)
+        self.thread_pool.start(time_thread)
+
     def resume_btn_handler(self) -> None:
         self.thread_lock.acquire()
         print("Resume")
@@ -368,6 +421,45 @@ class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
         """
         self.status_bar.showMessage(message)
 
+    def _signal_tray_finished(self, tray: int) -> None:
+        """
+        tray: int, finished in rolling loading. The operator is asked for the next board, one tray at a time.
+        """
+        self.__swaps.append(tray)
+        if len(self.__swaps) > 1:
+            # asked once the current prompt is answered
+            return
+        while self.__swaps:
+            self.__swap_board(self.__swaps[0])
+            self.__swaps.pop(0)
+
+    def __swap_board(self, i: int) -> None:
+        """
+        Prompts for the board swapped into a finished tray and admits it into the running batch.
+        No MAC (or a cancelled prompt) leaves the tray empty.
+        :return: None
+        """
+        board = "Tray {}".format(i + 1)
+        self.set_info_btn_disabled(i, False)
+        mac, ok = QInputDialog.getText(self, 'MAC', "{} finished. Swap the board and enter its MAC Address"
+                                       .format(board))
+        if ok and len(mac) > 0 and not self.debug:
+            mac, ok = self.__prompt_mac_address(mac, board)
+        serial, ok1 = '', False
+        if ok and len(mac) > 0:
+            serial, ok1 = QInputDialog.getText(self, "Serial", "Enter Serial ID ({})".format(board))
+        if not (ok1 and len(serial) > 0) or self.cancel:
+            self.worker.withdraw(i)
+            return
+        self.objects[i]["mac"] = mac
+        self.objects[i]["serial"] = serial
+        self.objects[i]["active"] = True
+        self.set_info_btn_disabled(i, True)
+        self.set_status(i, self.PASSING)
+        self.update_progress(i, 0, 1)
+        self.update_debug_text(i, "Waiting to start")
+        self.worker.admit(i)
+
     def _signal_test_finished(self) -> None:
         """
         signaled from thread that all tests are completed
@@ -449,7 +541,7 @@ class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
         self.thread_pool.start(installer)
         # test started
         self.testing = True
-        self.test_start = datetime.now()
+        self.test_start = now()
         time_thread = TimeUpdater(self)
         time_thread.signals.status_bar.connect(self._signal_status_bar)
         self.thread_pool.start(time_thread)
@@ -457,10 +549,11 @@ class SeaLionGUI(QMainWindow, Main.Ui_MainWindow):
         pass
 
 
-def main(debug=False) -> None:
+def main(debug=False, stop_on_failure=False, retest_failed=False, rolling=False) -> None:
     app = QApplication(sys.argv)
-    window = SeaLionGUI(debug=debug)
+    window = SeaLionGUI(debug=debug, stop_on_failure=stop_on_failure, retest_failed=retest_failed, rolling=rolling)
     window.show()
+    window.offer_resume()
     app.exec_()
 
 
@@ -470,7 +563,13 @@ if __name__ == '__main__':
     # verbosity
     parser.add_argument('--debug', '-d', action="count",
                         help='Counts number of `v`s in flag. More flags is more verbose.')
+    parser.add_argument('--stop-on-failure', action='store_true',
+                        help="Skip a tray's remaining tests after its first failure")
+    parser.add_argument('--retest-failed', action='store_true',
+                        help='Run only the tests each board failed or never ran')
+    parser.add_argument('--rolling', action='store_true',
+                        help='Load a new board into each tray as it finishes, without waiting for the batch')
     args = vars(parser.parse_args())
     if args['debug']:
-        main(True)
-    main()
+        main(True, args['stop_on_failure'], args['retest_failed'], args['rolling'])
+    main(stop_on_failure=args['stop_on_failure'], retest_failed=args['retest_failed'], rolling=args['rolling'])
@@ -5,7 +5,15 @@ Author:
     Zachary Smith
 """
 import logging
+import math
+import threading
 import time
+from collections import deque, namedtuple
+
+# every measurement is reduced with numpy (see statistics), installed by install.sh
+import numpy as np
+
+from components.Clock import sleep, monotonic
 
 _LOGGER = logging.getLogger()
 
@@ -20,6 +28,32 @@ except ModuleNotFoundError:
 #   4 = +/-1.024V
 #   8 = +/-0.512V
 #  16 = +/-0.256V
+FULL_SCALE = {2/3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+# volts per count, the ADS1015's 12 bit positive range is 0x7FF
+_VOLTS_PER_COUNT = {gain: volts / 0x7FF for gain, volts in FULL_SCALE.items()}
+
+# Creates the ADS1015 driver. Replaced by a simulated station with `set_backend`.
+_BACKEND = None
+# Session shared by every reading (see session())
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def set_backend(factory):
+    """
+    Replaces the Adafruit ADS1015 driver.
+
+    Args:
+        factory: callable returning an object with the Adafruit ADS1015 interface, or None for the real chip
+    """
+    global _BACKEND, _SESSION
+    with _SESSION_LOCK:
+        _BACKEND = factory
+        _SESSION = None
+
+
+def _ads1015():
+    return _BACKEND() if _BACKEND else Adafruit_ADS1x15.ADS1015()
 
 
 def translate(value, gain) -> float:
@@ -33,19 +67,254 @@ def translate(value, gain) -> float:
     Returns:
         float voltage
     """
-    ratio = value / 0x7FF
-    if gain == 2/3:
-        return ratio * 6.144
-    if gain == 1:
-        return ratio * 4.096
-    if gain == 2:
-        return ratio * 2.048
-    if gain == 4:
-        return ratio * 1.024
-    if gain == 8:
-        return ratio * 0.512
-    if gain == 16:
-        return ratio * 0.256
+    return value * _VOLTS_PER_COUNT[gain]
+
+
+class Measurement(namedtuple('Measurement', ['mean', 'std', 'n', 'min', 'max', 'rejected', 'interval'])):
+    """
+    Statistics of the accepted samples of a measurement, in volts.
+    `interval` is the half width of the confidence interval of the mean, `rejected` the outliers dropped.
+    """
+
+    def __str__(self):
+        return '{:.4f} V +/- {:.4f} (std {:.4f}, n {}, min {:.4f}, max {:.4f}, {} rejected)'\
+            .format(self.mean, self.interval, self.std, self.n, self.min, self.max, self.rejected)
+
+
+def statistics(raw, gain=1, z=3.0, outliers=3.5) -> Measurement:
+    """
+    Statistics of raw samples, in volts.
+
+    Args:
+        raw: Raw values
+        gain: value (see above)
+        z: Width of the confidence interval in standard errors (3 is about 99.7%)
+        outliers: Samples further than this many robust deviations from the median are rejected
+
+    Returns:
+        Measurement
+    """
+    # one count, readings only differ in steps of it
+    count = _VOLTS_PER_COUNT[gain]
+    volts = np.asarray(raw, dtype=float) * count
+    deviation = np.abs(volts - np.median(volts))
+    # median absolute deviation, scaled to a standard deviation
+    spread = max(outliers * 1.4826 * np.median(deviation), 2 * count)
+    accepted = volts[deviation <= spread]
+    std = float(np.std(accepted, ddof=1)) if len(accepted) > 1 else 0.0
+    return Measurement(float(np.mean(accepted)), std, len(accepted), float(np.min(accepted)),
+                       float(np.max(accepted)), len(volts) - len(accepted), z * std / math.sqrt(len(accepted)))
+
+
+class Session(object):
+    """
+    One handle on the ADS1015, opened once. Samples in continuous-conversion mode: the chip is
+    configured when the input or gain changes, then only the conversion register is read, once per
+    conversion period, instead of a configure/convert/poll/read cycle per single-shot sample.
+    """
+    DATA_RATE = 1600    # samples per second (128, 250, 490, 920, 1600, 2400 or 3300)
+    SAMPLES = 10        # samples averaged per reading
+
+    def __init__(self, data_rate=DATA_RATE, samples=SAMPLES):
+        """
+        Args:
+            data_rate: Conversion rate in continuous mode
+            samples: Samples averaged per reading
+        """
+        self.data_rate = data_rate
+        self.samples = samples
+        self.__adc = _ads1015()
+        self.__lock = threading.Lock()
+        self.__mode = None  # (differential, input, gain) being converted
+        self.conversions = 0
+
+    def sample(self, channel, gain=1, differential=False, samples=None) -> list:
+        """
+        Raw samples of one input.
+
+        Args:
+            channel: Pin [0-3], or differential pair [0-3] (0 is 0-1)
+            gain: value (see above)
+            differential: Read a differential pair
+            samples: Number of samples (Session.samples by default)
+
+        Returns:
+            list of raw values
+        """
+        samples = samples if samples else self.samples
+        with self.__lock:
+            values = list()
+            if self.__mode != (differential, channel, gain):
+                start = self.__adc.start_adc_difference if differential else self.__adc.start_adc
+                # the first conversion after reconfiguring is returned by start
+                values.append(start(channel, gain=gain, data_rate=self.data_rate))
+                self.__mode = (differential, channel, gain)
+            else:
+                # the conversion in flight may have started before the input was switched
+                sleep(1 / self.data_rate)
+            while len(values) < samples:
+                sleep(1 / self.data_rate)
+                values.append(self.__adc.get_last_result())
+            self.conversions += len(values)
+            return values
+
+    def read(self, pin, gain=1, samples=None) -> float:
+        """
+        Average voltage on a pin.
+
+        Args:
+            pin: Pin number [0-3]
+            gain: value (see above)
+            samples: Number of samples (Session.samples by default)
+        """
+        values = self.sample(pin, gain, samples=samples)
+        translated = translate(sum(values) / len(values), gain)
+        _LOGGER.debug('ADC::read:: Pin {}; Raw {}; Translated (gain {}) {} V'
+                      .format(pin, sum(values) / len(values), gain, translated))
+        return translated
+
+    def read_diff(self, gain=1, differential=0, samples=None) -> float:
+        """
+        Average voltage across a differential pair (0-1 by default).
+
+        Args:
+            gain: value (see above)
+            differential: Pair [0-3] (0 is 0-1)
+            samples: Number of samples (Session.samples by default)
+        """
+        values = self.sample(differential, gain, differential=True, samples=samples)
+        translated = translate(sum(values) / len(values), gain)
+        _LOGGER.debug('ADC::read_diff:: Raw {}; Translated (gain {}) {} V'
+                      .format(sum(values) / len(values), gain, translated))
+        return translated
+
+    def measure(self, channel, gain=1, differential=False, low=None, high=None, min_samples=4, max_samples=40,
+                batch=4, z=3.0, outliers=3.5) -> Measurement:
+        """
+        Samples until the mean is confidently on one side of the caller's limits. A reading far from
+        a limit stops after min_samples, one close to it takes more, up to max_samples.
+        Without limits, Session.samples are taken.
+
+        Args:
+            channel: Pin [0-3], or differential pair [0-3] (0 is 0-1)
+            gain: value (see above)
+            differential: Read a differential pair
+            low: Lower pass limit in volts
+            high: Upper pass limit in volts
+            min_samples: Samples before stopping early
+            max_samples: Samples at most
+            batch: Samples taken between checks
+            z: Width of the confidence interval in standard errors (3 is about 99.7%)
+            outliers: Samples further than this many robust deviations from the median are rejected
+
+        Returns:
+            Measurement
+        """
+        limits = [limit for limit in (low, high) if limit is not None]
+        target = max_samples if limits else self.samples
+        raw = list()
+        while True:
+            raw.extend(self.sample(channel, gain, differential, min(batch, target - len(raw))))
+            result = statistics(raw, gain, z, outliers)
+            if len(raw) >= target:
+                break
+            if limits and len(raw) >= min_samples and all(abs(result.mean - limit) > result.interval
+                                                          for limit in limits):
+                break
+        _LOGGER.debug('ADC::measure:: {} {} (gain {}): {}'
+                      .format('Pair' if differential else 'Pin', channel, gain, result))
+        return result
+
+    def stop(self):
+        """
+        Returns the chip to power-down single-shot mode.
+        """
+        with self.__lock:
+            if self.__mode is not None:
+                self.__adc.stop_adc()
+                self.__mode = None
+
+
+class Sampler(object):
+    """
+    Samples one input in the background into a timestamped ring buffer, so a test can ask
+    afterwards what the input was over a window of time (station clock), e.g. while the board rebooted.
+    The caller keeps the ADC (and the board mux) for as long as the sampler runs.
+    """
+
+    def __init__(self, channel, gain=1, differential=False, interval=.01, capacity=4096):
+        """
+        Args:
+            channel: Pin [0-3], or differential pair [0-3] (0 is 0-1)
+            gain: value (see above)
+            differential: Read a differential pair
+            interval: Seconds between samples (at least one conversion)
+            capacity: Samples kept, older ones are dropped
+        """
+        self.channel = channel
+        self.gain = gain
+        self.differential = differential
+        self.interval = interval
+        self.__samples = deque(maxlen=capacity)   # (time, raw)
+        self.__lock = threading.Lock()
+        self.__running = False
+        self.__thread = None
+
+    def start(self):
+        self.__running = True
+        # named after the thread sampling, so the records land in its tray's log
+        self.__thread = threading.Thread(target=self._run, name='{}-ADC-sampler'.format(
+            threading.current_thread().name), daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__running = False
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        adc = session()
+        while self.__running:
+            raw = adc.sample(self.channel, self.gain, self.differential, samples=1)[0]
+            with self.__lock:
+                self.__samples.append((monotonic(), raw))
+            sleep(max(0, self.interval - 1 / adc.data_rate))
+
+    def window(self, start, end, z=3.0, outliers=3.5):
+        """
+        Statistics of the samples taken between two station clock times.
+
+        Args:
+            start: Clock.monotonic() at the start of the window
+            end: Clock.monotonic() at its end
+            z: See statistics
+            outliers: See statistics
+
+        Returns:
+            Measurement, None if nothing was sampled in the window
+        """
+        with self.__lock:
+            raw = [value for time, value in self.__samples if start <= time <= end]
+        return statistics(raw, self.gain, z, outliers) if raw else None
+
+
+def session() -> Session:
+    """
+    The station's ADC session, opened on first use.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = Session()
+        return _SESSION
 
 
 def read(pin, gain=1):
@@ -59,17 +328,7 @@ def read(pin, gain=1):
     Returns:
         Float value
     """
-    adc = Adafruit_ADS1x15.ADS1015()
-    val = 0
-    translated = 0
-    for i in range(10):
-        raw = adc.read_adc(pin, gain)
-        val += raw
-        translated += translate(raw, gain)
-    val = val / 10
-    translated = translated / 10
-    _LOGGER.debug('ADC::read:: Pin {}; Raw {}; Translated (gain {}) {} V'.format(pin, val, gain, translated))
-    return translated
+    return session().read(pin, gain)
 
 
 def read_diff(gain=1):
@@ -82,17 +341,7 @@ def read_diff(gain=1):
     Returns:
         Float value
     """
-    adc = Adafruit_ADS1x15.ADS1015()
-    translated = 0
-    val = 0
-    for i in range(10):
-        raw = adc.read_adc_difference(0, gain=gain)
-        val += raw
-        translated += translate(raw, gain)
-    translated = translated / 10
-    val = val / 10
-    _LOGGER.debug('ADC::read_diff:: Raw {}; Translated (gain {}) {} V'.format(val, gain, translated))
-    return translated
+    return session().read_diff(gain)
 
 
 if __name__ == "__main__":
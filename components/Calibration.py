@@ -0,0 +1,182 @@
+"""
+components/Calibration.py
+
+Author:
+    Zachary Smith
+"""
+import logging
+import statistics
+
+from components.GPIO import GPIO
+from components.LDBoardTester import LDBoardTester
+from components.ModBus import ModBus
+
+_LOGGER = logging.getLogger()
+
+
+class SettleCalibration(object):
+    """
+    Measures how long the emulators and the RS485 mux need after switching, against a known-good board.
+    Each transition the tests make is repeated with shorter and shorter delays before reading;
+    the shortest delay that still reads like a fully settled circuit, times a margin, is its settle time.
+    """
+
+    # delays tried, longest first (seconds)
+    DELAYS = [1.0, .5, .2, .1, .05, .02, .01, 0]
+    # delay that certainly lets any circuit settle
+    SETTLED = 2.0
+    # the states the tests walk through, and where the other emulator stays meanwhile (see LDBoardTester)
+    WALKS = {
+        GPIO.LENGTH_EMULATOR: ([0, 1, 2, 3, 4, 5], (GPIO.SHORT_EMULATOR, 0)),
+        GPIO.SHORT_EMULATOR: ([0, 1, 2, 3, 4, 5], (GPIO.LENGTH_EMULATOR, 6)),
+    }
+    RS485_OFF = 3
+
+    def __init__(self, gpio: GPIO, tester: LDBoardTester, board_type: str, address: int, repeats=3, margin=1.5):
+        """
+        Args:
+            gpio: GPIO instance with the board mux on the known-good board
+            tester: LDBoardTester connected to the board's console
+            board_type: LD2100 | LD5200
+            address: GPIO.BOARD address of the board
+            repeats: Readings that must all agree at a delay
+            margin: Factor applied to the shortest stable delay
+        """
+        self.gpio = gpio
+        self.tester = tester
+        self.board_type = board_type
+        self.address = address
+        self.repeats = repeats
+        self.margin = margin
+
+    def _switch(self, what, frm, to, delay):
+        self.gpio.stage(what, frm)
+        self.gpio.commit(settle=self.SETTLED)
+        self.gpio.stage(what, to)
+        self.gpio.commit(settle=delay)
+
+    def _scan(self, what, transition, read, stable) -> float:
+        """
+        Tries DELAYS on one transition until a reading is off.
+
+        Args:
+            what: Selector
+            transition: (from state, to state)
+            read: Callable returning a reading
+            stable: Callable telling whether a reading agrees with the settled one
+
+        Returns:
+            Shortest stable delay, None if even the longest was not stable
+        """
+        shortest = None
+        for delay in self.DELAYS:
+            for _ in range(self.repeats):
+                self._switch(what, transition[0], transition[1], delay)
+                reading = read()
+                if not stable(reading):
+                    _LOGGER.info('SettleCalibration::_scan:: {} {}>{} unstable at {} s (read {}).'
+                                 .format(what, transition[0], transition[1], delay, reading))
+                    return shortest
+            shortest = delay
+        return shortest
+
+    def _settle(self, what, transition, shortest):
+        if shortest is None:
+            _LOGGER.warning('SettleCalibration::_settle:: {} {}>{} never settled within {} s, keeping {} s.'
+                            .format(what, transition[0], transition[1], self.DELAYS[0], GPIO.settle_time_of(what)))
+            return None
+        settle = round(shortest * self.margin, 3)
+        _LOGGER.info('SettleCalibration::_settle:: {} {}>{}: {} s.'.format(what, transition[0], transition[1], settle))
+        return settle
+
+    def calibrate_emulator(self, what) -> dict:
+        """
+        Calibrates the transitions of an emulator, read back with the board's `adc1`.
+
+        Args:
+            what: GPIO.LENGTH_EMULATOR | GPIO.SHORT_EMULATOR
+
+        Returns:
+            {(from state, to state): seconds}
+        """
+        states, (other, other_state) = self.WALKS[what]
+        # the tests' tolerance on the loops (length) or the leak distance (short), 300 ohms at the board
+        tolerance, fields = (.05, (0, 1)) if what == GPIO.LENGTH_EMULATOR else (.10, (2,))
+        self.gpio.stage(other, other_state)
+        self.gpio.commit(settle=self.SETTLED)
+        table = dict()
+        for frm, to in zip(states, states[1:] + states[:1]):
+            # the fully settled reading is the reference
+            references = list()
+            for _ in range(self.repeats):
+                self._switch(what, frm, to, self.SETTLED)
+                references.append(self.tester.read_cable())
+            if not all(references):
+                _LOGGER.error('SettleCalibration::calibrate_emulator:: No cable reading for {} {}>{}.'
+                              .format(what, frm, to))
+                continue
+            reference = [statistics.median(r[i] for r in references) for i in fields]
+
+            def stable(reading):
+                return bool(reading) and all(abs(reading[i] - ref) <= max(ref * tolerance, 300)
+                                             for i, ref in zip(fields, reference))
+            settle = self._settle(what, (frm, to), self._scan(what, (frm, to), self.tester.read_cable, stable))
+            if settle is not None:
+                table[(frm, to)] = settle
+        # leave both emulators open, like the tests do
+        self.gpio.stage(GPIO.LENGTH_EMULATOR, 7)
+        self.gpio.stage(GPIO.SHORT_EMULATOR, 7)
+        self.gpio.commit()
+        return table
+
+    def calibrate_rs485(self) -> dict:
+        """
+        Calibrates the RS485 mux by reading the board's ModBus register after each switch.
+        An LD5200 answers on every port in `modbustest`, an LD2100 only on its own port.
+
+        Returns:
+            {(from state, to state): seconds}
+        """
+        if self.board_type == LDBoardTester.LD5200:
+            answers = dict(LDBoardTester.MODBUS_PORTS)
+            self.tester.start_modbustest()
+        else:
+            answers = {LDBoardTester.rs485_ports[self.address]: LDBoardTester.MODBUS_LD2100}
+        modbus = ModBus(device_file=LDBoardTester.modbus_device, timeout=1)
+        table = dict()
+        try:
+            for to, answer in answers.items():
+                def read():
+                    response = modbus.read_holding_registers(LDBoardTester.MODBUS_REGISTER, 1,
+                                                             LDBoardTester.MODBUS_SLAVE)
+                    return response.registers[0] if response else None
+                for frm in [port for port in range(4) if port != to]:
+                    shortest = self._scan(GPIO.RS485, (frm, to), read, lambda reading: reading == answer)
+                    settle = self._settle(GPIO.RS485, (frm, to), shortest)
+                    if settle is not None:
+                        table[(frm, to)] = settle
+        finally:
+            modbus.close()
+            if self.board_type == LDBoardTester.LD5200:
+                self.tester.stop_modbustest()
+            self.gpio.stage(GPIO.RS485, self.RS485_OFF)
+            self.gpio.commit()
+        return table
+
+    def run(self, rs485=True) -> dict:
+        """
+        Calibrates the emulators (and the RS485 mux), and saves the table GPIO loads at startup.
+
+        Args:
+            rs485: Include the RS485 mux (needs the ModBus adapter)
+
+        Returns:
+            {selector: {(from state, to state): seconds}}
+        """
+        table = dict()
+        for what in (GPIO.LENGTH_EMULATOR, GPIO.SHORT_EMULATOR):
+            table[what] = self.calibrate_emulator(what)
+        if rs485:
+            table[GPIO.RS485] = self.calibrate_rs485()
+        GPIO.save_settle_table(table)
+        return table
@@ -0,0 +1,101 @@
+"""
+components/Clock.py
+
+Author:
+    Zachary Smith
+"""
+import time
+from datetime import datetime, timedelta
+
+
+class Clock(object):
+    """
+    Station clock. Everything that waits or timestamps goes through the active clock
+    (see `set_clock`) so a simulated station can run faster than wall time.
+    """
+
+    def monotonic(self) -> float:
+        """
+        Seconds from an arbitrary start, never going backwards.
+        """
+        return time.monotonic()
+
+    def now(self) -> datetime:
+        """
+        Current date and time.
+        """
+        return datetime.now()
+
+    def sleep(self, seconds):
+        """
+        Blocks the calling thread.
+        """
+        time.sleep(seconds)
+
+    def wait(self, condition, timeout=None):
+        """
+        Waits on a threading.Condition (held by the caller).
+
+        Returns:
+            False if the timeout expired
+        """
+        return condition.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """
+    Clock running `speed` times faster than wall time. Relative timing between
+    threads is preserved, so a realistic simulation keeps its shape but finishes sooner.
+    """
+
+    def __init__(self, speed=100.0):
+        """
+        Args:
+            speed: Virtual seconds per wall second
+        """
+        self.speed = speed
+        self.__wall_start = time.monotonic()
+        self.__start = datetime.now()
+
+    def monotonic(self) -> float:
+        return self.__wall_start + (time.monotonic() - self.__wall_start) * self.speed
+
+    def now(self) -> datetime:
+        return self.__start + timedelta(seconds=(time.monotonic() - self.__wall_start) * self.speed)
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def wait(self, condition, timeout=None):
+        return condition.wait(None if timeout is None else timeout / self.speed)
+
+
+_CLOCK = Clock()
+
+
+def get_clock() -> Clock:
+    """
+    Returns the active station clock.
+    """
+    return _CLOCK
+
+
+def set_clock(clock: Clock):
+    """
+    Replaces the active station clock. Do this before a batch starts.
+    """
+    global _CLOCK
+    _CLOCK = clock
+
+
+def monotonic() -> float:
+    return _CLOCK.monotonic()
+
+
+def now() -> datetime:
+    return _CLOCK.now()
+
+
+def sleep(seconds):
+    _CLOCK.sleep(seconds)
@@ -0,0 +1,114 @@
+"""
+components/ConnectionPool.py
+
+Author:
+    Zachary Smith
+"""
+import logging
+import threading
+from collections import namedtuple
+
+from components.ModBus import ModBus
+from components.Serial import Serial
+
+_LOGGER = logging.getLogger()
+
+# Use of one pooled device file, see ConnectionPool.statistics
+#   opened: times the port was opened
+#   reused: leases served by the port already open
+PoolStatistics = namedtuple('PoolStatistics', ['opened', 'reused'])
+
+
+class ConnectionPool(object):
+    """
+    Keeps one open handle per device file for the life of a batch and leases it to the testers in turn.
+    The Scheduler resource behind the device (RS232, RS485) makes a lease exclusive: a tester leases
+    the handle after acquiring the resource and lets go of it before releasing the resource.
+    Between leases the handle is reset for the next board rather than reopened.
+    """
+
+    def __init__(self):
+        self.__handles = dict()     # device file -> Serial | ModBus
+        self.__counts = dict()      # device file -> [opened, reused]
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __count(self, device_file, opened: bool):
+        counts = self.__counts.setdefault(device_file, [0, 0])
+        counts[0 if opened else 1] += 1
+
+    def serial(self, device_file, safe_delays=False, state=Serial.UNKNOWN) -> Serial:
+        """
+        Leases the console port. A port already open is handed over to the board in `state`
+        (see Serial.handover), otherwise it is opened and verified.
+
+        Args:
+            device_file: e.g. /dev/rleRS232
+            safe_delays: See Serial
+            state: Last known state of the leasing tester's console
+
+        Returns:
+            Serial
+        """
+        with self.__lock:
+            handle = self.__handles.get(device_file)
+            if handle is None:
+                handle = Serial(device_file, safe_delays)
+                self.__handles[device_file] = handle
+                self.__count(device_file, True)
+                return handle
+            if not handle.is_open:
+                handle.handover(state)
+                handle.open()
+                self.__count(device_file, True)
+                return handle
+            self.__count(device_file, False)
+        handle.handover(state)
+        return handle
+
+    def modbus(self, device_file, timeout=1) -> ModBus:
+        """
+        Leases the ModBus adapter, opening it on first use.
+
+        Args:
+            device_file: e.g. /dev/rleRS485
+            timeout: Seconds per request (first lease only)
+
+        Returns:
+            ModBus
+        """
+        with self.__lock:
+            handle = self.__handles.get(device_file)
+            if handle is None:
+                handle = ModBus(device_file=device_file, timeout=timeout)
+                self.__handles[device_file] = handle
+                self.__count(device_file, True)
+                return handle
+            self.__count(device_file, False)
+        handle.reset()
+        return handle
+
+    def statistics(self) -> dict:
+        """
+        Returns:
+            dict of device file -> PoolStatistics
+        """
+        with self.__lock:
+            return {device_file: PoolStatistics(*counts) for device_file, counts in self.__counts.items()}
+
+    def close(self):
+        """
+        Closes every handle. Leases must have ended.
+        """
+        with self.__lock:
+            handles, self.__handles = self.__handles, dict()
+        for device_file, handle in handles.items():
+            handle.close()
+        for device_file, stats in sorted(self.statistics().items()):
+            _LOGGER.info('ConnectionPool::close:: {} opened {} times, reused {} times.'
+                         .format(device_file, stats.opened, stats.reused))
@@ -4,8 +4,12 @@ components/GPIO.py
 Author:
     Zachary Smith
 """
+import json
 import logging
-from time import sleep
+import os
+
+from components.Clock import sleep
+from components.IOUtilities import SETTLE_TABLE_PATH
 
 _LOGGER = logging.getLogger()
 
@@ -18,18 +22,20 @@ except ModuleNotFoundError:
     _LOGGER.error("Functionality won't work for GPIO.")
 
 
-def state_tuple(num):
+def state_tuple(num, io=None):
     """
     Function to convert number to binary state
     Args:
         num: int
+        io: GPIO library (RPi.GPIO by default)
 
     Returns:
         tuple of binary states from LSB to MSB
     """
+    io = io if io else _gpio
     ret = []
     for t in [0b100, 0b010, 0b001]:
-        ret.append(_gpio.HIGH if (num & t) > 0 else _gpio.LOW)
+        ret.append(io.HIGH if (num & t) > 0 else io.LOW)
     return tuple(ret)
 
 
@@ -66,7 +72,9 @@ class GPIO(object):
         #          C   B   A
         'pins_2': [31, 32, 33],
         'present_state': tuple(),
-        'state': tuple()
+        'state': tuple(),
+        # routes RS232 and the relay inputs, both banks switch relays
+        'settle': 50 / 1000
     }
 
     # Truth table
@@ -84,7 +92,9 @@ class GPIO(object):
         #        C   B   A
         'pins': [13, 15, 16],
         'present_state': tuple(),
-        'state': tuple()
+        'state': tuple(),
+        # resistor ladder on relays (the short test gives the leak reading longer, see test_short_detector)
+        'settle': 50 / 1000
     }
 
     # Truth table
@@ -102,7 +112,9 @@ class GPIO(object):
         #        C   B   A
         'pins': [18, 19, 21],
         'present_state': tuple(),
-        'state': tuple()
+        'state': tuple(),
+        # resistor ladder on relays
+        'settle': 50 / 1000
     }
 
     # Truth table
@@ -120,9 +132,14 @@ class GPIO(object):
         #        C   B   A
         'pins': [22, 23, 24],
         'present_state': tuple(),
-        'state': tuple()
+        'state': tuple(),
+        # logic level mux, the RS485 transceivers need a moment to see a quiet bus
+        'settle': 100 / 1000
     }
 
+    # Calibrated settle times: {selector: {(from state, to state): seconds}} (see components/Calibration.py)
+    __transitions = dict()
+
     # Inputs for Relay Test
     # Mapping
     _relays = {
@@ -130,11 +147,15 @@ class GPIO(object):
         'pins': [35, 36, 37, 38]
     }
 
-    def __init__(self):
+    def __init__(self, backend=None):
         """
         Initializes internal settings.
+
+        Args:
+            backend: Object with the RPi.GPIO interface (e.g. a simulated station). RPi.GPIO by default.
         """
-        _gpio.setmode(_gpio.BOARD)
+        self._io = backend if backend else _gpio
+        self._io.setmode(self._io.BOARD)
         # create channel list as combo of other pin lists
         self.__channel_list = list()
         self.__channel_list.extend(self.__board_selector['pins'])
@@ -143,12 +164,110 @@ class GPIO(object):
         self.__channel_list.extend(self.__length_selector['pins'])
         self.__channel_list.extend(self.__rs485_selector['pins'])
         # set as outputs and low
-        _gpio.setup(self.__channel_list, _gpio.OUT)
-        _gpio.setup(self._relays['pins'], _gpio.IN)
-        _gpio.output(self.__channel_list, _gpio.LOW)
+        self._io.setup(self.__channel_list, self._io.OUT)
+        self._io.setup(self._relays['pins'], self._io.IN)
+        self._io.output(self.__channel_list, self._io.LOW)
+        # selector state is kept on the class, match it to the pins just driven low
+        for selector in self.__selectors().values():
+            selector['present_state'] = selector['state'] = state_tuple(0, self._io)
+            selector['present_value'] = selector['value'] = 0
+        if os.path.exists(SETTLE_TABLE_PATH):
+            try:
+                self.load_settle_table(SETTLE_TABLE_PATH)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                # a station without calibration still works, on the default settle times
+                _LOGGER.error('GPIO::__init__:: Settle table {} unusable ({!r}), using default settle times.'
+                              .format(SETTLE_TABLE_PATH, e))
+        # counters
+        self.commits = 0        # calls of commit
+        self.idle_commits = 0   # commits that changed nothing (and did not wait)
+        self.settle_time = 0.0  # seconds waited for circuits to settle
 
     def __del__(self):
-        _gpio.cleanup()
+        self._io.cleanup()
+
+    @classmethod
+    def __selectors(cls) -> dict:
+        return {cls.BOARD: cls.__board_selector,
+                cls.SHORT_EMULATOR: cls.__short_selector,
+                cls.LENGTH_EMULATOR: cls.__length_selector,
+                cls.RS485: cls.__rs485_selector}
+
+    @classmethod
+    def settle_time_of(cls, what, transition=None, default=None) -> float:
+        """
+        Seconds a selector's circuit needs after switching.
+
+        Args:
+            what: Select GPIO.(BOARD | SHORT_EMULATOR | LENGTH_EMULATOR | RS485)
+            transition: (from state, to state), calibrated transitions have their own time
+            default: Seconds for an uncalibrated transition instead of the selector's settle time
+        """
+        default = cls.__selectors()[what]['settle'] if default is None else default
+        return cls.__transitions.get(what, {}).get(transition, default)
+
+    @classmethod
+    def load_settle_table(cls, path=SETTLE_TABLE_PATH):
+        """
+        Loads calibrated settle times, as written by save_settle_table. Nothing is loaded from
+        a table that does not parse (OSError, ValueError, KeyError for an unknown selector).
+        """
+        with open(path) as file:
+            table = json.load(file)
+        loaded = dict()
+        for what, transitions in table.items():
+            if what not in cls.__selectors():
+                raise KeyError(what)
+            loaded[what] = dict()
+            for key, seconds in transitions.items():
+                frm, to = key.split('>')
+                loaded[what][(int(frm), int(to))] = float(seconds)
+        cls.__transitions.update(loaded)
+        _LOGGER.info('GPIO::load_settle_table:: Loaded {} transitions from {}.'
+                     .format(sum(len(t) for t in cls.__transitions.values()), path))
+
+    @classmethod
+    def save_settle_table(cls, table: dict, path=SETTLE_TABLE_PATH):
+        """
+        Stores calibrated settle times and uses them from now on.
+
+        Args:
+            table: {selector: {(from state, to state): seconds}}
+            path: JSON file
+        """
+        with open(path, 'w') as file:
+            json.dump({what: {'{}>{}'.format(*transition): seconds for transition, seconds in sorted(t.items())}
+                       for what, t in table.items()}, file, indent=2)
+        for what, transitions in table.items():
+            cls.__transitions.setdefault(what, dict()).update(transitions)
+
+    @classmethod
+    def set_settle_time(cls, what, seconds: float):
+        """
+        Configures how long commit waits after a selector switched.
+
+        Args:
+            what: Select GPIO.(BOARD | SHORT_EMULATOR | LENGTH_EMULATOR | RS485)
+            seconds: Settle time
+        """
+        cls.__selectors()[what]['settle'] = seconds
+
+    @classmethod
+    def pins(cls, what) -> list:
+        """
+        Pin numbers of a selector, for hardware that has to decode them (simulation).
+
+        Args:
+            what: Select GPIO.(BOARD | SHORT_EMULATOR | LENGTH_EMULATOR | RS485) or 'relays'
+
+        Returns:
+            list of pins C, B, A (I0-I3 for 'relays')
+        """
+        return {cls.BOARD: cls.__board_selector['pins'],
+                cls.SHORT_EMULATOR: cls.__short_selector['pins'],
+                cls.LENGTH_EMULATOR: cls.__length_selector['pins'],
+                cls.RS485: cls.__rs485_selector['pins'],
+                'relays': cls._relays['pins']}[what]
 
     def stage(self, what, state):
         """
@@ -158,45 +277,49 @@ class GPIO(object):
             state: int defining binary state of the selector `what` (Check truth tables)
         """
         _LOGGER.debug('GPIO::stage:: Staging {} into state {}.'.format(what, state))
-        gpio_state = state_tuple(state)
-        if what == self.BOARD:
-            self.__board_selector['state'] = gpio_state
-        elif what == self.SHORT_EMULATOR:
-            self.__short_selector['state'] = gpio_state
-        elif what == self.LENGTH_EMULATOR:
-            self.__length_selector['state'] = gpio_state
-        elif what == self.RS485:
-            self.__rs485_selector['state'] = gpio_state
+        selector = self.__selectors().get(what)
+        if selector is not None:
+            selector['state'] = state_tuple(state, self._io)
+            selector['value'] = state
 
-    def commit(self):
+    def commit(self, settle=None, defaults=None) -> list:
         """
-        Commits the staged changes in one pass.
+        Commits the staged changes in one pass, then waits for the slowest of the
+        switched circuits to settle. Nothing changed, nothing to wait for.
+
+        Args:
+            settle: Seconds to wait instead of the configured settle times (calibration)
+            defaults: {selector: seconds} for its uncalibrated transitions in this commit only
+
+        Returns:
+            list of the selectors that changed
         """
+        changed = list()
+        settles = [0]
         # compare staged state to present
         # only update if not equal
-        if self.__board_selector['present_state'] != self.__board_selector['state']:
-            _LOGGER.debug('GPIO::commit:: Committing changes on `{}`.'.format('board_selector'))
-            # update both pin banks
-            _gpio.output(self.__board_selector['pins'], self.__board_selector['state'])
-            _gpio.output(self.__board_selector['pins_2'], self.__board_selector['state'])
-            self.__board_selector['present_state'] = self.__board_selector['state']
-
-        if self.__short_selector['present_state'] != self.__short_selector['state']:
-            _LOGGER.debug('GPIO::commit:: Committing changes on `{}`.'.format('short_selector'))
-            _gpio.output(self.__short_selector['pins'], self.__short_selector['state'])
-            self.__short_selector['present_state'] = self.__short_selector['state']
-
-        if self.__length_selector['present_state'] != self.__length_selector['state']:
-            _LOGGER.debug('GPIO::commit:: Committing changes on `{}`.'.format('length_selector'))
-            _gpio.output(self.__length_selector['pins'], self.__length_selector['state'])
-            self.__length_selector['present_state'] = self.__length_selector['state']
-
-        if self.__rs485_selector['present_state'] != self.__rs485_selector['state']:
-            _LOGGER.debug('GPIO::commit:: Committing changes on `{}`.'.format('rs485_selector'))
-            _gpio.output(self.__rs485_selector['pins'], self.__rs485_selector['state'])
-            self.__rs485_selector['present_state'] = self.__rs485_selector['state']
-        sleep(50 / 1000)    # sleep for 50 ms to let digital circuits settle
+        for what, selector in self.__selectors().items():
+            if selector['present_state'] == selector['state']:
+                continue
+            _LOGGER.debug('GPIO::commit:: Committing changes on `{}`.'.format(what))
+            self._io.output(selector['pins'], selector['state'])
+            if 'pins_2' in selector:
+                # update both pin banks
+                self._io.output(selector['pins_2'], selector['state'])
+            settles.append(self.settle_time_of(what, (selector['present_value'], selector['value']),
+                                               (defaults or {}).get(what)))
+            selector['present_state'] = selector['state']
+            selector['present_value'] = selector['value']
+            changed.append(what)
+        self.commits += 1
+        if changed:
+            settle = max(settles) if settle is None else settle
+            sleep(settle)
+            self.settle_time += settle
+        else:
+            self.idle_commits += 1
         _LOGGER.debug('GPIO::commit:: Done.')
+        return changed
 
     I0 = 'IO'
     I1 = 'I1'
@@ -210,10 +333,10 @@ class GPIO(object):
         If what == 'last2', a tuple will be returned (I2, I3)
         If what == 'all', a tuple will be returned (I0, I1, I2, I3)
         """
-        i0 = _gpio.input(self._relays['pins'][0])
-        i1 = _gpio.input(self._relays['pins'][1])
-        i2 = _gpio.input(self._relays['pins'][2])
-        i3 = _gpio.input(self._relays['pins'][3])
+        i0 = self._io.input(self._relays['pins'][0])
+        i1 = self._io.input(self._relays['pins'][1])
+        i2 = self._io.input(self._relays['pins'][2])
+        i3 = self._io.input(self._relays['pins'][3])
         if what == self.I0:
             return i0
         elif what == self.I1:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+components/History.py
+
+Author:
+    Zachary Smith
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+
+from components import Clock
+from components.IOUtilities import HISTORY_PATH
+from components.LDBoard import LDBoard
+
+_LOGGER = logging.getLogger()
+
+
+class ResultHistory(object):
+    """
+    Results of every board tested on the station, one JSON line per run, appended as runs end.
+    A board (serial number and MAC) is known by the latest result of each step over all its runs;
+    a step skipped or left out of a run keeps the result it had.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        """
+        Args:
+            path: JSON lines file
+        """
+        self.path = path
+        self.__lock = threading.Lock()
+
+    def record(self, board: LDBoard):
+        """
+        Appends the steps a board ran, with their results.
+
+        Args:
+            board: LDBoard after its run
+        """
+        results = {name: bool(result) for name, result in board.test_status.items() if name not in board.blocked}
+        if not results:
+            return
+        entry = {'time': Clock.now().isoformat(), 'serial': board.serial_address, 'mac': board.mac_address,
+                 'board_type': board.type, 'results': results}
+        with self.__lock:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(entry) + '\n')
+        _LOGGER.info('ResultHistory::record:: {} results of {} saved.'.format(len(results), board.serial_address))
+
+    def load(self, serial, mac=None) -> dict:
+        """
+        Latest result of each step run on a board.
+
+        Args:
+            serial: Serial number
+            mac: MAC address (None for any)
+
+        Returns:
+            dict of step name -> bool, empty for a board never tested
+        """
+        results = dict()
+        if not os.path.exists(self.path):
+            return results
+        with self.__lock:
+            with open(self.path) as file:
+                lines = file.readlines()
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a run cut short while writing
+                continue
+            if entry['serial'] == serial and (mac is None or entry['mac'] == mac):
+                results.update(entry['results'])
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latest test results of a board.')
+    parser.add_argument('serial', help='Serial number')
+    parser.add_argument('--mac', help='MAC address')
+    parser.add_argument('--path', default=HISTORY_PATH, help='History file')
+    args = vars(parser.parse_args())
+    for name, result in ResultHistory(args['path']).load(args['serial'], args['mac']).items():
+        print('{}: {}'.format(name, 'passed' if result else 'failed'))
@@ -5,6 +5,16 @@ import os
 CONFIGURABLES
 """
 LOG_PATH = 'logs'
+# GPIO settle times measured on the station (see components/Calibration.py), kept with the installation
+SETTLE_TABLE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'settle.json')
+# results of every board tested (see components/History.py)
+HISTORY_PATH = 'history.jsonl'
+# results of the boards of debug runs, simulated
+SIMULATED_HISTORY_PATH = 'history.simulated.jsonl'
+# write-ahead journal of the batch under test (see components/Journal.py)
+JOURNAL_PATH = 'journal.jsonl'
+# journal of debug runs, so a simulated batch never resumes a real one
+SIMULATED_JOURNAL_PATH = 'journal.simulated.jsonl'
 
 
 def get_log_path(identifier=None) -> str:
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+components/Journal.py
+
+Author:
+    Zachary Smith
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import namedtuple, OrderedDict
+
+from components import Clock
+from components.IOUtilities import JOURNAL_PATH
+
+_LOGGER = logging.getLogger()
+
+# One step a tray went through: its result, and the failed step blocking it if it was skipped
+StepRecord = namedtuple('StepRecord', ['result', 'blocker', 'report'])
+# State of a batch that did not finish, see BatchJournal.load
+#   started: ISO time the batch started
+#   trays: {tray: manifest entry (board_type, identifier, GPIO_address, mac, serial, options)}
+#   steps: {tray: OrderedDict of step name -> StepRecord, in the order they ran}
+#   ips: {tray: IP address the board was last given}
+Checkpoint = namedtuple('Checkpoint', ['started', 'trays', 'steps', 'ips'])
+
+
+class BatchJournal(object):
+    """
+    Write-ahead journal of the batch under test, so that a batch cut short (crash, reboot, cancel)
+    can be resumed where it stopped. A record is appended after every step. A writer thread
+    writes and fsyncs the records in groups (whatever arrived during the previous fsync),
+    so a step never waits for the disk. A record still queued at a crash is lost, and its step
+    runs again on resume.
+    """
+
+    MANIFEST = 'manifest'
+    TRAY = 'tray'
+    STEP = 'step'
+    IP = 'ip'
+    END = 'end'
+
+    def __init__(self, path=JOURNAL_PATH):
+        """
+        Args:
+            path: JSON lines file
+        """
+        self.path = path
+        self.groups = 0     # fsyncs of the writer
+        self.records = 0    # records it wrote
+        self.__queue = list()
+        self.__appended = 0
+        self.__committed = 0
+        self.__cond = threading.Condition()
+        self.__file = None
+        self.__writer = None
+
+    def begin(self, trays: dict, checkpoint=None):
+        """
+        Starts the journal of a batch, replacing the previous one. The new journal is written
+        beside it and renamed over it, so a crash meanwhile leaves one or the other whole.
+
+        Args:
+            trays: {tray: manifest entry}
+            checkpoint: Checkpoint the batch resumes, its records are carried over
+        """
+        started = checkpoint.started if checkpoint else Clock.now().isoformat()
+        records = [{'kind': self.MANIFEST, 'started': started,
+                    'trays': [dict(entry, tray=tray) for tray, entry in sorted(trays.items())]}]
+        if checkpoint:
+            for tray, steps in sorted(checkpoint.steps.items()):
+                records += [self._step(tray, name, *record) for name, record in steps.items()]
+            records += [{'kind': self.IP, 'tray': tray, 'ip': ip} for tray, ip in sorted(checkpoint.ips.items())]
+        temporary = self.path + '.tmp'
+        self.__file = open(temporary, 'w')
+        try:
+            self._write(records)
+        finally:
+            self.__file.close()
+        os.replace(temporary, self.path)
+        # the rename is durable once the directory is
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.__file = open(self.path, 'a')
+        self.__writer = threading.Thread(target=self._run, name='BatchJournal', daemon=True)
+        self.__writer.start()
+
+    @classmethod
+    def _step(cls, tray, name, result, blocker=None, report=True) -> dict:
+        return {'kind': cls.STEP, 'tray': tray, 'step': name, 'result': bool(result), 'blocker': blocker,
+                'report': report}
+
+    def _append(self, record: dict) -> int:
+        with self.__cond:
+            self.__queue.append(record)
+            self.__appended += 1
+            self.__cond.notify_all()
+            return self.__appended
+
+    def admitted(self, tray: int, entry: dict) -> int:
+        """
+        Journals a board loaded into a tray while the batch runs, in place of the tray's last one.
+
+        Returns:
+            Sequence number of the record (see sync)
+        """
+        return self._append({'kind': self.TRAY, 'tray': tray, 'entry': entry})
+
+    def step(self, tray: int, name: str, result, blocker=None, report=True) -> int:
+        """
+        Journals a step a tray finished, or skipped when blocked.
+
+        Returns:
+            Sequence number of the record (see sync)
+        """
+        return self._append(self._step(tray, name, result, blocker, report))
+
+    def assigned(self, tray: int, ip_address: str) -> int:
+        """
+        Journals the IP address a tray's board was given.
+
+        Returns:
+            Sequence number of the record (see sync)
+        """
+        return self._append({'kind': self.IP, 'tray': tray, 'ip': ip_address})
+
+    def sync(self, sequence=None, timeout=None) -> bool:
+        """
+        Waits until a record (every record by default) is on disk.
+
+        Returns:
+            False on timeout
+        """
+        with self.__cond:
+            sequence = sequence if sequence else self.__appended
+            return self.__cond.wait_for(lambda: self.__committed >= sequence or not self.__writer, timeout)
+
+    def end(self):
+        """
+        Marks the batch finished, nothing to resume, and closes the journal.
+        """
+        self._append({'kind': self.END})
+        self.close()
+
+    def close(self):
+        """
+        Writes what is queued and closes the journal. A batch not ended stays resumable.
+        """
+        if not self.__writer:
+            return
+        with self.__cond:
+            writer, self.__writer = self.__writer, None
+            self.__cond.notify_all()
+        writer.join()
+        self.__file.close()
+        _LOGGER.info('BatchJournal::close:: {} records in {} fsyncs.'.format(self.records, self.groups))
+
+    def _write(self, records: list):
+        self.__file.write(''.join(json.dumps(record) + '\n' for record in records))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.records += len(records)
+        self.groups += 1
+
+    def _run(self):
+        while True:
+            with self.__cond:
+                self.__cond.wait_for(lambda: self.__queue or not self.__writer)
+                if not self.__queue:
+                    return
+                group, self.__queue = self.__queue, list()
+            self._write(group)
+            with self.__cond:
+                self.__committed += len(group)
+                self.__cond.notify_all()
+
+    @classmethod
+    def load(cls, path=JOURNAL_PATH):
+        """
+        Reads back the journal of a batch that did not finish.
+
+        Returns:
+            Checkpoint, None if the last batch ended (or there is none)
+        """
+        if not os.path.exists(path):
+            return None
+        checkpoint = None
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn by the crash, nothing after it was committed
+                    break
+                if record['kind'] == cls.MANIFEST:
+                    trays = {entry.pop('tray'): entry for entry in record['trays']}
+                    checkpoint = Checkpoint(record['started'], trays, {tray: OrderedDict() for tray in trays}, dict())
+                elif checkpoint is None:
+                    continue
+                elif record['kind'] == cls.TRAY:
+                    checkpoint.trays[record['tray']] = record['entry']
+                    checkpoint.steps[record['tray']] = OrderedDict()
+                    checkpoint.ips.pop(record['tray'], None)
+                elif record['kind'] == cls.STEP:
+                    checkpoint.steps[record['tray']][record['step']] = StepRecord(
+                        record['result'], record['blocker'], record['report'])
+                elif record['kind'] == cls.IP:
+                    checkpoint.ips[record['tray']] = record['ip']
+                elif record['kind'] == cls.END:
+                    checkpoint = None
+        return checkpoint
+
+    @classmethod
+    def abandon(cls, path=JOURNAL_PATH):
+        """
+        Marks the last batch as not to be resumed.
+        """
+        with open(path, 'a') as file:
+            file.write(json.dumps({'kind': cls.END, 'abandoned': True}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='State of the last batch, if it did not finish.')
+    parser.add_argument('--path', default=JOURNAL_PATH, help='Journal file')
+    args = vars(parser.parse_args())
+    last = BatchJournal.load(args['path'])
+    if not last:
+        print('The last batch finished.')
+    else:
+        print('Batch started {} did not finish.'.format(last.started))
+        for index, manifest in sorted(last.trays.items()):
+            print('Tray {} {} ({}): {} steps done{}'.format(
+                index + 1, manifest['identifier'], manifest['serial'], len(last.steps[index]),
+                ', at {}'.format(last.ips[index]) if index in last.ips else ''))
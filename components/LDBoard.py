@@ -7,6 +7,12 @@ Author:
 import logging
 from collections import OrderedDict
 
+from pymodbus.exceptions import ConnectionException
+from serial.serialutil import SerialException
+
+from components.Exceptions import ConnectionRefusalException
+from components.GPIO import GPIO
+
 _LOGGER = logging.getLogger()
 
 
@@ -20,6 +26,7 @@ class LDBoard(object):
         """
         self.passing = True
         self.test_status = OrderedDict()
+        self.blocked = dict()   # skipped test -> the failed test it depends on
         self.serial_address = serial_address
         self.mac_address = mac_address
         self.name = name
@@ -34,7 +41,11 @@ class LDBoard(object):
         """
         ret_val = 'Passing: {}\n'.format(self.passing)
         for key in self.test_status.keys():
-            ret_val += '\t{}: {}\n'.format(key, 'passed' if self.test_status[key] else 'failed')
+            if key in self.blocked:
+                status = 'skipped (blocked by {})'.format(self.blocked[key])
+            else:
+                status = 'passed' if self.test_status[key] else 'failed'
+            ret_val += '\t{}: {}\n'.format(key, status)
         return ret_val
 
     def process_test_result(self, name, result):
@@ -48,3 +59,59 @@ class LDBoard(object):
         self.test_status[name] = result
         self.passing = self.passing if result else False
         _LOGGER.info('Test {} resulted: {}'.format(name, 'passed' if result else 'failed'))
+
+    def process_test_skipped(self, name, blocker):
+        """
+        Records a test that was not run because a test it depends on failed. The board does not pass.
+
+        Args:
+            name: Name of the test
+            blocker: Name of the failed test
+        """
+        self.test_status[name] = False
+        self.blocked[name] = blocker
+        self.passing = False
+        _LOGGER.info('Test {} skipped (blocked by {})'.format(name, blocker))
+
+    def test(self, gpio: GPIO, ip_address: str, args):
+        """
+        Executes test of board hardware (the steps of components/TestPlan.py selected by args).
+
+        Returns:
+            Boolean of board passing
+        """
+        # TestPlan and ResultHistory import LDBoard
+        from components.History import ResultHistory
+        from components.LDBoardTester import LDBoardTester
+        from components.TestPlan import TestPlan, Target
+        _LOGGER.info('Executing {} test.\n\tSerial: {}\n\tMAC: {}'.format(self.type, self.serial_address, self.mac_address))
+        ld_board = LDBoardTester(gpio, safe_delays=bool(args and args.get('safe_delays')))
+        # the MAC address is not written from the command line
+        target = Target(self.type, args['port'] if args else None, None, ip_address)
+        plan = TestPlan()
+        # boards without a serial number are not told apart, their results are not kept
+        history = ResultHistory() if args and args.get('serial') else None
+        names = TestPlan.selection(args)
+        if history and args.get('retest_failed'):
+            names = plan.retest(self.type, history.load(self.serial_address, self.mac_address), names)
+            _LOGGER.info('Retesting: {}'.format(', '.join(names) if names else 'nothing, every test passed'))
+        try:
+            plan.run(ld_board, self, target, names=names,
+                     stop_on_failure=bool(args and args.get('stop_on_failure')))
+        except ConnectionRefusalException:
+            _LOGGER.error("RS232 connection refused.")
+            self.process_test_result('rs232_connection', False)
+        except ConnectionException as e:
+            if e.string:
+                _LOGGER.error(e.string)
+            _LOGGER.error('USB to RS485(ModBus) adapter failed to connect.')
+        except SerialException as e:
+            if e.strerror:
+                _LOGGER.error(e.strerror)
+            _LOGGER.error('USB to RS232 adapter failed to connect.')
+            self.process_test_result('rs232_connection', False)
+        finally:
+            ld_board.disconnect_serial()
+            if history:
+                history.record(self)
+        return self.passing
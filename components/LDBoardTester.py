@@ -4,20 +4,27 @@ components/LDBoardTester.py
 Author:
     Zachary Smith
 """
-import datetime
 import logging
-import re
-import subprocess
-from time import sleep
+from collections import namedtuple
 
+from components import Clock
+from components.Clock import sleep
 from components.Exceptions import OperationsOutOfOrderException, TimeoutException
 from components.ModBus import ModBus
-from components.Serial import Serial
+from components.Ping import Pinger
+from components.Serial import Serial, BOOT_DONE
 from components.GPIO import GPIO
-from components.ADC import read as adc_read, read_diff as adc_read_diff
+from components import ADC
+from components import Responses
 
 _LOGGER = logging.getLogger()
 
+# Boot loader responses that mean a command will not produce the expected output
+CONSOLE_ERRORS = [r'[Uu]nknown command', r'[Ii]nvalid (?:command|argument|parameter)']
+# One reset of a board: `lines` are (seconds after reset, text), `raw` the console bytes they were read from,
+# `led` the LED Measurement (LD5200)
+BootCapture = namedtuple('BootCapture', ['lines', 'raw', 'completed', 'led'])
+
 
 class LDBoardTester(object):
     """
@@ -25,16 +32,66 @@ class LDBoardTester(object):
     """
     __serial = None
     __date_set = None
+    __boot = None
     LD2100 = "LD2100"
     LD5200 = "LD5200"
+    # device files of the USB adapters (point at a simulator to run off-line)
+    serial_device = '/dev/rleRS232'
+    modbus_device = '/dev/rleRS485'
+    # station interface wired to the trays' Ethernet ports
+    ethernet_interface = 'eth0'
     ip_addresses = ['10.0.0.189', '10.0.0.190', '10.0.0.191',
                     '10.0.0.192', '10.0.0.193', '10.0.0.194']
-
-    def __init__(self, gpio: GPIO):
+    # GPIO.RS485 port wired to the LD2100 at each GPIO.BOARD address (3 is off)
+    rs485_ports = {3: 2, 4: 1, 5: 0}
+    # ModBus register read by the RS485 test, and the expected answers
+    MODBUS_SLAVE = 254
+    MODBUS_REGISTER = 9998
+    MODBUS_LD2100 = 1234
+    MODBUS_PORTS = {0: 1111, 1: 2222, 2: 3333}  # LD5200 `modbustest`, per RS485 port
+    # pause (seconds) before each attempt at a ModBus read, the port fails when it runs out
+    MODBUS_BACKOFF = (0, .05, .2)
+    # seconds the leak reading takes to follow the short emulator, unless calibrated (see GPIO.commit)
+    SHORT_SETTLE = 1.0
+    # LD5200 relay matrix: (rly6, rly4, rly5) -> expected (I0, I1, I2, I3), 'x' is not checked
+    RELAYS = (6, 4, 5)
+    RELAY_MATRIX = {
+        (0, 0, 0): ('x', 1, 'x', 1),
+        (0, 0, 1): (1, 1, 1, 1),
+        (0, 1, 0): (1, 1, 1, 1),
+        (0, 1, 1): (1, 1, 1, 'x'),
+        (1, 0, 0): (1, 1, 'x', 1),
+        (1, 0, 1): (1, 1, 1, 1),
+        (1, 1, 0): (1, 1, 1, 1),
+        (1, 1, 1): (1, 'x', 1, 'x'),
+    }
+    # fastest boot seen on this station (seconds), shared by the trays
+    boot_time = None
+    # share of boot_time a tray lends the station for while its board reboots
+    BOOT_LEND = .8
+    # seconds after `reset` during which an LD5200's LED is measured
+    LED_WINDOW = (1.0, 1.5)
+    # Gray code: one relay changes from each state to the next
+    RELAY_ORDER = [tuple((i ^ (i >> 1)) >> bit & 1 for bit in (2, 1, 0)) for i in range(8)]
+
+    def __init__(self, gpio: GPIO, safe_delays=False, tray=None, pool=None):
         """
         Constructor
+
+        Args:
+            gpio: GPIO instance
+            safe_delays: Use fixed delays after serial commands instead of acknowledgements
+            tray: Scheduler Tray when trays share the station (see components/Scheduler.py)
+            pool: ConnectionPool leasing the RS232 and RS485 ports (else the tester opens its own)
         """
         self.__gpio = gpio
+        self.__safe_delays = safe_delays
+        self.__tray = tray
+        self.__pool = pool
+        # state of this board's console while the pooled port serves other trays
+        self.__console = Serial.UNKNOWN
+        # seconds each reboot of the board took, see _record_boot
+        self.boot_times = list()
 
     def __enter__(self):
         """
@@ -42,7 +99,7 @@ class LDBoardTester(object):
         Returns:
             self
         """
-        self.__serial = Serial('/dev/rleRS232')
+        self.__serial = Serial(self.serial_device, self.__safe_delays)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -57,14 +114,97 @@ class LDBoardTester(object):
 
     def connect_serial(self, mac=None) -> bool:
         _LOGGER.info('LDBoardTest::connect_serial:: Connecting RS232.')
-        self.__serial = Serial('/dev/rleRS232')
+        if self.__serial is None and self.__pool:
+            self.__serial = self.__pool.serial(self.serial_device, self.__safe_delays, self.__console)
+        if self.__serial:
+            # the session knows the console's state, a probe may be enough
+            self.__serial._verify_connection()
+        else:
+            self.__serial = Serial(self.serial_device, self.__safe_delays)
         if self.__serial and mac:
             _LOGGER.info('LDBoardTest::connect_serial:: Writing MAC address {} (failure raises exception)'.format(mac))
             self.__serial.send_command(bytes('mac ' + mac + '\n', 'utf-8'))
-            sleep(10)
-            self.__serial._verify_connection(7)
+            if not self._wait_for_reboot(10):
+                self.__serial._verify_connection(7)
         return True
 
+    def disconnect_serial(self):
+        """
+        Closes the RS232 connection (a pooled one stays open for the next tray).
+        """
+        if self.__serial and not self.__pool:
+            self.__serial.close()
+        self.__serial = None
+
+    def suspend_serial(self):
+        """
+        Lets go of the RS232 port while another tray has the console. A pooled port stays open
+        and this board's console state is kept for resume_serial, else the port is closed (see Serial.suspend).
+        """
+        if self.__serial and self.__pool:
+            self.__console = self.__serial.state
+        elif self.__serial:
+            self.__serial.suspend()
+
+    def resume_serial(self):
+        if self.__serial and self.__pool:
+            self.__serial = self.__pool.serial(self.serial_device, self.__safe_delays, self.__console)
+        elif self.__serial:
+            self.__serial.resume()
+
+    def console_alive(self) -> bool:
+        """
+        Whether the board's console still answers (see Serial.alive), to tell a test that failed
+        from a console that died. A rebooting board is given twice the fastest boot seen.
+        """
+        if not self.__serial:
+            return False
+        boot = 2 * LDBoardTester.boot_time if LDBoardTester.boot_time else 20
+        if self.__serial.alive(boot=boot):
+            return True
+        _LOGGER.error('LDBoardTest::console_alive:: The console does not answer.')
+        return False
+
+    def _wait_for_reboot(self, timeout) -> bool:
+        """
+        Waits until the rebooting board's boot loader takes commands (see Serial.wait_ready).
+        With a tray, the station is lent to the other trays for most of the fastest boot seen so far.
+
+        Args:
+            timeout: Seconds the boot may take
+
+        Returns:
+            False if the boot loader did not answer within timeout
+        """
+        lend = 0
+        if self.__tray and LDBoardTester.boot_time:
+            lend = min(LDBoardTester.boot_time * self.BOOT_LEND, timeout)
+            _LOGGER.info('LDBoardTest::_wait_for_reboot:: Releasing the station for {:.1f} s.'.format(lend))
+            self.suspend_serial()
+            self.__tray.idle(lend)
+            self.resume_serial()
+        # getting the station back may take longer than the boot, only the lent time counts
+        start = Clock.monotonic()
+        if not self.__serial.wait_ready(timeout - lend, ask=lend > 0):
+            _LOGGER.warning('LDBoardTest::_wait_for_reboot:: Boot loader not ready after {} s.'.format(timeout))
+            return False
+        self._record_boot(lend + Clock.monotonic() - start, watched=not lend)
+        return True
+
+    def _record_boot(self, seconds, watched=True):
+        """
+        Keeps the time a boot of this board took, and the station's fastest boot.
+
+        Args:
+            seconds: Reset to boot loader ready
+            watched: The whole boot was watched (a lent one may have ended before the station came back)
+        """
+        self.boot_times.append(seconds)
+        if watched and (LDBoardTester.boot_time is None or seconds < LDBoardTester.boot_time):
+            LDBoardTester.boot_time = seconds
+        _LOGGER.info('LDBoardTest::_record_boot:: Boot loader ready {}{:.2f} s after reset.'
+                     .format('' if watched else 'within ', seconds))
+
     def _relay_helper(self, cmd: tuple, expected: tuple, what='all') -> bool:
         for c in cmd:
             self.__serial.read_stop(c, r'ok')
@@ -77,6 +217,27 @@ class LDBoardTester(object):
             passing = passing and (v == e or e == 'x')
         return passing
 
+    def _relay_matrix(self) -> bool:
+        """
+        Walks the LD5200 relay states in RELAY_ORDER, switching only the relay that changes.
+        """
+        passing = True
+        present = None  # relay states are unknown until all are commanded
+        for state in self.RELAY_ORDER:
+            cmd = tuple('rly{}{}\n'.format(relay, 'on' if on else 'off').encode('ascii')
+                        for i, (relay, on) in enumerate(zip(self.RELAYS, state))
+                        if present is None or present[i] != on)
+            present = state
+            if not self._relay_helper(cmd, self.RELAY_MATRIX[state]):
+                # tests numbered in binary order of the states
+                test = sorted(self.RELAY_MATRIX).index(state) + 1
+                _LOGGER.error('LDBoardTest::test_relay:: Error test {}'.format(test))
+                passing = False
+        # final disengages
+        cmd = tuple('rly{}off\n'.format(relay).encode('ascii') for relay, on in zip(self.RELAYS, present) if on)
+        self._relay_helper(cmd, ('x', 'x', 'x', 'x'))
+        return passing
+
     def test_relay(self, board: str, relays: str) -> bool:
         """
         Tests the onboard relays
@@ -97,45 +258,13 @@ class LDBoardTester(object):
                 _LOGGER.error('LDBoardTest::test_relay:: LD2100 off state failed.')
                 passing = False
         else:
-            # test 1
-            if not self._relay_helper((b'rly6off\n', b'rly4off\n', b'rly5off\n'), ('x', 1, 'x', 1)):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 1')
-                passing = False
-            # test 2
-            if not self._relay_helper((b'rly6off\n', b'rly4off\n', b'rly5on\n'), (1, 1, 1, 1)):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 2')
-                passing = False
-            # test 3
-            if not self._relay_helper((b'rly6off\n', b'rly4on\n', b'rly5off\n'), (1, 1, 1, 1)):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 3')
-                passing = False
-            # test 4
-            if not self._relay_helper((b'rly6off\n', b'rly4on\n', b'rly5on\n'), (1, 1, 1, 'x')):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 4')
-                passing = False
-            # test 5
-            if not self._relay_helper((b'rly6on\n', b'rly4off\n', b'rly5off\n'), (1, 1, 'x', 1)):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 5')
-                passing = False
-            # test 6
-            if not self._relay_helper((b'rly6on\n', b'rly4off\n', b'rly5on\n'), (1, 1, 1, 1)):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 6')
-                passing = False
-            # test 7
-            if not self._relay_helper((b'rly6on\n', b'rly4on\n', b'rly5off\n'), (1, 1, 1, 1)):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 7')
-                passing = False
-            # test 8
-            if not self._relay_helper((b'rly6on\n', b'rly4on\n', b'rly5on\n'), (1, 'x', 1, 'x')):
-                _LOGGER.error('LDBoardTest::test_relay:: Error test 8')
-                passing = False
-            # final disengages
-            self._relay_helper((b'rly6off\n', b'rly4off\n', b'rly5off\n'), ('x', 'x', 'x', 'x'))
+            passing = self._relay_matrix()
         return passing
 
     def test_led(self, board: str) -> bool:
         """
-        Tests the on-board LED
+        Tests the on-board LED. An LD5200 lights it while booting, measured by capture_boot
+        (during test_startup_sequence when that ran).
 
         Returns:
             Boolean success
@@ -145,17 +274,16 @@ class LDBoardTester(object):
         expected = .225
         tolerance = tolerance * expected
         if board == LDBoardTester.LD5200:
-            # issue reset
-            self.__serial.send_command(b'reset\n')
-            sleep(1)
-        val = adc_read(3, gain=2)
-        if board == LDBoardTester.LD5200:
-            # Wait for reset to complete
-            _LOGGER.info('LDBoardTest::test_led:: Waiting for board reset.')
-            sleep(10)
-            self.__serial._verify_connection()
-        _LOGGER.info('LDBoardTest::test_led:: Read {} V.'.format(val))
-        if not ((expected - tolerance) <= val):
+            if self.__boot:
+                _LOGGER.info('LDBoardTest::test_led:: Using the LED measured during the startup sequence.')
+                val = self.__boot.led
+            else:
+                val = self.capture_boot(board).led
+                self.__serial._verify_connection()
+        else:
+            val = ADC.session().measure(3, gain=2, low=expected - tolerance)
+        _LOGGER.info('LDBoardTest::test_led:: Read {}.'.format(val))
+        if val is None or not ((expected - tolerance) <= val.mean):
             _LOGGER.info('LDBoardTest::test_led:: Not within tolerance. LED *might* not be working')
             return False
         return True
@@ -173,12 +301,13 @@ class LDBoardTester(object):
         passing = True
         for a in [4, 8, 12, 20, 0]:
             _LOGGER.info('LDBoardTest::output_current:: Testing output current {} mA'.format(a))
-            self.__serial.send_command(b'dac ' + str(a).encode('ascii') + b'\n')
+            # the output only changes once the board answers
+            self.__serial.read_stop(b'dac ' + str(a).encode('ascii') + b'\n', r'ok')
             volts = a * 1e-3 * resistance
             tol = tolerance * volts
-            val = adc_read_diff(2)
-            _LOGGER.info('LDBoardTest::output_current:: Expected {} V, Got {} V'.format(volts, val))
-            if not ((volts - tol) <= val <= (volts + tol)):
+            val = ADC.session().measure(0, gain=2, differential=True, low=volts - tol, high=volts + tol)
+            _LOGGER.info('LDBoardTest::output_current:: Expected {} V, Got {}'.format(volts, val))
+            if not ((volts - tol) <= val.mean <= (volts + tol)):
                 _LOGGER.error('LDBoardTest::output_current:: Not within tolerance'.format(a))
                 passing = False
         return passing
@@ -195,20 +324,32 @@ class LDBoardTester(object):
         """
         _LOGGER.info('LDBoardTest::configure_ip_address:: Configuring board\'s IP address as {}'
                      .format(ip_address))
-        self.__serial.send_command(b'ip ' + ip_address.encode('ascii') + b'\n')
-        result = self.__serial.read_stop(b'netcfg\n', r'ip: {}'.format(ip_address))
-        if not result:
-            _LOGGER.error('LDBoardTest::configure_ip_address:: Configuration failed.')
+        try:
+            self.__serial.send_command(b'ip ' + ip_address.encode('ascii') + b'\n')
+            # any address, so that a wrong one fails without waiting out the timeout
+            result = self.__serial.send_expect(b'netcfg\n', [r'ip: \d+\.\d+\.\d+\.\d+\s'] + CONSOLE_ERRORS)
+        except TimeoutException:
+            _LOGGER.error('LDBoardTest::configure_ip_address:: No response to ip or netcfg.')
+            return False
+        config = Responses.NETCFG.parse(result.response) if result.index == 0 else None
+        # any other address reported by netcfg is a failure
+        if not config or config.ip != ip_address:
+            _LOGGER.error('LDBoardTest::configure_ip_address:: Configuration failed. Read `{}`.'
+                          .format(config.ip if config else result.pattern))
             return False
         return True
 
-    def test_ethernet(self, ip_address='10.0.0.188', configure_ip_address=False) -> bool:
+    def test_ethernet(self, ip_address='10.0.0.188', configure_ip_address=False, count=4, interval=.2,
+                      max_loss=0) -> bool:
         """
-        Test the Ethernet connection with a ping.
+        Test the Ethernet connection with echo requests (see components/Ping.py).
 
         Args:
             ip_address: IP address to ping, verifying Ethernet HW
             configure_ip_address: If True, will configure board's IP address to match
+            count: Echo requests
+            interval: Seconds between requests
+            max_loss: Percent of requests allowed to go unanswered
 
         Returns:
             Boolean success
@@ -218,50 +359,40 @@ class LDBoardTester(object):
         if configure_ip_address:
             if not self.configure_ip_address(ip_address):
                 return False
-        # execute ping command
-        command = ['ping', '-c', '4', '-I', 'eth0', ip_address]
-        p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate()
-        # verify 0% packet loss
-        match = re.search(r'(\d+)% packet loss', str(stdout))
-        _LOGGER.debug(' '.join(command))
-        _LOGGER.debug('\n\t'.join([str(i) for i in stdout.split(b'\n')]))
-        if match:
-            _LOGGER.info('LDBoardTest::test_ethernet:: Ping had {}% packet loss'
-                         .format(match.group(1)))
-            if match.group(1) == '0':
-                return True
-        # if no match or error in call, fail
-        _LOGGER.warning('LDBoardTest::test_ethernet:: Packets lost. Test failed.')
-        return False
+        try:
+            result = Pinger(count, interval, interface=self.ethernet_interface).probe([ip_address])[ip_address]
+        except OSError as e:
+            _LOGGER.error('LDBoardTest::test_ethernet:: Cannot send echo requests: {}'.format(e.strerror))
+            return False
+        _LOGGER.info('LDBoardTest::test_ethernet:: {}'.format(result))
+        if result.loss > max_loss:
+            _LOGGER.warning('LDBoardTest::test_ethernet:: Packets lost. Test failed.')
+            return False
+        return True
 
-    def __adc_read(self) -> tuple:
+    def read_cable(self) -> tuple:
         """
-        Internal function. Execute adc1 command and read back
+        Execute adc1 command and read back the cable measurements
 
         Returns:
-            Tuple (leg1, leg2, leak) or false
+            Responses.CableReading (leg1, leg2, leak) or false
         """
-        _LOGGER.debug('LDBoardTest::__adc_read:: Reading boards ADC.')
-        response = self.__serial.read_stop(b'adc1\n', 'ok', timeout=10)
-        response = str(response)
-        i = response.find('external cable')
-        if i == -1:
+        _LOGGER.debug('LDBoardTest::read_cable:: Reading boards ADC.')
+        try:
+            result = self.__serial.send_expect(b'adc1\n', ['ok'] + CONSOLE_ERRORS, timeout=10)
+        except TimeoutException:
             return False
-        response = response[i:len(response)]
-        match_leg1 = re.search(r'(?:leg1 resistance \(ohms\): )(\d+)', response)
-        if not match_leg1:
+        if result.index != 0:
+            _LOGGER.error('LDBoardTest::read_cable:: Board refused `adc1`.')
             return False
-        leg1 = match_leg1.group(1)
-        match_leg2 = re.search(r'(?:leg2 resistance \(ohms\): )(\d+)', response)
-        if not match_leg2:
+        # the readings follow the `external cable` header
+        start = result.response.find(b'external cable')
+        if start == -1:
             return False
-        leg2 = match_leg2.group(1)
-        match_leak = re.search(r'(?:distance \(ohms\): )(\d+)', response)
-        if not match_leak:
+        reading = Responses.ADC1.parse(result.response[start:])
+        if None in reading:
             return False
-        leak = match_leak.group(1)
-        return int(leg1), int(leg2), int(leak)
+        return reading
 
     def test_length_detector(self, board: str) -> bool:
         """
@@ -285,7 +416,7 @@ class LDBoardTester(object):
             self.__gpio.stage(GPIO.LENGTH_EMULATOR, sel)
             self.__gpio.commit()
             _LOGGER.info('LDBoardTest::test_length_detector:: Expecting {} ohms'.format(r))
-            result = self.__adc_read()
+            result = self.read_cable()
             if not result:
                 _LOGGER.error('LDBoardTest::test_length_detector:: Issue getting leak cable results.')
                 return False
@@ -331,10 +462,9 @@ class LDBoardTester(object):
             if sel == 4:    # short length selection of 4 perpetually fails. Skip it
                 continue
             self.__gpio.stage(GPIO.SHORT_EMULATOR, sel)
-            self.__gpio.commit()
-            sleep(1)
+            self.__gpio.commit(defaults={GPIO.SHORT_EMULATOR: self.SHORT_SETTLE})
             _LOGGER.info('LDBoardTest::short_length_detector:: Expecting {} ohms'.format(r))
-            result = self.__adc_read()
+            result = self.read_cable()
             if not result:
                 _LOGGER.error('LDBoardTest::short_length_detector:: Issue getting short cable results.')
                 return False
@@ -350,7 +480,7 @@ class LDBoardTester(object):
         self.__gpio.stage(GPIO.LENGTH_EMULATOR, 7)
         self.__gpio.stage(GPIO.SHORT_EMULATOR, 7)
         self.__gpio.commit()
-        result = self.__adc_read()
+        result = self.read_cable()
         _LOGGER.info('LDBoardTest::short_length_detector:: Executing break test.')
         _LOGGER.info('LDBoardTest::short_length_detector:: Read {}, {}'.format(result[0], result[1]))
         break_test = 24927 if board == LDBoardTester.LD2100 else 40731
@@ -359,75 +489,127 @@ class LDBoardTester(object):
             passing = False
         return passing
 
-    def test_modbus(self, board) -> bool:
+    def test_modbus(self, board, address=None) -> bool:
         """
         Test the RS485 modbus connection
 
         Args:
             board: String LD5200 | LD2100
+            address: GPIO.BOARD address of the board (routes an LD2100's RS485 port)
 
         Returns:
             Boolean success
         """
         _LOGGER.info('LDBoardTest::test_modbus:: Testing modbus register read for `{}`.'.format(board))
-        # forming ModBus request
-        slave, start = 254, 9998
-        # create modbus client
-        serial_modbus = ModBus(device_file='/dev/rleRS485', timeout=1)
+        serial_modbus = self.__pool.modbus(self.modbus_device) if self.__pool else \
+            ModBus(device_file=self.modbus_device, timeout=1)
+        try:
+            return self.__modbus(serial_modbus, board, address)
+        finally:
+            if not self.__pool:
+                serial_modbus.close()
+            # turn off
+            self.__gpio.stage(GPIO.RS485, 3)
+            self.__gpio.commit()
+
+    def __modbus(self, serial_modbus: ModBus, board, address) -> bool:
         # quick test if is LD2100
         if board == self.LD2100:
-            response = serial_modbus.read_holding_registers(start, 1, slave)
-            if response:
-                return response.registers[0] == 1234
-            return False
+            port = self.rs485_ports.get(address)
+            if port is not None:
+                self.__gpio.stage(GPIO.RS485, port)
+                self.__gpio.commit()
+            return self._modbus_read(serial_modbus, port, self.MODBUS_LD2100)
         # modbustest through serial port
-        self.__serial.send_command(b'modbustest\n')
-        # listener
-        port = 0
-        strike = 0
-        failing = 3
+        self.start_modbustest()
         try:
-            while port < 3:
-                # see that modbustest is still active
-                # stage change to port
+            for port, expected in sorted(self.MODBUS_PORTS.items()):
                 self.__gpio.stage(GPIO.RS485, port)
                 self.__gpio.commit()
-                sleep(.1)
-                # three strikes and continue
-                if strike == 3:
-                    strike = 0
-                    port += 1
-                    continue
-                # execute read
-                modbus = serial_modbus.read_holding_registers(start, 1, slave)
-                if not modbus:
-                    _LOGGER.debug('LDBoardTest::test_modbus:: Nothing returned from register read.')
-                    strike += 1
-                    continue
-                # check response
-                success = False
-                _LOGGER.debug('LDBoardTest::test_modbus:: Read {} for port {}.'.format(modbus.registers[0], port))
-                if port == 0:
-                    if modbus.registers[0] == 1111:
-                        success = True
-                elif port == 1:
-                    if modbus.registers[0] == 2222:
-                        success = True
-                elif port == 2:
-                    if modbus.registers[0] == 3333:
-                        success = True
-                if success:
-                    _LOGGER.info('LDBoardTest::test_modbus:: Communicated successfully with port {}'.format(port))
-                    port += 1
-                    failing -= 1
-                else:
-                    strike += 1
+                if not self._modbus_read(serial_modbus, port, expected):
+                    # every port must answer, the remaining ones cannot change the outcome
+                    _LOGGER.info('LDBoardTest::test_modbus:: Port {} failed, skipping the rest.'.format(port))
+                    return False
+                _LOGGER.info('LDBoardTest::test_modbus:: Communicated successfully with port {}'.format(port))
+        finally:
+            self.stop_modbustest()
+        return True
+
+    def _modbus_read(self, serial_modbus: ModBus, port, expected) -> bool:
+        """
+        Reads MODBUS_REGISTER through RS485 port `port`, striking out on the MODBUS_BACKOFF schedule.
+
+        Returns:
+            True once the register reads `expected`
+        """
+        for strike, pause in enumerate(self.MODBUS_BACKOFF):
+            if pause:
+                sleep(pause)
+            response = serial_modbus.read_holding_registers(self.MODBUS_REGISTER, 1, self.MODBUS_SLAVE, port=port)
+            if not response:
+                _LOGGER.debug('LDBoardTest::_modbus_read:: Nothing returned from register read (strike {}).'
+                              .format(strike + 1))
+                continue
+            _LOGGER.debug('LDBoardTest::_modbus_read:: Read {} for port {}.'.format(response.registers[0], port))
+            if response.registers[0] == expected:
+                return True
+        return False
+
+    def start_modbustest(self):
+        """
+        Puts the LD5200 boot loader in `modbustest`, answering MODBUS_PORTS on its RS485 ports.
+        """
+        self.__serial.send_command(b'modbustest\n')
+
+    def stop_modbustest(self):
+        # send ctrl-c to cancel just in case
+        self.__serial.send_command(b'\x03\n')
+        self.__serial.reset_input_buffer()
+
+    def capture_boot(self, board, timeout=20) -> BootCapture:
+        """
+        Resets the board and records its boot transcript until the boot loader is ready.
+        An LD5200's LED is sampled meanwhile (see LED_WINDOW).
+
+        Args:
+            board: LD5200 or LD2100
+            timeout: Seconds the boot may take
+
+        Returns:
+            BootCapture, also kept for test_startup_sequence and test_led
+        """
+        _LOGGER.info('LDBoardTester::capture_boot:: Sending `reset` command.')
+        sampler = ADC.Sampler(3, gain=2) if board == LDBoardTester.LD5200 else None
+        lines = list()
+        raw = bytearray()
+        completed = False
+        if sampler:
+            sampler.start()
+        reset = Clock.monotonic()
+        try:
+            since = self.__serial.send_command(b'reset\n')
+            while not completed:
+                remaining = reset + timeout - Clock.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    result = self.__serial.expect([BOOT_DONE, r'([^\r\n]*)\r?\n'], remaining, since=since)
+                except TimeoutException:
+                    break
+                since = None
+                raw += result.response
+                completed = result.index == 0
+                lines.append((Clock.monotonic() - reset, BOOT_DONE if completed else result.groups[0]))
+                _LOGGER.debug('LDBoardTester::capture_boot:: {:6.2f} s {}'.format(*lines[-1]))
         finally:
-            # send ctrl-c to cancel just in case
-            self.__serial.send_command(b'\x03\n')
+            if sampler:
+                sampler.stop()
             self.__serial.reset_input_buffer()
-        _LOGGER.info("LDBoardTest::test_modbus:: Failed {} test(s)".format(failing))
-        return failing == 0
+        if completed:
+            self._record_boot(lines[-1][0])
+        led = sampler.window(reset + self.LED_WINDOW[0], reset + self.LED_WINDOW[1]) if sampler else None
+        self.__boot = BootCapture(lines, bytes(raw), completed, led)
+        return self.__boot
 
     def test_startup_sequence(self, board=LD5200) -> bool:
         """
@@ -437,22 +619,19 @@ class LDBoardTester(object):
             board: LD5200 or LD2100
         """
         _LOGGER.info('LDBoardTester::test_startup_sequence:: Testing startup sequence.')
-        _LOGGER.info('LDBoardTester::test_startup_sequence:: Sending `reset` command.')
-        try:
-            response = self.__serial.read_stop(b'reset\n', r'User prgm is not valid', timeout=20)
-        except TimeoutException:
+        capture = self.capture_boot(board)
+        if not capture.completed:
             _LOGGER.error('LDBoardTester::test_startup_sequence:: Did not reboot within timeout...')
             return False
         if board == LDBoardTester.LD2100:
             # Pre/Post burn in does not require validation
             return True
         # Tests created from Pre/Post burn in sheet
-        match_uart1 = re.search(r'(?:Testing duart1: \d+{lc:0} passed)', str(response))
-        match_uart2 = re.search(r'(?:Testing duart2: \d+{lc:0} passed)', str(response))
-        if not match_uart1:
+        banner = Responses.BANNER.parse(capture.raw)
+        if not banner.duart1:
             _LOGGER.info('LDBoardTester::test_startup_sequence:: UART1 failed validation.')
             return False
-        if not match_uart2:
+        if not banner.duart2:
             _LOGGER.info('LDBoardTester::test_startup_sequence:: UART2 failed validation.')
             return False
         _LOGGER.info('LDBoardTester::test_startup_sequence:: UART 1 & 2 passed.')
@@ -463,11 +642,13 @@ class LDBoardTester(object):
         Test internal voltage is within allowed voltage range.
         """
         _LOGGER.info('LDBoardTester::test_voltage:: Testing 15v supply.')
-        response = self.__serial.read_stop(b'15v\n', regex=r'15V Supply:')
         # 15V Supply: 15.1V\n
-        match = re.search(r'(?:15V Supply: )(\d+(?:\.\d+)?)', str(response))
-        if match:
-            voltage = float(match.group(1))
+        try:
+            result = self.__serial.send_expect(b'15v\n', [r'15V Supply:[^\r\n]*\r?\n'] + CONSOLE_ERRORS)
+        except TimeoutException:
+            result = None
+        voltage = Responses.SUPPLY.parse(result.response).volts if result and result.index == 0 else None
+        if voltage is not None:
             _LOGGER.info('LDBoardTester::test_voltage:: Voltage is {} V'.format(voltage))
             if abs(15 - voltage) < 0.5:
                 _LOGGER.info('LDBoardTester::test_voltage:: Test passed. Within 500 mV.')
@@ -479,7 +660,7 @@ class LDBoardTester(object):
         """
         Test the clock setting mechanism. Best if done initially and checking the time later.
         """
-        self.__date_set = datetime.datetime.today()
+        self.__date_set = Clock.now()
         # date 01/01/17
         date = b'date '
         date += bytearray(self.__date_set.strftime("%m/%d/%y"), 'utf8')
@@ -502,19 +683,18 @@ class LDBoardTester(object):
         if not self.__date_set:
             raise OperationsOutOfOrderException
         _LOGGER.info("LDBoardTester::test_datetime_read:: Testing datetime reading.")
-        now = datetime.datetime.now()
-        result = self.__serial.read_stop(b'time\n', r'(\d{2}/\d{2}/\d{2})\s+(\d{2}:\d{2}:\d{2})')
-        count = 0
-        # regex: 01/01/17 12:00:00
-        match = re.search(r'(\d{2}/\d{2}/\d{2})\s+(\d{2}:\d{2}:\d{2})', str(result))
-        if match:
-            time, date = match.group(1), match.group(2)
-            _LOGGER.info("LDBoardTester::test_datetime_read:: Read datetime as {} {}"
-                         .format(date, time))
+        now = Clock.now()
+        try:
+            result = self.__serial.send_expect(b'time\n', [r'\d{2}/\d{2}/\d{2}\s+\d{2}:\d{2}:\d{2}'] + CONSOLE_ERRORS)
+        except TimeoutException:
+            result = None
+        # 01/01/17 12:00:00
+        dt = Responses.TIME.parse(result.response).clock if result and result.index == 0 else None
+        if dt:
+            _LOGGER.info("LDBoardTester::test_datetime_read:: Read datetime as {}"
+                         .format(dt.strftime("%m/%d/%y %H:%M:%S")))
             _LOGGER.info("LDBoardTester::test_datetime_read:: Current datetime is {}"
-                         .format(datetime.datetime.now().strftime("%m/%d/%y %H:%M:%S")))
-            # parse datetime
-            dt = datetime.datetime.strptime("{} {}".format(time, date), "%H:%M:%S %m/%d/%y")
+                         .format(Clock.now().strftime("%m/%d/%y %H:%M:%S")))
             elapsed = dt - now
             _LOGGER.info("LDBoardTester::test_datetime_read:: Time delta is {} sec"
                          .format(abs(elapsed.total_seconds())))
@@ -529,5 +709,6 @@ class LDBoardTester(object):
                          .format(allowance))
             return True
         _LOGGER.error("LDBoardTester::test_datetime_read:: Expecting form "
-                      "(\d{{2}}/\d{{2}}/\d{{2}})\s+(\d{{2}}:\d{{2}}:\d{{2}})".format(str(result)))
+                      "(\d{{2}}/\d{{2}}/\d{{2}})\s+(\d{{2}}:\d{{2}}:\d{{2}}), got {}"
+                      .format(result.response if result else 'no response'))
         return False
@@ -5,6 +5,8 @@ Author:
     Zachary Smith
 """
 import logging
+import time
+from collections import deque
 from pymodbus.client.sync import ModbusSerialClient
 from pymodbus.client.common import ReadHoldingRegistersResponse
 
@@ -12,14 +14,32 @@ from pymodbus.client.common import ReadHoldingRegistersResponse
 _LOGGER = logging.getLogger()
 
 
+def _percentile(values, percent):
+    """
+    Nearest-rank percentile of a non-empty sequence.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
 class ModBus(object):
     """
     Class ModBus has methods for sending and receiving ModBus commands over serial or TCP
+
+    Round trips are measured per port (whatever the caller routes the adapter to). Once a port
+    has answered a few times, its requests time out at a multiple of its usual round trip
+    instead of the configured timeout, which stays the upper bound.
     """
 
     __serial_client = None
     __device_file = None
 
+    RTT_SAMPLES = 32        # round trips kept per port
+    RTT_MIN_SAMPLES = 4     # round trips needed before the timeout adapts
+    RTT_PERCENTILE = 95
+    RTT_FACTOR = 3          # timeout as a multiple of the percentile
+    MIN_TIMEOUT = .05       # seconds, a request at 9600 baud alone takes ~20 ms
+
     def __init__(self, device_file="", timeout=1):
         """
         Initializes modbus communication
@@ -29,6 +49,8 @@ class ModBus(object):
             timeout: seconds
         """
         self.__device_file = device_file
+        self.__timeout = timeout
+        self.__rtts = dict()    # port -> deque of seconds
         self.__serial_client = ModbusSerialClient(method="rtu", port=device_file, baudrate=9600, timeout=timeout)
         connection = self.__serial_client.connect()
         _LOGGER.debug("ModBus:: Connection status with {} : {}".format(self.__device_file, connection))
@@ -38,9 +60,37 @@ class ModBus(object):
         Closes connection
         """
         _LOGGER.debug('ModBus::close:: Closing connection with {}'.format(self.__device_file))
+        for port, rtts in sorted(self.__rtts.items(), key=lambda item: str(item[0])):
+            _LOGGER.info('ModBus::close:: Port {}: {} round trips, p{} {:.1f} ms, timeout {:.0f} ms.'
+                         .format(port, len(rtts), self.RTT_PERCENTILE,
+                                 _percentile(rtts, self.RTT_PERCENTILE) * 1e3, self.timeout_for(port) * 1e3))
         self.__serial_client.close()
 
-    def read_holding_registers(self, address: int, count=2, unit=0x02) -> ReadHoldingRegistersResponse:
+    def timeout_for(self, port=None) -> float:
+        """
+        Seconds a request through `port` may take: RTT_FACTOR times its RTT_PERCENTILE round trip,
+        within MIN_TIMEOUT and the configured timeout.
+        """
+        rtts = self.__rtts.get(port)
+        if not rtts or len(rtts) < self.RTT_MIN_SAMPLES:
+            return self.__timeout
+        return min(self.__timeout, max(self.MIN_TIMEOUT, _percentile(rtts, self.RTT_PERCENTILE) * self.RTT_FACTOR))
+
+    def _set_timeout(self, timeout):
+        self.__serial_client.timeout = timeout
+        if self.__serial_client.socket:
+            self.__serial_client.socket.timeout = timeout
+
+    def reset(self):
+        """
+        Drops whatever is left of earlier exchanges, so a reused connection starts clean.
+        """
+        _LOGGER.debug('ModBus::reset:: Flushing {}'.format(self.__device_file))
+        socket = self.__serial_client.socket
+        if socket and socket.is_open:
+            socket.reset_input_buffer()
+
+    def read_holding_registers(self, address: int, count=2, unit=0x02, port=None) -> ReadHoldingRegistersResponse:
         """
         Reads and returns modbus register.
 
@@ -48,12 +98,17 @@ class ModBus(object):
             address: Starting numerical modbus register address.
             count: Number of registers.
             unit: Slave address.
+            port: Port the adapter is routed to, for its round trip times (see timeout_for)
 
         Returns:
             Returns object(s).
         """
+        self._set_timeout(self.timeout_for(port))
+        # the bus runs on wall time whatever the station clock
+        start = time.monotonic()
         a = self.__serial_client.read_holding_registers(address, count, unit=unit)
         if type(a) == ReadHoldingRegistersResponse:
+            self.__rtts.setdefault(port, deque(maxlen=self.RTT_SAMPLES)).append(time.monotonic() - start)
             _LOGGER.debug('ModBus::read_holding_registers:: Response: {}'.format(a.registers))
         else:
             _LOGGER.debug('ModBus::read_holding_registers:: Failed. {}'.format(a))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+components/Ping.py
+
+Author:
+    Zachary Smith
+"""
+import argparse
+import itertools
+import logging
+import math
+import os
+import random
+import select
+import socket
+import struct
+import time
+
+_LOGGER = logging.getLogger()
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+UDP_ECHO_PORT = 7
+
+
+def _checksum(data: bytes) -> int:
+    """
+    Internet checksum (RFC 1071).
+    """
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!{}H'.format(len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class EchoResult(object):
+    """
+    Echo statistics of one host.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.sent = 0
+        self.rtts = list()  # seconds, in order of arrival
+
+    @property
+    def received(self) -> int:
+        return len(self.rtts)
+
+    @property
+    def loss(self) -> float:
+        """
+        Percent of requests without a reply.
+        """
+        return 100 * (self.sent - self.received) / self.sent if self.sent else 100.0
+
+    def rtt(self) -> tuple:
+        """
+        Returns:
+            (min, avg, max, mdev) in seconds, None without replies
+        """
+        if not self.rtts:
+            return None
+        avg = sum(self.rtts) / len(self.rtts)
+        mdev = math.sqrt(sum((rtt - avg) ** 2 for rtt in self.rtts) / len(self.rtts))
+        return min(self.rtts), avg, max(self.rtts), mdev
+
+    def __str__(self):
+        text = '{}: {} sent, {} received, {:.0f}% loss'.format(self.host, self.sent, self.received, self.loss)
+        if self.rtts:
+            text += ', rtt min/avg/max/mdev {:.3f}/{:.3f}/{:.3f}/{:.3f} ms'.format(*(t * 1e3 for t in self.rtt()))
+        return text
+
+
+class Pinger(object):
+    """
+    In-process echo engine. Every host is probed from one socket in the same rounds,
+    so checking several boards takes as long as checking one.
+    ICMP uses an unprivileged datagram socket where the kernel allows it, a raw socket otherwise.
+    UDP targets the echo service (port 7).
+    """
+    ICMP = 'icmp'
+    UDP = 'udp'
+
+    def __init__(self, count=4, interval=.2, timeout=1.0, interface=None, protocol=ICMP, size=56):
+        """
+        Args:
+            count: Requests per host
+            interval: Seconds between rounds
+            timeout: Seconds a reply may take
+            interface: Network interface to send from, e.g. eth0 (needs CAP_NET_RAW)
+            protocol: Pinger.ICMP | Pinger.UDP
+            size: Payload bytes per request
+        """
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.interface = interface
+        self.protocol = protocol
+        self.size = max(size, 8)
+        self.__ident = (os.getpid() ^ id(self)) & 0xFFFF
+
+    def _open(self):
+        """
+        Returns:
+            (socket, True if replies include the IP header)
+        """
+        raw = False
+        if self.protocol == self.UDP:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            except PermissionError:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+                raw = True
+        if self.interface:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, self.interface.encode('ascii') + b'\0')
+            except OSError as e:
+                _LOGGER.warning('Pinger::_open:: Cannot bind to {} ({}), the routing table decides.'
+                                .format(self.interface, e.strerror))
+        sock.setblocking(False)
+        return sock, raw
+
+    def _request(self, seq: int) -> bytes:
+        payload = struct.pack('!H', seq) + bytes(self.size - 2)
+        if self.protocol == self.UDP:
+            return payload
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self.__ident, seq)
+        return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, _checksum(header + payload), self.__ident, seq) + payload
+
+    def _reply(self, data: bytes, raw: bool):
+        """
+        Returns:
+            Sequence number of an echo reply to this Pinger, None for anything else
+        """
+        if self.protocol == self.UDP:
+            return struct.unpack('!H', data[:2])[0] if len(data) >= 2 else None
+        if raw:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            return None
+        kind, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+        # datagram sockets get their identifier rewritten by the kernel and only see their own replies
+        if kind != ICMP_ECHO_REPLY or (raw and ident != self.__ident):
+            return None
+        return seq
+
+    def probe(self, hosts) -> dict:
+        """
+        Probes hosts concurrently, `count` rounds `interval` apart, then waits up to `timeout` for stragglers.
+        Network round trips are timed on wall time whatever the station clock.
+
+        Args:
+            hosts: IP addresses
+
+        Returns:
+            {host: EchoResult}
+        """
+        hosts = list(hosts)
+        results = {host: EchoResult(host) for host in hosts}
+        sock, raw = self._open()
+        pending = dict()    # seq -> (host, send time)
+        seqs = itertools.count(random.randrange(0x10000))
+        rounds = 0
+        next_round = time.monotonic()
+        deadline = None
+        try:
+            while True:
+                now = time.monotonic()
+                if rounds < self.count and now >= next_round:
+                    for host in hosts:
+                        seq = next(seqs) & 0xFFFF
+                        pending[seq] = (host, time.monotonic())
+                        results[host].sent += 1
+                        try:
+                            sock.sendto(self._request(seq), (host, UDP_ECHO_PORT if self.protocol == self.UDP else 0))
+                        except OSError as e:
+                            _LOGGER.debug('Pinger::probe:: Sending to {} failed: {}'.format(host, e.strerror))
+                    rounds += 1
+                    next_round = now + self.interval
+                    if rounds == self.count:
+                        deadline = now + self.timeout
+                if deadline is not None and (now >= deadline or not pending):
+                    break
+                readable, _, _ = select.select([sock], [], [], max(0, (deadline if deadline else next_round) - now))
+                if not readable:
+                    continue
+                while True:
+                    try:
+                        data, address = sock.recvfrom(2048)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    arrived = time.monotonic()
+                    seq = self._reply(data, raw)
+                    if seq not in pending or pending[seq][0] != address[0]:
+                        continue
+                    host, sent = pending.pop(seq)
+                    if arrived - sent <= self.timeout:
+                        results[host].rtts.append(arrived - sent)
+        finally:
+            sock.close()
+        for result in results.values():
+            _LOGGER.debug('Pinger::probe:: {}'.format(result))
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Probe hosts concurrently with ICMP or UDP echo.')
+    parser.add_argument('hosts', nargs='+', help='IP addresses')
+    parser.add_argument('--count', '-c', type=int, default=4, help='Requests per host')
+    parser.add_argument('--interval', '-i', type=float, default=.2, help='Seconds between rounds')
+    parser.add_argument('--interface', '-I', help='Network interface to send from')
+    parser.add_argument('--udp', action='store_true', help='UDP echo (port 7) instead of ICMP')
+    args = vars(parser.parse_args())
+    pinger = Pinger(args['count'], args['interval'], interface=args['interface'],
+                    protocol=Pinger.UDP if args['udp'] else Pinger.ICMP)
+    for result in pinger.probe(args['hosts']).values():
+        print(result)
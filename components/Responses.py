@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+components/Responses.py
+
+Author:
+    Zachary Smith
+"""
+import argparse
+import datetime
+import re
+import sys
+import timeit
+from collections import namedtuple
+
+# Records of the boot loader's responses. Fields missing from a response are None.
+CableReading = namedtuple('CableReading', ['leg1', 'leg2', 'leak'])               # `adc1`, ohms
+SupplyReading = namedtuple('SupplyReading', ['volts'])                            # `15v`
+ClockReading = namedtuple('ClockReading', ['clock'])                              # `time`, datetime
+NetConfig = namedtuple('NetConfig', ['mac', 'ip', 'mask', 'gateway'])             # `netcfg`
+Banner = namedtuple('Banner', ['board_type', 'mac', 'mram', 'duart1', 'duart2', 'ready'])  # after `reset`
+
+
+def _text(value: bytes) -> str:
+    return value.decode('ascii', 'replace')
+
+
+def _passed(value: bytes) -> bool:
+    return value == b'passed'
+
+
+def _clock(value: bytes) -> datetime.datetime:
+    return datetime.datetime.strptime(' '.join(_text(value).split()), '%m/%d/%y %H:%M:%S')
+
+
+class Grammar(object):
+    """
+    Fields of one command's response, all found in a single pass over the raw bytes
+    by one precompiled alternation, one named group per field.
+    """
+
+    def __init__(self, record, fields):
+        """
+        Args:
+            record: namedtuple type of the result
+            fields: [(field, regex capturing the value as `(?P<value>...)`, converter of the value's bytes)]
+        """
+        self.record = record
+        # fields in record order, the value group of each alternative is numbered after its position
+        self.__fields = [next(field for field in fields if field[0] == name) for name in record._fields]
+        self.__converters = [converter for _, _, converter in self.__fields]
+        self.__pattern = re.compile(b'|'.join(regex.replace(b'(?P<value>', b'(?P<' + name.encode('ascii') + b'>')
+                                              for name, regex, _ in self.__fields))
+
+    def parse(self, response: bytes):
+        """
+        Args:
+            response: Console bytes, e.g. ExpectResult.response
+
+        Returns:
+            record, the first occurrence of each field
+        """
+        values = [None] * len(self.__converters)
+        for match in self.__pattern.finditer(response):
+            i = match.lastindex - 1
+            if values[i] is None:
+                values[i] = self.__converters[i](match.group(match.lastindex))
+        return self.record._make(values)
+
+
+ADC1 = Grammar(CableReading, [
+    ('leg1', rb'leg1 resistance \(ohms\): (?P<value>\d+)', int),
+    ('leg2', rb'leg2 resistance \(ohms\): (?P<value>\d+)', int),
+    ('leak', rb'distance \(ohms\): (?P<value>\d+)', int),
+])
+SUPPLY = Grammar(SupplyReading, [
+    ('volts', rb'15V Supply: (?P<value>\d+(?:\.\d+)?)', float),
+])
+TIME = Grammar(ClockReading, [
+    ('clock', rb'(?P<value>\d{2}/\d{2}/\d{2}\s+\d{2}:\d{2}:\d{2})', _clock),
+])
+NETCFG = Grammar(NetConfig, [
+    ('mac', rb'mac: (?P<value>[0-9A-Fa-f:]+)', _text),
+    ('ip', rb'ip: (?P<value>\d+\.\d+\.\d+\.\d+)', _text),
+    ('mask', rb'mask: (?P<value>\d+\.\d+\.\d+\.\d+)', _text),
+    ('gateway', rb'gateway: (?P<value>\d+\.\d+\.\d+\.\d+)', _text),
+])
+BANNER = Grammar(Banner, [
+    ('board_type', rb'RLE Technologies (?P<value>\w+) Boot Loader', _text),
+    ('mac', rb'MAC: (?P<value>[0-9A-Fa-f:]+)', _text),
+    ('mram', rb'Testing MRAM: (?P<value>\w+)', _passed),
+    # the firmware's format string is printed verbatim
+    ('duart1', rb'Testing duart1: \d+\{lc:0\} (?P<value>\w+)', _passed),
+    ('duart2', rb'Testing duart2: \d+\{lc:0\} (?P<value>\w+)', _passed),
+    ('ready', rb'(?P<value>User prgm is not valid)', bool),
+])
+
+# Responses as the station receives them (echo included), for the benchmark
+SAMPLES = {
+    'adc1': (ADC1, b'adc1\r\nexternal cable\r\nleg1 resistance (ohms): 14778\r\nleg2 resistance (ohms): 14778\r\n'
+                   b'leak distance (ohms): 0\r\nok\r\n'),
+    '15v': (SUPPLY, b'15v\r\n15V Supply: 15.1V\r\nok\r\n'),
+    'time': (TIME, b'time\r\n10/18/26 12:00:00\r\nok\r\n'),
+    'netcfg': (NETCFG, b'netcfg\r\nmac: 00:25:96:FF:FE:12:34:56\r\nip: 10.0.0.189\r\nmask: 255.255.255.0\r\n'
+                       b'gateway: 10.0.0.1\r\nok\r\n'),
+    'banner': (BANNER, b'\r\nRLE Technologies LD5200 Boot Loader\r\nMAC: 00:25:96:FF:FE:12:34:56\r\n'
+                       b'Testing MRAM: passed\r\nTesting duart1: 1000{lc:0} passed\r\n'
+                       b'Testing duart2: 1000{lc:0} passed\r\nUser prgm is not valid\r\n'),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmark of the boot loader response grammars.')
+    parser.add_argument('--number', '-n', type=int, default=20000, help='Parses per grammar')
+    parser.add_argument('--budget', type=float, help='Microseconds per parse; exit 1 if any grammar is slower')
+    args = vars(parser.parse_args())
+    over = list()
+    for name, (grammar, sample) in SAMPLES.items():
+        record = grammar.parse(sample)
+        if None in record:
+            print('{}: incomplete {}'.format(name, record))
+            over.append(name)
+            continue
+        # best of 5 to keep scheduler noise out
+        seconds = min(timeit.repeat(lambda: grammar.parse(sample), number=args['number'], repeat=5))
+        micro = seconds / args['number'] * 1e6
+        print('{:8} {:6.2f} us  {}'.format(name, micro, record))
+        if args['budget'] and micro > args['budget']:
+            over.append(name)
+    if over:
+        print('Over budget: {}'.format(', '.join(over)))
+        sys.exit(1)
@@ -0,0 +1,280 @@
+"""
+components/Scheduler.py
+
+Author:
+    Zachary Smith
+"""
+import heapq
+import itertools
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from components.Clock import sleep, monotonic
+from components.GPIO import GPIO
+
+_LOGGER = logging.getLogger()
+
+ResourceStatistics = namedtuple('ResourceStatistics', ['acquisitions', 'busy', 'waited'])
+
+
+class Resource(object):
+    """
+    Piece of station hardware only one tray may use at a time.
+    Waiting trays are served by priority, then in the order they asked.
+    A tray may acquire a resource it already holds.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Resource name (see Scheduler)
+        """
+        self.name = name
+        self.owner = None
+        self.__depth = 0
+        self.__queue = list()   # heap of (priority, ticket, owner)
+        self.__tickets = itertools.count()
+        self.__cond = threading.Condition()
+        self.__since = None
+        self.acquisitions = 0
+        self.busy = 0.0
+        self.waited = 0.0
+
+    def acquire(self, owner, priority=0):
+        """
+        Blocks until `owner` holds the resource.
+
+        Args:
+            owner: Tray asking for the resource
+            priority: Lower is served first
+        """
+        with self.__cond:
+            if self.owner is owner:
+                self.__depth += 1
+                return
+            start = monotonic()
+            heapq.heappush(self.__queue, (priority, next(self.__tickets), owner))
+            while self.owner is not None or self.__queue[0][2] is not owner:
+                self.__cond.wait()
+            heapq.heappop(self.__queue)
+            self.owner = owner
+            self.__depth = 1
+            self.__since = monotonic()
+            self.acquisitions += 1
+            self.waited += self.__since - start
+
+    def release(self, owner, all_levels=False) -> int:
+        """
+        Gives the resource up (one level of nesting unless `all_levels`).
+
+        Args:
+            owner: Tray holding the resource
+            all_levels: Release however often it was acquired
+
+        Returns:
+            Levels released
+        """
+        with self.__cond:
+            if self.owner is not owner:
+                raise RuntimeError('{} is not held by {}'.format(self.name, owner))
+            released = self.__depth if all_levels else 1
+            self.__depth -= released
+            if self.__depth == 0:
+                self.owner = None
+                self.busy += monotonic() - self.__since
+                self.__cond.notify_all()
+            return released
+
+    def statistics(self) -> ResourceStatistics:
+        with self.__cond:
+            busy = self.busy + (monotonic() - self.__since if self.owner is not None else 0)
+            return ResourceStatistics(self.acquisitions, busy, self.waited)
+
+
+class Tray(object):
+    """
+    One tray's handle on the station's shared resources. Owning RS232 means the board
+    mux (GPIO.BOARD) is switched to this tray.
+    A tray that has had the console more often is further through its tests and goes first,
+    so started trays finish before new ones are begun.
+    """
+
+    def __init__(self, scheduler, index: int, address: int):
+        """
+        Args:
+            scheduler: Scheduler owning the resources
+            index: Tray index (0-5)
+            address: GPIO.BOARD address of the tray
+        """
+        self.scheduler = scheduler
+        self.index = index
+        self.address = address
+        self.idled = 0.0
+        self.progress = 0   # times the console was acquired
+
+    def __repr__(self):
+        return 'Tray({})'.format(self.index)
+
+    def holds(self, name: str) -> bool:
+        return self.scheduler.resources[name].owner is self
+
+    def acquire(self, *names):
+        """
+        Acquires resources, always in Scheduler.ORDER so trays cannot deadlock.
+        """
+        for name in sorted(names, key=Scheduler.ORDER.index):
+            resource = self.scheduler.resources[name]
+            if resource.owner is self:
+                resource.acquire(self)
+                continue
+            _LOGGER.debug('Tray::acquire:: Tray {} waiting for {}.'.format(self.index, name))
+            resource.acquire(self, priority=-self.progress)
+            if name == Scheduler.RS232:
+                self.progress += 1
+                self.scheduler.select(self.address)
+
+    def release(self, *names):
+        for name in names:
+            self.scheduler.resources[name].release(self)
+
+    @contextmanager
+    def using(self, *names):
+        """
+        Holds resources for the duration of a with block.
+        """
+        self.acquire(*names)
+        try:
+            yield self
+        finally:
+            self.release(*names)
+
+    def idle(self, seconds: float):
+        """
+        Waits without holding anything, e.g. while the board reboots, so other trays can work.
+        Everything held before is held again afterwards.
+
+        Args:
+            seconds: Time the tray has nothing to do
+        """
+        held = dict()
+        for name in Scheduler.ORDER:
+            if self.holds(name):
+                held[name] = self.scheduler.resources[name].release(self, all_levels=True)
+        start = monotonic()
+        sleep(seconds)
+        for name, levels in held.items():
+            for _ in range(levels):
+                self.acquire(name)
+        self.idled += monotonic() - start
+
+
+class Scheduler(object):
+    """
+    Runs the trays of a batch concurrently, one thread per tray, with the station's shared
+    hardware modelled as resources. A tray that is only waiting (board reboot, ping) lends
+    the hardware to the next tray instead of blocking the whole station.
+    Trays can be admitted while the batch runs (rolling loading): the batch lasts as long as
+    a tray runs or one is expected (see expect).
+    """
+
+    # shared station hardware
+    RS232 = 'rs232'             # console, routed to one tray by the board mux (GPIO.BOARD)
+    RS485 = 'rs485'             # ModBus adapter and its port mux (GPIO.RS485)
+    EMULATORS = 'emulators'     # length and short cable emulators
+    ADC = 'adc'                 # ADS1015 on I2C
+    # acquisition order
+    ORDER = [RS232, RS485, EMULATORS, ADC]
+    # name of a tray's thread; threads working for the tray are named after it (e.g. `Tray-2-ADC-sampler`)
+    THREAD = 'Tray-{}'
+
+    def __init__(self, gpio: GPIO):
+        """
+        Args:
+            gpio: GPIO instance driving the muxes
+        """
+        self.gpio = gpio
+        self.resources = {name: Resource(name) for name in self.ORDER}
+        self.makespan = None
+        self.trays = 0          # trays run
+        self.__running = 0      # trays running
+        self.__expected = 0     # trays being loaded, see expect
+        self.__cond = threading.Condition()
+
+    def tray(self, index: int, address: int) -> Tray:
+        return Tray(self, index, address)
+
+    def select(self, address: int):
+        """
+        Switches the board mux. Caller holds RS232.
+        """
+        self.gpio.stage(GPIO.BOARD, state=address)
+        self.gpio.commit()
+
+    def _work(self, tray: Tray, job):
+        try:
+            job(tray)
+        finally:
+            with self.__cond:
+                self.__running -= 1
+                self.__cond.notify_all()
+
+    def _start(self, tray: Tray, job):
+        """
+        Starts a tray's thread. Caller holds the condition.
+        """
+        self.__running += 1
+        self.trays += 1
+        thread = threading.Thread(target=self._work, args=(tray, job), name=self.THREAD.format(tray.index), daemon=True)
+        thread.start()
+
+    def expect(self):
+        """
+        Keeps the batch running for a tray about to be admitted, e.g. while the operator swaps its board.
+        Each expect is ended by admit or withdraw.
+        """
+        with self.__cond:
+            self.__expected += 1
+
+    def withdraw(self):
+        """
+        The expected tray is not coming.
+        """
+        with self.__cond:
+            self.__expected -= 1
+            self.__cond.notify_all()
+
+    def admit(self, tray: Tray, job):
+        """
+        Starts a tray in the running batch, with the priority of a new tray (see Tray).
+
+        Args:
+            tray: Tray to run
+            job: Callable taking the Tray
+        """
+        with self.__cond:
+            self.__expected = max(self.__expected - 1, 0)
+            self._start(tray, job)
+        _LOGGER.info('Scheduler::admit:: Tray {} admitted.'.format(tray.index))
+
+    def run(self, jobs: dict):
+        """
+        Runs one thread per tray and waits for all of them, and for the trays admitted meanwhile.
+
+        Args:
+            jobs: {Tray: callable taking the Tray}
+        """
+        start = monotonic()
+        with self.__cond:
+            for tray, job in jobs.items():
+                self._start(tray, job)
+            self.__cond.wait_for(lambda: not self.__running and not self.__expected)
+        self.makespan = monotonic() - start
+        _LOGGER.info('Scheduler::run:: {} trays in {:.1f} s.'.format(self.trays, self.makespan))
+        for name in self.ORDER:
+            stats = self.resources[name].statistics()
+            _LOGGER.info('Scheduler::run:: {} busy {:.1f} s ({} acquisitions, {:.1f} s waited).'
+                         .format(name, stats.busy, stats.acquisitions, stats.waited))
+        _LOGGER.info('Scheduler::run:: GPIO {} commits ({} unchanged), {:.2f} s settling.'
+                     .format(self.gpio.commits, self.gpio.idle_commits, self.gpio.settle_time))
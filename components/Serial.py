@@ -6,82 +6,620 @@ Author:
 """
 import re
 import logging
-from time import sleep
-from datetime import datetime, timedelta
-
+import threading
+import weakref
+from collections import deque, namedtuple
 import serial
+from components.Clock import get_clock, sleep, monotonic
 from components.Exceptions import TimeoutException, ConnectionRefusalException
 
 _LOGGER = logging.getLogger()
 
+# Result of Serial.expect
+#   index: position of the matching pattern in the list given
+#   pattern: the pattern as given
+#   groups: captured groups decoded as ASCII strings
+#   response: bytes received up to and including the match
+ExpectResult = namedtuple('ExpectResult', ['index', 'pattern', 'groups', 'response'])
+
+# Last line of the boot loader's banner after a reset, and of the menu it prints for `?`
+BOOT_DONE = 'User prgm is not valid'
+MENU_DONE = 'run    - run the flash application'
+
+# compiled patterns, keyed by the pattern as given
+_PATTERN_CACHE = dict()
+
+# Per-command acknowledgement waits, see Serial.wait_statistics
+#   count: commands sent
+#   acked: commands acknowledged by echo or `ok`
+#   fallbacks: commands that fell back to the fixed delay
+#   total: seconds spent waiting
+#   mean, minimum, maximum: seconds per command
+#   saved: seconds saved against the fixed delay
+WaitStatistics = namedtuple('WaitStatistics', ['count', 'acked', 'fallbacks', 'total',
+                                               'mean', 'minimum', 'maximum', 'saved'])
+
+
+def compile_pattern(pattern):
+    """
+    Compiles (once) a regex for matching raw console bytes.
+
+    Args:
+        pattern: str, bytes or compiled bytes pattern
+
+    Returns:
+        Compiled bytes regex
+    """
+    compiled = _PATTERN_CACHE.get(pattern)
+    if compiled is None:
+        if isinstance(pattern, str):
+            compiled = re.compile(pattern.encode('ascii'))
+        elif isinstance(pattern, bytes):
+            compiled = re.compile(pattern)
+        else:
+            compiled = pattern
+        _PATTERN_CACHE[pattern] = compiled
+    return compiled
+
+
+class RingBuffer(object):
+    """
+    Bounded FIFO of bytes backed by a preallocated bytearray.
+    When full, the oldest bytes are overwritten. Not thread safe on its own.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Maximum number of bytes held
+        """
+        self.__data = bytearray(capacity)
+        self.__capacity = capacity
+        self.__start = 0
+        self.__length = 0
+        self.total = 0      # bytes ever written, used to mark positions in the stream
+
+    def __len__(self):
+        return self.__length
+
+    def offset(self, mark: int) -> int:
+        """
+        Converts a stream position taken from `total` into an offset from the oldest byte.
+        Positions that were already read or dropped map to 0.
+        """
+        return max(0, self.__length - (self.total - mark))
+
+    def position(self, offset: int) -> int:
+        """
+        Converts an offset from the oldest byte into a stream position (see `offset`).
+        """
+        return self.total - self.__length + offset
+
+    def write(self, chunk) -> int:
+        """
+        Appends bytes to the end of the buffer.
+
+        Args:
+            chunk: bytes-like object
+
+        Returns:
+            Number of old bytes dropped to make room
+        """
+        size = len(chunk)
+        self.total += size
+        if size >= self.__capacity:
+            # only the tail of the chunk fits
+            dropped = self.__length + size - self.__capacity
+            self.__data[:] = chunk[size - self.__capacity:]
+            self.__start = 0
+            self.__length = self.__capacity
+            return dropped
+        dropped = max(0, self.__length + size - self.__capacity)
+        if dropped:
+            self.__start = (self.__start + dropped) % self.__capacity
+            self.__length -= dropped
+        end = (self.__start + self.__length) % self.__capacity
+        first = min(size, self.__capacity - end)
+        self.__data[end:end + first] = chunk[:first]
+        self.__data[:size - first] = chunk[first:]
+        self.__length += size
+        return dropped
+
+    def peek(self, start=0, size=None) -> bytes:
+        """
+        Copies bytes out of the buffer without consuming them.
+
+        Args:
+            start: Offset from the oldest byte
+            size: Number of bytes (None for all remaining)
+
+        Returns:
+            bytes
+        """
+        start = min(start, self.__length)
+        if size is None or start + size > self.__length:
+            size = self.__length - start
+        begin = (self.__start + start) % self.__capacity
+        first = min(size, self.__capacity - begin)
+        return bytes(self.__data[begin:begin + first] + self.__data[:size - first])
+
+    def read(self, size) -> bytes:
+        """
+        Removes and returns up to `size` of the oldest bytes.
+        """
+        ret_val = self.peek(0, size)
+        self.__start = (self.__start + len(ret_val)) % self.__capacity
+        self.__length -= len(ret_val)
+        return ret_val
+
+    def find(self, sub: bytes, start=0) -> int:
+        """
+        Offset of the first occurrence of `sub` at or after `start`, or -1.
+        """
+        if start >= self.__length:
+            return -1
+        begin = (self.__start + start) % self.__capacity
+        end = begin + self.__length - start
+        if end <= self.__capacity:
+            i = self.__data.find(sub, begin, end)
+            return i if i == -1 else i - begin + start
+        # contiguous tail, then the seam, then the wrapped head
+        i = self.__data.find(sub, begin)
+        if i != -1:
+            return i - begin + start
+        tail = self.__capacity - begin
+        seam = self.peek(max(start, start + tail - len(sub) + 1), 2 * len(sub) - 2).find(sub)
+        if seam != -1:
+            return seam + max(start, start + tail - len(sub) + 1)
+        i = self.__data.find(sub, 0, end - self.__capacity)
+        return i if i == -1 else i + tail + start
+
+    def clear(self):
+        """
+        Drops all buffered bytes.
+        """
+        self.__start = 0
+        self.__length = 0
+
 
 class Serial(object):
     """
     This setup class is specified to work with the current
     boot loader on the LD2100, LD5200.
+
+    A reader thread drains the port into a ring buffer while the port is open.
+    Consumers block on a condition until data arrives or their deadline passes.
+
+    The console's state is tracked from what is sent and seen, so a console known to
+    be at its prompt is verified with a bare line instead of the whole `?` menu.
     """
 
+    # console states, see `state`
+    UNKNOWN = 'unknown'
+    READY = 'ready'                 # at the boot loader prompt
+    MODBUSTEST = 'modbustest'       # answering ModBus, only ctrl-c is understood
+    RESETTING = 'resetting'         # rebooting, input is lost
+    # commands after which the board reboots
+    RESETS = ('reset', 'mac')
+
     __conn_tries = 1
     __max_tries = 3
 
-    def __init__(self, device_file):
+    BUFFER_SIZE = 64 * 1024     # bytes held between reads
+    READ_POLL = .1              # seconds a blocked device read may wait before re-checking for close
+    COMMAND_DELAY = .5          # fixed wait after each command (safe_delays), upper bound for an ack
+    FLUSH_DELAY = .1            # fixed wait after each flush (safe_delays)
+    LATENCY_SAMPLES = 16        # response times kept per command for learning the gap
+    PROBE_TIMEOUT = .5          # seconds the prompt may take to answer a bare line
+
+    def __init__(self, device_file, safe_delays=False):
         """
         Construct serial setup with 9600/N/8/1 >> device file
 
         Args:
             device_file: e.g. /dev/ttyUSB0
+            safe_delays: If True, wait the fixed COMMAND_DELAY/FLUSH_DELAY instead of
+                         waiting for the boot loader to acknowledge each command
         """
         # Initialize serial conn
         self.__device_file = device_file
-        self.__conn = serial.Serial(self.__device_file, timeout=10)
+        self.__safe_delays = safe_delays
+        self.__wait_stats = dict()
+        self.__last_command = None      # (name, monotonic time written)
+        self.__last_received = 0        # monotonic time of the last chunk read
+        self.__echoes = False           # console has echoed a command
+        self.__state = self.UNKNOWN
+        self.handshakes = 0             # full `?` menu verifications
+        self.probes = 0                 # bare line verifications
+        self.__buffer = RingBuffer(self.BUFFER_SIZE)
+        self.__data_ready = threading.Condition()
+        self.__reader = None    # type: threading.Thread
+        self.__reader_error = None
+        self.__conn = serial.Serial(self.__device_file, timeout=self.READ_POLL)
+        self._start_reader()
         self._verify_connection()
-        self.__timeout_start = None # type: datetime
-    
-    def _check_timeout(self, timeout, timeout_start):
-        difference = datetime.now() - timeout_start  # type: timedelta
-        if difference.total_seconds() >= timeout:
-            raise TimeoutException()
+
+    @property
+    def state(self) -> str:
+        """
+        Console state as last seen: UNKNOWN, READY, MODBUSTEST or RESETTING.
+        """
+        return self.__state
+
+    @property
+    def is_open(self) -> bool:
+        return self.__conn.is_open
+
+    def handover(self, state=UNKNOWN):
+        """
+        Hands the open port to another console, e.g. after the RS232 mux switched boards
+        (see ConnectionPool). Buffered input is dropped and the console's state is the one given.
+
+        Args:
+            state: Last known state of the console taking over
+        """
+        _LOGGER.debug('Serial::handover:: Console {} on {}.'.format(state, self.__device_file))
+        self._flush_input()
+        if self.__reader:
+            self.__reader.name = self._reader_name()
+        self.__last_command = None
+        self.__state = state
+
+    def _start_reader(self):
+        """
+        Starts the background thread that fills the ring buffer.
+        The thread only holds a weak reference, so a dropped Serial still closes its port.
+        """
+        self.__reader_error = None
+        self.__reader = threading.Thread(target=Serial._reader_loop, args=(weakref.ref(self), self.__conn),
+                                         name=self._reader_name(), daemon=True)
+        self.__reader.start()
+
+    def _reader_name(self) -> str:
+        """
+        The reader is named after the thread using the port, so its records land in that tray's log.
+        """
+        return '{}-Serial-reader-{}'.format(threading.current_thread().name, self.__device_file)
+
+    def _stop_reader(self):
+        """
+        Stops the reader thread. Returns within READ_POLL seconds (at once where pyserial can cancel reads).
+        """
+        reader = self.__reader
+        self.__reader = None
+        if reader and reader is not threading.current_thread():
+            if hasattr(self.__conn, 'cancel_read'):
+                # wake the reader instead of waiting out READ_POLL
+                self.__conn.cancel_read()
+            reader.join()
+
+    @staticmethod
+    def _reader_loop(ref, conn):
+        """
+        Blocks on the device and moves whatever is available into the ring buffer.
+
+        Args:
+            ref: weak reference to the owning Serial
+            conn: its serial.Serial
+        """
+        while conn.is_open:
+            try:
+                # block for the first byte, then take everything already waiting
+                chunk = conn.read(1)
+                if chunk and conn.in_waiting:
+                    chunk += conn.read(conn.in_waiting)
+                error = None
+            except (serial.SerialException, OSError, TypeError) as e:
+                chunk, error = None, e
+            self = ref()
+            if self is None or self.__reader is not threading.current_thread():
+                return
+            if error:
+                _LOGGER.error('Serial::_reader_loop:: Read failed on {}: {}'
+                              .format(self.__device_file, error))
+                with self.__data_ready:
+                    self.__reader_error = error
+                    self.__data_ready.notify_all()
+                return
+            if chunk:
+                with self.__data_ready:
+                    dropped = self.__buffer.write(chunk)
+                    self.__last_received = monotonic()
+                    self.__data_ready.notify_all()
+                if dropped:
+                    _LOGGER.warning('Serial::_reader_loop:: Buffer full. Dropped {} bytes.'.format(dropped))
+            # don't keep the Serial alive while blocked in read
+            del self
+
+    def _wait(self, predicate, deadline):
+        """
+        Waits on the buffer condition until `predicate()` is truthy or the deadline passes.
+        Must be called with the condition held.
+
+        Args:
+            predicate: callable evaluated with the lock held
+            deadline: monotonic() time at which to give up
+
+        Returns:
+            Last value of predicate()
+        """
+        result = predicate()
+        while not result:
+            if self.__reader_error:
+                raise serial.SerialException(str(self.__reader_error))
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            get_clock().wait(self.__data_ready, remaining)
+            result = predicate()
+        return result
 
     def reset_input_buffer(self):
         """
         Resets the buffer to empty.
         """
         _LOGGER.debug('Serial::reset_input_buffer:: Flushing input buffer.')
-        self.__conn.flushInput()
-        sleep(.1)
+        if self.__safe_delays:
+            self._flush_input()
+            sleep(self.FLUSH_DELAY)
+        self._flush_input()
+
+    def _flush_input(self):
+        """
+        Drops the input received so far. The device's own queue is only flushed while no reader
+        drains it: a flush between the reader's select and read returns no data, which pyserial
+        takes for a disconnected device.
+        """
+        if self.__reader is None and self.__conn.is_open:
+            self.__conn.reset_input_buffer()
+        with self.__data_ready:
+            self.__buffer.clear()
 
     def read_line(self, timeout=0.5):
         """
-        Read line and return char array
-        Read line and return char array
+        Read line and return char array.
+        If no full line arrives within the timeout, whatever partial line is buffered is returned.
+
+        Args:
+            timeout: seconds to wait for the line terminator
 
         Returns:
             Byte string of chars
         """
-        # Initialize timeout
-        timeout_start = datetime.now()
-        ret_val = b''
-        try:
-            while ret_val[-1:] != b'\n' or ret_val[-1:] is None:
-                self._check_timeout(timeout, timeout_start)
-                if self.__conn.inWaiting() > 0:
-                    ret_val += self.__conn.read()
-        except TimeoutException:
-            _LOGGER.debug("Serial::read_line:: Timeout raised.")
+        deadline = monotonic() + timeout
+        with self.__data_ready:
+            end = self._wait(lambda: self.__buffer.find(b'\n') + 1, deadline)
+            if not end:
+                _LOGGER.debug("Serial::read_line:: Timeout raised.")
+                end = len(self.__buffer)
+            ret_val = self.__buffer.read(end)
         _LOGGER.debug('Serial::read_line:: Read line: {}'.format(str(ret_val)))
         return ret_val
 
+    @staticmethod
+    def _command_name(command) -> str:
+        """
+        Key for per-command statistics, e.g. b'rly4on\\n' -> 'rly4on', b'ip 10.0.0.1\\n' -> 'ip'
+        """
+        words = command.split()
+        return words[0].decode('ascii', 'replace') if words else repr(command)
+
+    def _minimum_gap(self, name) -> float:
+        """
+        Shortest time the boot loader has needed to finish answering `name`.
+        The next command is not written sooner than this after `name`.
+        """
+        stats = self.__wait_stats.get(name)
+        if not stats or not stats['samples']:
+            return 0
+        return min(stats['samples'])
+
+    def _hold_gap(self):
+        """
+        Learns how long the previous command's response lasted, then waits out
+        the learned minimum gap for that command.
+        """
+        last_name, last_time = self.__last_command
+        with self.__data_ready:
+            last_received = self.__last_received
+        stats = self.__wait_stats.get(last_name)
+        if stats is not None and last_received > last_time:
+            stats['samples'].append(last_received - last_time)
+        gap = last_time + self._minimum_gap(last_name) - monotonic()
+        if gap > 0:
+            sleep(gap)
+
+    def _wait_ack(self, command, mark: int, timeout: float):
+        """
+        Waits for the echo of `command` or an `ok` prompt after stream position `mark`.
+        Once the console is known to echo, only the echo counts: an `ok` may be the
+        tail of the previous command's response.
+        Nothing is consumed, so the response remains available to expect/read_line.
+
+        Returns:
+            Stream position where the response starts (after the echo), or None on timeout
+        """
+        echo = command.strip()
+
+        def acknowledged():
+            offset = self.__buffer.offset(mark)
+            i = self.__buffer.find(echo, offset) if echo else -1
+            if i != -1:
+                self.__echoes = True
+                return self.__buffer.position(i + len(echo))
+            if not self.__echoes and self.__buffer.find(b'ok', offset) != -1:
+                return mark
+            return None
+
+        with self.__data_ready:
+            return self._wait(acknowledged, monotonic() + timeout)
+
+    def _record_wait(self, name, waited: float, acked):
+        """
+        Adds one send to the statistics of `name`.
+        """
+        stats = self.__wait_stats.setdefault(name, {'count': 0, 'acked': 0, 'total': 0,
+                                                    'minimum': None, 'maximum': 0,
+                                                    'samples': deque(maxlen=self.LATENCY_SAMPLES)})
+        stats['count'] += 1
+        stats['total'] += waited
+        stats['maximum'] = max(stats['maximum'], waited)
+        stats['minimum'] = waited if stats['minimum'] is None else min(stats['minimum'], waited)
+        if acked:
+            stats['acked'] += 1
+
+    def wait_statistics(self) -> dict:
+        """
+        Time spent waiting after each kind of command.
+
+        Returns:
+            dict of command name -> WaitStatistics
+        """
+        ret_val = dict()
+        for name, stats in self.__wait_stats.items():
+            ret_val[name] = WaitStatistics(stats['count'], stats['acked'],
+                                           0 if self.__safe_delays else stats['count'] - stats['acked'],
+                                           stats['total'], stats['total'] / stats['count'],
+                                           stats['minimum'], stats['maximum'],
+                                           stats['count'] * self.COMMAND_DELAY - stats['total'])
+        return ret_val
+
     def send_command(self, command):
         """
-        Sends command to the board.
+        Sends command to the board. Returns once the boot loader echoes the command or
+        prints `ok`, or after COMMAND_DELAY if it does neither. With safe_delays the
+        full COMMAND_DELAY is always waited.
 
         Args:
             command: byte array to send over serial comm link
+
+        Returns:
+            Stream position where the response starts, for expect(since=...)
         """
+        name = self._command_name(command)
+        if self.__last_command and not self.__safe_delays:
+            # do not talk over the previous command
+            self._hold_gap()
+        with self.__data_ready:
+            mark = self.__buffer.total
+        start = monotonic()
         self.__conn.write(command)
         _LOGGER.debug('Serial::send_command:: Wrote: {}'.format(str(command)))
-        self.__conn.reset_output_buffer()
-        sleep(.5)
+        # drain, not reset: resetting the output buffer discards whatever is not on the wire yet
+        self.__conn.flush()
+        response_start = mark
+        acked = False
+        if self.__safe_delays:
+            sleep(self.COMMAND_DELAY)
+        else:
+            ack = self._wait_ack(command, mark, self.COMMAND_DELAY)
+            if ack is None:
+                _LOGGER.debug('Serial::send_command:: No acknowledgement for `{}`.'.format(name))
+            else:
+                response_start = ack
+                acked = True
+        self.__last_command = (name, start)
+        self._record_wait(name, monotonic() - start, acked)
+        self._track(name, acked)
+        return response_start
+
+    def _track(self, name, acked):
+        """
+        Updates the console state after sending command `name`.
+        """
+        if name in self.RESETS:
+            self.__state = self.RESETTING
+        elif name == 'modbustest':
+            self.__state = self.MODBUSTEST
+        elif name == '\x03':
+            # ctrl-c leaves modbustest
+            self.__state = self.READY
+        elif self.__state in (self.MODBUSTEST, self.RESETTING):
+            # echoed or not, the command was not taken
+            pass
+        elif acked:
+            self.__state = self.READY
+        elif not self.__safe_delays and self.__echoes:
+            # a console that echoes stayed silent
+            self.__state = self.UNKNOWN
+
+    def expect(self, patterns, timeout=5, consume=True, since=None) -> ExpectResult:
+        """
+        Waits until one of the patterns appears in the console output.
+        Data is matched as it arrives, one line at a time including the partial
+        line at the end of the buffer, so patterns must be anchored with a
+        terminator (e.g. `\\s`) where a prefix of the text could also match.
+        When several patterns match, the one starting earliest wins, then the
+        one listed first.
+
+        Args:
+            patterns: list of regex strings (or a single string)
+            timeout: seconds to wait before TimeoutException is raised
+            consume: remove the response from the buffer if True
+            since: stream position (from send_command) before which nothing is matched
+
+        Returns:
+            ExpectResult of the first match
+        """
+        if isinstance(patterns, (str, bytes)):
+            patterns = [patterns]
+        compiled = [compile_pattern(p) for p in patterns]
+        deadline = monotonic() + timeout
+        # stream position of the line currently being matched
+        with self.__data_ready:
+            scan = {'line_start': since if since is not None else self.__buffer.position(0)}
+
+        def search():
+            line_start = self.__buffer.offset(scan['line_start'])
+            data = self.__buffer.peek(line_start)
+            best = None
+            for i, _re in enumerate(compiled):
+                match = _re.search(data)
+                if match and (best is None or match.start() < best[1].start()):
+                    best = (i, match)
+            if best is None:
+                # complete lines can no longer match, skip them next time
+                scan['line_start'] = self.__buffer.position(line_start + data.rfind(b'\n') + 1)
+                return None
+            return best[0], best[1], line_start + best[1].end()
+
+        with self.__data_ready:
+            found = self._wait(search, deadline)
+            if not found:
+                raise TimeoutException('None of {} matched within {} s'.format(patterns, timeout))
+            index, match, end = found
+            # what came before `since` belongs to an earlier command
+            first = self.__buffer.offset(since) if since is not None else 0
+            if consume:
+                response = self.__buffer.read(end)[first:]
+            else:
+                response = self.__buffer.peek(first, end - first)
+        if patterns[index] in (BOOT_DONE, MENU_DONE):
+            # the boot loader takes commands after its banner or menu
+            self.__state = self.READY
+        groups = tuple(g.decode('ascii', 'replace') if g is not None else None for g in match.groups())
+        _LOGGER.debug('Serial::expect:: Matched {} with groups {}'.format(patterns[index], groups))
+        return ExpectResult(index, patterns[index], groups, response)
+
+    def send_expect(self, command, patterns, timeout=5) -> ExpectResult:
+        """
+        Sends command to board and waits for one of the patterns. The input buffer
+        is flushed afterwards, whether or not a pattern matched.
+
+        Args:
+            command: Byte array to send over serial comm link
+            patterns: list of regex strings
+            timeout: seconds to wait before TimeoutException is raised
+
+        Returns:
+            ExpectResult of the first match
+        """
+        _LOGGER.debug('Serial::send_expect:: Sending: {}'.format(command))
+        since = self.send_command(command)
+        try:
+            return self.expect(patterns, timeout, since=since)
+        finally:
+            self.reset_input_buffer()
 
     def read_stop(self, command, regex: str, timeout=5):
         """
@@ -96,32 +634,14 @@ class Serial(object):
         Returns:
             Full byte array response up to and including matching regex line
         """
-        _LOGGER.debug('Serial::read_stop:: Sending: {}'.format(command))
         _LOGGER.debug('Serial::read_stop:: Expecting regex: {}'.format(regex))
-        # compile regex
-        _re = re.compile(regex)
-        # send the command
-        self.send_command(command)
-        # return variable
-        ret_val = b''
-        # Initialize timeout
-        timeout_start = datetime.now()
-        found = False
         try:
-            while not found:
-                self._check_timeout(timeout, timeout_start)
-                # grab response
-                line = self.read_line()
-                ret_val += line
-                # set found lv
-                found = _re.search(str(line))
+            return self.send_expect(command, [regex], timeout).response
         except TimeoutException:
             _LOGGER.debug("Serial::read_stop:: Timeout raised.")
             if timeout != 5:
                 raise TimeoutException
-        finally:
-            self.reset_input_buffer()
-        return ret_val
+        return b''
 
     def open(self):
         """
@@ -130,51 +650,183 @@ class Serial(object):
         _LOGGER.info('Serial::open:: Opening connection...')
         if not self.__conn.is_open:
             self.__conn.open()
+            self._start_reader()
             self._verify_connection()
         else:
             _LOGGER.info('Serial::open:: Connection already open.')
 
+    def suspend(self):
+        """
+        Stops reading and closes the port so another Serial can use the device,
+        e.g. while the RS232 mux is switched to another tray.
+        """
+        _LOGGER.debug('Serial::suspend:: Suspending {}.'.format(self.__device_file))
+        self._stop_reader()
+        self.__conn.close()
+
+    def resume(self):
+        """
+        Reopens the port after suspend. Whatever arrived in between belonged to another tray and is dropped.
+        """
+        _LOGGER.debug('Serial::resume:: Resuming {}.'.format(self.__device_file))
+        if not self.__conn.is_open:
+            self.__conn.open()
+        self._flush_input()
+        # the gap since the last command says nothing about its response any more
+        self.__last_command = None
+        self._start_reader()
+
+    def _probe(self) -> bool:
+        """
+        Cheap check that a console at its prompt still answers: a bare line gets `ok`.
+        """
+        self.reset_input_buffer()
+        self.__conn.write(b'\r\n')
+        try:
+            self.expect(r'ok\r?\n', self.PROBE_TIMEOUT)
+        except TimeoutException:
+            _LOGGER.info('Serial::_probe:: No prompt on {}.'.format(self.__device_file))
+            self.__state = self.UNKNOWN
+            return False
+        self.probes += 1
+        return True
+
     def _verify_connection(self, timeout=7):
         """
-        Verifies connection.
+        Verifies connection. A console known to be at its prompt is probed with a bare line,
+        a rebooting one is waited for, anything else gets the full `?` menu handshake.
 
         Args:
             timeout: Time allowed before retry or exception raise
         """
+        if self.__state == self.MODBUSTEST:
+            self.__conn.write(b'\x03\n')
+            self.__state = self.READY
+        if self.__state == self.RESETTING and self.wait_ready(timeout):
+            return
+        if self.__state == self.READY and self._probe():
+            return
         if self.__conn_tries > self.__max_tries:
             # reset connection tries
             self.__conn_tries = 1
             raise ConnectionRefusalException('Connection failed after {} attempts'
                                              .format(self.__max_tries))
+        if self._handshake(timeout):
+            # reset connection tries
+            self.__conn_tries = 1
+            return
+        self.__conn_tries += 1
+        if self.__conn_tries <= self.__max_tries:
+            _LOGGER.info('Serial::_verify_connection:: Retrying... Attempt {} of {}'
+                         .format(self.__conn_tries, self.__max_tries))
+        # recurse
+        self._verify_connection(timeout)
+
+    def _handshake(self, timeout) -> bool:
+        """
+        One `?` menu handshake.
+
+        Returns:
+            False if the menu did not come within timeout
+        """
         # Reading variable
-        _LOGGER.info('Serial::_verify_connection:: Verifying connection with {}'
+        _LOGGER.info('Serial::_handshake:: Verifying connection with {}'
                      .format(self.__device_file))
         line = ''
         # Initialize timeout
-        timeout_start = datetime.now()
+        deadline = monotonic() + timeout
         # clear input
-        self.__conn.reset_input_buffer()
+        self._flush_input()
         # init help function
         self.__conn.write(b'?\r\n')
         try:
             # last line of main menu in boot loader
-            while line != b'run    - run the flash application\r\n':
-                self._check_timeout(timeout, timeout_start)
-                line = self.read_line()
-            # reset connection tries
-            self.__conn_tries = 1
-            _LOGGER.info('Serial::_verify_connection:: Connection succeeded.')
+            while line != MENU_DONE.encode('ascii') + b'\r\n':
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise TimeoutException()
+                line = self.read_line(min(remaining, .5))
         except TimeoutException:
-            self.__conn_tries += 1
-            if self.__conn_tries <= self.__max_tries:
-                _LOGGER.info('Serial::_verify_connection:: Retrying... Attempt {} of {}'
-                             .format(self.__conn_tries, self.__max_tries))
-            # recurse
-            self._verify_connection(timeout)
+            self.__state = self.UNKNOWN
+            return False
+        self.__state = self.READY
+        self.handshakes += 1
+        _LOGGER.info('Serial::_handshake:: Connection succeeded.')
+        return True
+
+    def alive(self, timeout=3, boot=10) -> bool:
+        """
+        Whether the console still answers, e.g. after a failed test. Unlike _verify_connection
+        it makes one attempt and does not raise, so a dead console is told apart quickly.
+
+        Args:
+            timeout: Seconds the console may take to answer
+            boot: Seconds allowed to a console that is rebooting
+
+        Returns:
+            False if the console did not answer
+        """
+        if not self.is_open:
+            return False
+        if self.__state == self.MODBUSTEST:
+            self.__conn.write(b'\x03\n')
+            self.__state = self.READY
+        if self.__state == self.RESETTING:
+            return self.wait_ready(boot, ask=True)
+        return (self.__state == self.READY and self._probe()) or self._handshake(timeout)
+
+    def wait_ready(self, timeout=10, poll=1.5, ask=False) -> bool:
+        """
+        Waits until the boot loader takes commands after a reset: the end of its banner or,
+        when the banner went by unseen (e.g. while suspended), the end of the menu it prints
+        for `?`. The menu is asked for whenever the console stayed silent for `poll` s.
+
+        Args:
+            timeout: Seconds the boot may still take
+            poll: Seconds of silence before asking again (longer than the menu takes to print)
+            ask: Ask for the menu straight away, the banner may have gone by
+
+        Returns:
+            False if the boot loader did not answer within timeout
+        """
+        deadline = monotonic() + timeout
+        with self.__data_ready:
+            seen = self.__buffer.total
+        if ask:
+            self.__conn.write(b'?\r\n')
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                self.__state = self.UNKNOWN
+                return False
+            try:
+                self.expect([BOOT_DONE, MENU_DONE], min(poll, remaining))
+                break
+            except TimeoutException:
+                pass
+            with self.__data_ready:
+                silent, seen = seen == self.__buffer.total, self.__buffer.total
+            if silent:
+                # input is lost while the board boots, so keep asking
+                self.__conn.write(b'?\r\n')
+        self.reset_input_buffer()
+        return True
 
     def close(self):
         """
         Close connection.
         """
         _LOGGER.info('Serial::close:: Closing connection with {}'.format(self.__device_file))
+        for name, stats in sorted(self.wait_statistics().items()):
+            _LOGGER.info('Serial::close:: `{}` x{}: waited {:.2f} s ({} acked), saved {:.2f} s.'
+                         .format(name, stats.count, stats.total, stats.acked, stats.saved))
+        _LOGGER.info('Serial::close:: Verified {} times by menu, {} by prompt.'.format(self.handshakes, self.probes))
+        self._stop_reader()
         self.__conn.close()
+
+    def __del__(self):
+        # an abandoned Serial releases the port (and stops its reader) like a plain serial.Serial
+        conn = getattr(self, '_Serial__conn', None)
+        if conn is not None:
+            self.__reader = None
+            conn.close()
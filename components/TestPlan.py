@@ -0,0 +1,340 @@
+"""
+components/TestPlan.py
+
+Author:
+    Zachary Smith
+"""
+import logging
+from collections import namedtuple, OrderedDict
+
+from components.Clock import monotonic
+from components.LDBoard import LDBoard
+from components.LDBoardTester import LDBoardTester
+from components.Scheduler import Scheduler
+
+_LOGGER = logging.getLogger()
+
+LD2100 = LDBoardTester.LD2100
+LD5200 = LDBoardTester.LD5200
+
+# step every console step requires: passed while the board's console answers
+CONSOLE = 'rs232_connection'
+
+# Board under test: type, GPIO.BOARD address, MAC to write (None keeps the board's) and IP address to assign
+Target = namedtuple('Target', ['board_type', 'address', 'mac', 'ip_address'])
+
+
+class Step(object):
+    """
+    One test of the plan, described rather than coded.
+    """
+
+    def __init__(self, name, method, args=lambda target: (), label=None, boards=(LD2100, LD5200),
+                 requires=('rs232_connection',), resources=(Scheduler.RS232,), timeout=10, flag=None, report=True):
+        """
+        Args:
+            name: Result name (see LDBoard.process_test_result)
+            method: LDBoardTester method running the test
+            args: Callable returning the method's arguments for a Target
+            label: Text shown while the step runs
+            boards: Board types the step applies to
+            requires: Steps that must have passed first (CONSOLE: a console that still answers)
+            resources: Scheduler resources held while the step runs
+            timeout: Seconds the step is budgeted (progress and ETA, overruns are logged)
+            flag: main.py flag selecting the step (None: --all only)
+            report: Recorded as a test result and counted for progress (housekeeping otherwise,
+                run even after a failure stopped the plan)
+        """
+        self.name = name
+        self.method = method
+        self.args = args
+        self.label = label if label else name
+        self.boards = boards
+        self.requires = requires
+        self.resources = resources
+        self.timeout = timeout
+        self.flag = flag
+        self.report = report
+
+    def __repr__(self):
+        return 'Step({})'.format(self.name)
+
+
+STEPS = [
+    Step('rs232_connection', 'connect_serial', lambda t: (t.mac,), 'Writing MAC address',
+         requires=(), timeout=40, flag='rs232'),
+    Step('datetime_set', 'test_datetime_set', label='Datetime write'),
+    # an LD5200's LED is sampled while it reboots (see LDBoardTester.test_led)
+    Step('startup_sequence', 'test_startup_sequence', lambda t: (t.board_type,), 'Startup sequence test',
+         resources=(Scheduler.RS232, Scheduler.ADC), timeout=20),
+    Step('ps_voltage', 'test_voltage', label='Voltage level check', timeout=5),
+    # LD2100s use either (I0, I1) or (I2, I3)
+    Step('relay_test', 'test_relay',
+         lambda t: (t.board_type, ('last2' if t.address == 4 else 'first2') if t.board_type == LD2100 else None),
+         'Relay test', timeout=30, flag='relay'),
+    Step('length_detection', 'test_length_detector', lambda t: (t.board_type,), 'Cable emulator (length)',
+         resources=(Scheduler.RS232, Scheduler.EMULATORS), timeout=60, flag='length'),
+    Step('short_detection', 'test_short_detector', lambda t: (t.board_type,), 'Cable emulator (short)',
+         resources=(Scheduler.RS232, Scheduler.EMULATORS), timeout=60, flag='short'),
+    Step('rs485_modbus', 'test_modbus', lambda t: (t.board_type, t.address), 'RS485 ModBus',
+         resources=(Scheduler.RS232, Scheduler.RS485), timeout=15, flag='rs485'),
+    Step('datetime_read', 'test_datetime_read', label='Datetime read',
+         requires=('rs232_connection', 'datetime_set'), timeout=5),
+    Step('ip_address', 'configure_ip_address', lambda t: (t.ip_address,), 'IP address', flag='eth'),
+    # an LD5200 is reset to light its LED, an LD2100's is read without the console
+    Step('led_test', 'test_led', lambda t: (t.board_type,), 'LED test', boards=(LD5200,),
+         resources=(Scheduler.RS232, Scheduler.ADC), timeout=25, flag='led'),
+    Step('led_test', 'test_led', lambda t: (t.board_type,), 'LED test', boards=(LD2100,),
+         requires=(), resources=(Scheduler.ADC,), timeout=5, flag='led'),
+    Step('output_current', 'output_current', label='Current source', boards=(LD5200,),
+         resources=(Scheduler.RS232, Scheduler.ADC), flag='current'),
+    # echo requests of all trays share the network (see components/Ping.py)
+    Step('ethernet_test', 'test_ethernet', lambda t: (t.ip_address,), 'Ethernet test',
+         requires=('ip_address',), resources=(), flag='eth'),
+    Step('ip_reset', 'configure_ip_address', lambda t: ('10.0.0.188',), 'Resetting IP to 10.0.0.188',
+         requires=('ip_address',), flag='eth', report=False),
+]
+
+
+class PlanListener(object):
+    """
+    Hooks for whoever drives a TestPlan (GUI, CLI). The defaults do nothing.
+    """
+
+    def proceed(self, step: Step) -> bool:
+        """
+        Called before each step. False cancels the rest of the plan.
+        """
+        return True
+
+    def started(self, step: Step):
+        pass
+
+    def finished(self, step: Step, result: bool):
+        pass
+
+    def skipped(self, step: Step, blocker: str):
+        """
+        Called instead of started/finished for a step blocked by the failure of `blocker`.
+        """
+        pass
+
+    def error(self, step: Step, exception: Exception) -> bool:
+        """
+        Called when a step raises. True counts the step as failed and carries on, False re-raises.
+        """
+        return False
+
+
+class TestPlan(object):
+    """
+    Ordered test steps for the LD boards and the executor running them, for one board at a time.
+    A step may be listed once per board type under the same name.
+    """
+
+    def __init__(self, steps=None):
+        """
+        Args:
+            steps: Steps in execution order (STEPS by default)
+        """
+        self.steps = list(steps if steps else STEPS)
+
+    @staticmethod
+    def selection(args: dict):
+        """
+        Names of the steps selected by main.py's flags. A retest without flags considers every step.
+
+        Returns:
+            List of names, or None for every step
+        """
+        if not args or args.get('all'):
+            return None
+        names = list(OrderedDict.fromkeys(step.name for step in STEPS if step.flag and args.get(step.flag)))
+        return names if names or not args.get('retest_failed') else None
+
+    def select(self, board_type: str, names=None) -> list:
+        """
+        Steps applying to a board type, restricted to `names` and what they require.
+
+        Args:
+            board_type: LD2100 | LD5200
+            names: Step names (None for all)
+
+        Returns:
+            Steps in plan order
+        """
+        steps = {step.name: step for step in self.steps if board_type in step.boards}
+        wanted = set(steps if names is None else names)
+        pending = [name for name in wanted if name in steps]
+        while pending:
+            for name in steps[pending.pop()].requires:
+                if name not in wanted:
+                    wanted.add(name)
+                    pending.append(name)
+        return [step for step in self.steps if step.name in wanted and board_type in step.boards]
+
+    def retest(self, board_type: str, history: dict, names=None) -> list:
+        """
+        Names of the steps to run again on a board: those that failed or never ran. select() adds
+        what they require (the console connection at least), and housekeeping steps whose
+        requirements run are added too.
+
+        Args:
+            board_type: LD2100 | LD5200
+            history: Latest result of each step (see ResultHistory.load)
+            names: Step names to consider (None for all)
+
+        Returns:
+            List of names, empty if every step passed
+        """
+        return self.__rerun(board_type, [step.name for step in self.select(board_type, names)
+                                         if step.report and not history.get(step.name)], names)
+
+    def resume(self, board_type: str, done, names=None) -> list:
+        """
+        Names of the steps an interrupted run had not finished, housekeeping included,
+        with what they require (see retest).
+
+        Args:
+            board_type: LD2100 | LD5200
+            done: Names of the steps finished or skipped (see BatchJournal.load)
+            names: Step names of the interrupted run (None for all)
+
+        Returns:
+            List of names, empty if the run had finished
+        """
+        return self.__rerun(board_type, [step.name for step in self.select(board_type, names)
+                                         if step.name not in done], names)
+
+    def __rerun(self, board_type: str, rerun: list, names) -> list:
+        """
+        Adds the housekeeping steps whose requirements run again.
+        """
+        if not rerun:
+            return rerun
+        selected = {step.name for step in self.select(board_type, rerun)}
+        return [step.name for step in self.select(board_type, names)
+                if step.name in rerun or (not step.report and set(step.requires) <= selected)]
+
+    def total(self, board_type: str, names=None) -> int:
+        """
+        Number of reported tests for a board type.
+        """
+        return len([step for step in self.select(board_type, names) if step.report])
+
+    def budget(self, board_type: str, names=None) -> float:
+        """
+        Seconds budgeted for a board type.
+        """
+        return sum(step.timeout for step in self.select(board_type, names))
+
+    def run(self, tester: LDBoardTester, board: LDBoard, target: Target, names=None, tray=None,
+            stubbed=(), listener=None, stop_on_failure=False) -> bool:
+        """
+        Runs the plan for one board. A step is skipped, blocked by the failure at its root,
+        when a step it requires did not pass. A console step that fails has the console checked,
+        and a dead console blocks every console step left.
+        With a tray, resources are held from the first step needing them to the last consecutive one.
+
+        Args:
+            tester: LDBoardTester connected to the board's tray
+            board: LDBoard collecting the results
+            target: Board under test
+            names: Step names to run (None for all)
+            tray: Scheduler Tray when trays share the station
+            stubbed: Step names passed without running (hardware missing from a simulation)
+            listener: PlanListener
+            stop_on_failure: Skip every reported step after the first failure, freeing the
+                station for the other trays
+
+        Returns:
+            False if the listener cancelled the plan
+        """
+        listener = listener if listener else PlanListener()
+        steps = self.select(target.board_type, names)
+        _LOGGER.info('TestPlan::run:: {} steps for {}, budget {} s.'
+                     .format(len(steps), target.board_type, self.budget(target.board_type, names)))
+        passed = dict()
+        blockers = dict()   # step that did not pass -> the failure at its root
+        stopped = None      # first failure, with stop_on_failure
+        held = list()
+        try:
+            for step in steps:
+                if not listener.proceed(step):
+                    return False
+                missing = [name for name in step.requires if not passed.get(name)]
+                if missing or (stopped and step.report):
+                    blocker = blockers.get(missing[0], missing[0]) if missing else stopped
+                    blockers[step.name] = blocker
+                    _LOGGER.info('TestPlan::run:: Skipping {}, blocked by {}.'.format(step.name, blocker))
+                    if step.report:
+                        board.process_test_skipped(step.name, blocker)
+                    listener.skipped(step, blocker)
+                    continue
+                listener.started(step)
+                if step.name in stubbed:
+                    _LOGGER.info('TestPlan::run:: {} is not simulated.'.format(step.name))
+                    result = True
+                else:
+                    if tray:
+                        held = self.__hold(tray, tester, held, step.resources)
+                    # the budget counts the time the tray works, not the time it waits for hardware
+                    start = monotonic() - (tray.idled if tray else 0)
+                    try:
+                        result = getattr(tester, step.method)(*step.args(target))
+                    except Exception as e:
+                        if not listener.error(step, e):
+                            raise
+                        result = False
+                    elapsed = monotonic() - (tray.idled if tray else 0) - start
+                    if elapsed > step.timeout:
+                        _LOGGER.warning('TestPlan::run:: {} took {:.1f} s, budget {} s.'
+                                        .format(step.name, elapsed, step.timeout))
+                passed[step.name] = bool(result)
+                if not result:
+                    blockers[step.name] = step.name
+                    if stop_on_failure and not stopped:
+                        stopped = step.name
+                        _LOGGER.info('TestPlan::run:: {} failed, stopping.'.format(step.name))
+                    if passed.get(CONSOLE) and Scheduler.RS232 in step.resources and not tester.console_alive():
+                        _LOGGER.error('TestPlan::run:: Console lost during {}.'.format(step.name))
+                        # the console steps left are blocked by the step that lost it
+                        passed[CONSOLE] = False
+                        blockers[CONSOLE] = step.name
+                if step.report:
+                    board.process_test_result(step.name, result)
+                elif not result:
+                    board.passing = False
+                listener.finished(step, result)
+                _LOGGER.info('--')  # line break in log
+        finally:
+            if tray:
+                self.__hold(tray, tester, held, ())
+        return True
+
+    @staticmethod
+    def __hold(tray, tester: LDBoardTester, held: list, resources) -> list:
+        """
+        Releases what the next step does not need and acquires the rest.
+        The console port is let go while another tray may have the console.
+
+        Returns:
+            Resources now held
+        """
+        keep = [name for name in held if name in resources]
+        needed = [name for name in resources if name not in keep]
+        if needed and keep and Scheduler.ORDER.index(min(needed, key=Scheduler.ORDER.index)) < \
+                Scheduler.ORDER.index(max(keep, key=Scheduler.ORDER.index)):
+            # acquiring out of Scheduler.ORDER could deadlock, start over
+            keep = list()
+            needed = list(resources)
+        for name in held:
+            if name not in keep:
+                if name == Scheduler.RS232:
+                    tester.suspend_serial()
+                tray.release(name)
+        if needed:
+            tray.acquire(*needed)
+            if Scheduler.RS232 in needed:
+                tester.resume_serial()
+        return keep + needed
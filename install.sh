@@ -1,5 +1,7 @@
 #!/bin/bash
 cat CREDIT.txt
+# measurement statistics (components/ADC.py)
+apt-get install -y python3-numpy
 rm -rf /opt/SeaLion
 mkdir /opt/SeaLion
 cp -R DesktopIcon.png main.py RunMainWindow.py __init__.py components view /opt/SeaLion
@@ -11,6 +11,7 @@ from components.LD5200Tester import LD5200Tester
 from components.LD2100Tester import LD2100Tester
 from components.GPIO import GPIO
 from components.LDBoardTester import LDBoardTester
+from components.Calibration import SettleCalibration
 
 
 def start():
@@ -21,6 +22,8 @@ def start():
                         help='Counts number of `v`s in flag. More flags is more verbose.')
     parser.add_argument('board', help='Board selector (LD5200 | LD2100) ')
     parser.add_argument('port', type=int, help='Port (0-2 for LD5200, 3-5 for LD2100)')
+    parser.add_argument("--serial", help="Serial number of the board (results are kept per serial number, "
+                                         "not kept without it)")
     parser.add_argument("--all", help="Run all tests", action="store_true")
     parser.add_argument("--rs232", help="RS232 test", action="store_true")
     parser.add_argument("--length", help="Length detection", action="store_true")
@@ -30,7 +33,17 @@ def start():
     parser.add_argument("--led", help="LED test", action="store_true")
     parser.add_argument("--current", help="4-20mA test (LD5200 only)", action="store_true")
     parser.add_argument("--relay", help="Relay test", action="store_true")
+    parser.add_argument("--calibrate", help="Measure the emulator and RS485 settle times against a known-good "
+                                            "board (saved for GPIO)", action="store_true")
+    parser.add_argument("--retest-failed", help="Run only the tests the board failed or never ran "
+                                                "(see components/History.py)", action="store_true")
+    parser.add_argument("--stop-on-failure", help="Skip the remaining tests after the first failure",
+                        action="store_true")
+    parser.add_argument("--safe-delays", help="Fixed delays after serial commands instead of waiting for "
+                                              "acknowledgement", action="store_true")
     args = vars(parser.parse_args())
+    if args['retest_failed'] and not args['serial']:
+        parser.error('--retest-failed requires --serial')
     if args['verbose']:
         if args['verbose'] >= 2:
             logging.basicConfig(level=logging.DEBUG, format='%(levelname)s - %(message)s')
@@ -50,11 +63,21 @@ if __name__ == "__main__":
     gpio = GPIO()
     gpio.stage(GPIO.BOARD, state=args['port'])
     gpio.commit()
-    if board == LDBoardTester.LD2100:
-        _BOARD0 = LD2100Tester(serial='LD2100_BOARD0', mac='00:25:96:FF:FE:12:34:57')
+    if args['calibrate']:
+        tester = LDBoardTester(gpio, safe_delays=args['safe_delays'])
+        tester.connect_serial()
+        try:
+            table = SettleCalibration(gpio, tester, board, args['port']).run()
+        finally:
+            tester.disconnect_serial()
+        for what, transitions in table.items():
+            print('{}: {}'.format(what, ', '.join('{}>{} {} s'.format(frm, to, seconds)
+                                                  for (frm, to), seconds in sorted(transitions.items()))))
+    elif board == LDBoardTester.LD2100:
+        _BOARD0 = LD2100Tester(serial=args['serial'] or 'LD2100_BOARD0', mac='00:25:96:FF:FE:12:34:57')
         _BOARD0.test(gpio, '10.0.0.189', args)
         print(_BOARD0.results())
     elif board == LDBoardTester.LD5200:
-        _BOARD1 = LD5200Tester(serial='LD5200_BOARD1', mac='00:25:96:FF:FE:12:34:56')
+        _BOARD1 = LD5200Tester(serial=args['serial'] or 'LD5200_BOARD1', mac='00:25:96:FF:FE:12:34:56')
         _BOARD1.test(gpio, '10.0.0.188', args)
         print(_BOARD1.results())
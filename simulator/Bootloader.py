@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+simulator/Bootloader.py
+
+Author:
+    Zachary Smith
+"""
+import argparse
+import logging
+import os
+import pty
+import select
+import threading
+import tty
+from datetime import datetime, timedelta
+
+from components import Clock
+from components.Clock import sleep
+
+_LOGGER = logging.getLogger()
+
+LD2100 = "LD2100"
+LD5200 = "LD5200"
+
+# 9600/N/8/1 is 10 bits on the wire per character
+CHAR_TIME = 10 / 9600
+
+# Seconds the simulated boot loader takes to act, before its reply goes out at CHAR_TIME per character.
+LATENCIES = {
+    'command': .02,     # parsing and answering a simple command
+    'adc1': .6,         # measuring the cable loops
+    '15v': .1,          # measuring the supply
+    'netcfg': .05,
+    'boot': 8.0,        # reset to `User prgm is not valid`, spread over the banner
+    'mac': .2,          # flash write before the board resets itself
+}
+
+MENU = [
+    '?      - display this menu',
+    'mac    - set mac address (mac xx:xx:xx:xx:xx:xx)',
+    'ip     - set ip address (ip x.x.x.x)',
+    'netcfg - display network configuration',
+    'date   - set date (date mm/dd/yy)',
+    'time   - display or set time (time hh:mm:ss)',
+    '15v    - display 15V supply',
+    'adc1   - display cable measurements',
+    'rlyN   - relay N on/off (rly4on, rly4off)',
+    'dac    - set 4-20mA output (dac mA)',
+    'modbustest - answer modbus requests, ctrl-c to exit',
+    'reset  - reset the board',
+    'run    - run the flash application',
+]
+
+
+class SimulatedBoard(object):
+    """
+    State behind one simulated LD2100/LD5200 boot loader.
+    Measurements are plain attributes so a test (or a simulated station) can change them.
+    """
+
+    def __init__(self, board_type=LD5200, mac='00:25:96:FF:FE:12:34:56'):
+        """
+        Args:
+            board_type: LD2100 | LD5200
+            mac: MAC address the board starts with
+        """
+        self.board_type = board_type
+        self.mac = mac
+        self.ip = '10.0.0.188'
+        self.netmask = '255.255.255.0'
+        self.gateway = '10.0.0.1'
+        self.supply_voltage = 15.1
+        # (leg1, leg2, leak distance) in ohms as reported by `adc1`
+        self.cable = (0, 0, 0)
+        self.duart_passed = (True, True)
+        self.relays = dict()
+        self.dac = 0
+        # offset between the board's clock and the station's
+        self.clock_offset = timedelta()
+        self.boot_count = 0
+        self.booting = False
+        self.modbustest = False
+
+    def now(self) -> datetime:
+        return Clock.now() + self.clock_offset
+
+    def boot_banner(self) -> list:
+        """
+        Lines printed from reset until the boot loader accepts commands.
+        """
+        lines = ['', 'RLE Technologies {} Boot Loader'.format(self.board_type),
+                 'MAC: {}'.format(self.mac),
+                 'Testing MRAM: passed']
+        if self.board_type == LD5200:
+            for i, passed in enumerate(self.duart_passed):
+                # format string of the board's firmware is printed verbatim
+                lines.append('Testing duart{}: 1000{{lc:0}} {}'.format(i + 1, 'passed' if passed else 'failed'))
+        lines.append('User prgm is not valid')
+        return lines
+
+
+class Bootloader(object):
+    """
+    Serves a simulated boot loader console on a pseudo-terminal.
+    Point `Serial(device_file=...)` at `device_file`.
+    `board` may be swapped at any time, like the station's RS232 mux; a board
+    rebooting while it is not selected prints its banner to nobody.
+    """
+
+    def __init__(self, board=None, realistic=True, latencies=None, echo=True):
+        """
+        Args:
+            board: SimulatedBoard answering on the console (LD5200 by default)
+            realistic: If False every latency is zero and output is not paced at 9600 baud
+            latencies: dict overriding entries of LATENCIES
+            echo: Echo typed characters back like a terminal
+        """
+        self.board = board if board else SimulatedBoard()
+        self.realistic = realistic
+        self.latencies = dict(LATENCIES)
+        if latencies:
+            self.latencies.update(latencies)
+        self.echo = echo
+        self.device_file = None
+        self.__master = None
+        self.__slave = None
+        self.__thread = None
+        self.__running = False
+        self.__write_lock = threading.Lock()
+
+    def start(self) -> str:
+        """
+        Opens the pty pair and starts answering.
+
+        Returns:
+            Device file of the console
+        """
+        self.__master, self.__slave = pty.openpty()
+        tty.setraw(self.__slave)
+        self.device_file = os.ttyname(self.__slave)
+        self.__running = True
+        self.__thread = threading.Thread(target=self._run, name='Bootloader-sim', daemon=True)
+        self.__thread.start()
+        _LOGGER.info('Bootloader:: {} console on {}'.format(self.board.board_type, self.device_file))
+        return self.device_file
+
+    def stop(self):
+        """
+        Stops answering and closes the pty pair.
+        """
+        self.__running = False
+        if self.__thread:
+            self.__thread.join()
+        os.close(self.__master)
+        os.close(self.__slave)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def delay(self, what):
+        """
+        Sleeps for the configured latency of `what`.
+        """
+        if self.realistic and self.latencies.get(what):
+            sleep(self.latencies[what])
+
+    def write(self, text):
+        """
+        Sends text to the station, paced at 9600 baud when realistic.
+        """
+        data = text.encode('ascii') if isinstance(text, str) else text
+        step = 16 if self.realistic else len(data)
+        for i in range(0, len(data), step):
+            chunk = data[i:i + step]
+            with self.__write_lock:
+                os.write(self.__master, chunk)
+            if self.realistic:
+                sleep(len(chunk) * CHAR_TIME)
+
+    def write_lines(self, lines, board=None):
+        """
+        Sends lines, unless they come from `board` and the mux has been switched away from it.
+        """
+        if board is not None and self.board is not board:
+            return
+        self.write(''.join(line + '\r\n' for line in lines))
+
+    def _run(self):
+        line = b''
+        previous_cr = False
+        while self.__running:
+            readable, _, _ = select.select([self.__master], [], [], .1)
+            if not readable:
+                continue
+            try:
+                data = os.read(self.__master, 1024)
+            except OSError:
+                return
+            # the bytes went to whichever board was selected when they arrived
+            board = self.board
+            for byte in data:
+                c, after_cr, previous_cr = bytes((byte,)), previous_cr, byte == 13
+                if c == b'\x03':
+                    self.write(b'^C\r\n')
+                    board.modbustest = False
+                    line = b''
+                elif board.booting:
+                    # input is lost while the board resets
+                    continue
+                elif c == b'\n' and after_cr:
+                    # second half of a CR LF pair
+                    continue
+                elif c in b'\r\n':
+                    if self.echo:
+                        self.write(b'\r\n')
+                    self.handle(line.decode('ascii', 'replace').strip(), board)
+                    line = b''
+                else:
+                    if self.echo:
+                        self.write(c)
+                    line += c
+
+    def reset(self, board=None):
+        """
+        Starts a reboot of `board` (the selected board by default). Input is discarded until the banner is done.
+        """
+        board = board if board else self.board
+        board.booting = True
+        threading.Thread(target=self.boot, args=(board,), name='Bootloader-sim-boot', daemon=True).start()
+
+    def boot(self, board):
+        """
+        Prints the boot banner of `board` over the configured boot time.
+        """
+        board.booting = True
+        board.modbustest = False
+        board.relays = dict()
+        board.dac = 0
+        board.boot_count += 1
+        lines = board.boot_banner()
+        step = self.latencies['boot'] / len(lines)
+        for i, line in enumerate(lines):
+            if self.realistic:
+                sleep(step)
+            if i == len(lines) - 1:
+                # commands are accepted while the last line goes out
+                board.booting = False
+            self.write_lines([line], board)
+
+    def handle(self, command: str, board=None):
+        """
+        Answers one command line.
+
+        Args:
+            command: Line typed at the console
+            board: Board that received it (the selected board by default)
+        """
+        board = board if board else self.board
+        words = command.split()
+        name = words[0] if words else ''
+        arg = words[1] if len(words) > 1 else None
+        if board.modbustest:
+            # only ctrl-c is understood in modbustest
+            return
+        self.delay(name if name in self.latencies else 'command')
+        if name == '':
+            self.write_lines(['ok'], board)
+        elif name == '?':
+            self.write_lines(MENU, board)
+        elif name == 'mac' and arg:
+            board.mac = arg
+            self.write_lines(['ok'], board)
+            # the new address takes effect after a reset
+            self.reset(board)
+        elif name == 'ip' and arg:
+            board.ip = arg
+            self.write_lines(['ok'], board)
+        elif name == 'netcfg':
+            self.write_lines(['mac: {}'.format(board.mac), 'ip: {}'.format(board.ip),
+                              'mask: {}'.format(board.netmask), 'gateway: {}'.format(board.gateway), 'ok'], board)
+        elif name == 'date':
+            if arg:
+                date = datetime.strptime(arg, '%m/%d/%y').date()
+                board.clock_offset += datetime.combine(date, board.now().time()) - board.now()
+            self.write_lines([board.now().strftime('%m/%d/%y'), 'ok'], board)
+        elif name == 'time':
+            if arg:
+                time = datetime.strptime(arg, '%H:%M:%S').time()
+                board.clock_offset += datetime.combine(board.now().date(), time) - board.now()
+                self.write_lines(['ok'], board)
+            else:
+                self.write_lines([board.now().strftime('%m/%d/%y %H:%M:%S'), 'ok'], board)
+        elif name == '15v':
+            self.write_lines(['15V Supply: {:.1f}V'.format(board.supply_voltage), 'ok'], board)
+        elif name == 'adc1':
+            leg1, leg2, leak = board.cable
+            self.write_lines(['external cable',
+                              'leg1 resistance (ohms): {}'.format(leg1),
+                              'leg2 resistance (ohms): {}'.format(leg2),
+                              'leak distance (ohms): {}'.format(leak),
+                              'ok'], board)
+        elif name.startswith('rly') and (name.endswith('on') or name.endswith('off')):
+            board.relays[name[3:].rstrip('onf')] = name.endswith('on')
+            self.write_lines(['ok'], board)
+        elif name == 'dac' and arg:
+            board.dac = float(arg)
+            self.write_lines(['ok'], board)
+        elif name == 'modbustest':
+            self.write_lines(['modbus test running, ctrl-c to exit'], board)
+            board.modbustest = True
+        elif name == 'reset':
+            self.reset(board)
+        else:
+            self.write_lines(['Unknown command'], board)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulated LD boot loader console on a pty.')
+    parser.add_argument('board', nargs='?', default=LD5200, help='Board type (LD5200 | LD2100)')
+    parser.add_argument('--fast', action='store_true', help='Answer without realistic latencies')
+    args = vars(parser.parse_args())
+    with Bootloader(SimulatedBoard(args['board']), realistic=not args['fast']) as console:
+        print('Console on {}'.format(console.device_file))
+        try:
+            while True:
+                sleep(1)
+        except KeyboardInterrupt:
+            pass
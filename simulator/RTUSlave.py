@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+simulator/RTUSlave.py
+
+Author:
+    Zachary Smith
+"""
+import argparse
+import logging
+import os
+import pty
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+from simulator.Bootloader import CHAR_TIME
+
+_LOGGER = logging.getLogger()
+
+READ_HOLDING_REGISTERS = 0x03
+REQUEST_SIZE = 8    # unit, function, address, count, CRC
+
+
+def crc16(data: bytes) -> bytes:
+    """
+    ModBus RTU CRC, low byte first as sent on the wire.
+    """
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return struct.pack('<H', crc)
+
+
+class RTUSlave(object):
+    """
+    Serves ModBus RTU read holding registers requests on a pseudo-terminal, in place of
+    the RS485 adapter and the boards behind it. Point `ModBus(device_file=...)` at `device_file`.
+    The bus is timed on wall time like the ModBus client, whatever the station clock.
+    """
+
+    def __init__(self, answer=None, latency=.005, crc_errors=0.0, drops=0.0, realistic=True, seed=None):
+        """
+        Args:
+            answer: Callable (unit, register) -> value, None for silence (254/9998 -> 1234 by default)
+            latency: Seconds a slave takes before answering
+            crc_errors: Share of answers sent with a bad CRC
+            drops: Share of requests left unanswered
+            realistic: Pace frames at 9600 baud and apply the latency
+            seed: Seed of the fault injection
+        """
+        self.answer = answer if answer else lambda unit, register: 1234 if (unit, register) == (254, 9998) else None
+        self.latency = latency
+        self.crc_errors = crc_errors
+        self.drops = drops
+        self.realistic = realistic
+        self.random = random.Random(seed)
+        self.device_file = None
+        self.requests = 0
+        self.answered = 0
+        self.__master = None
+        self.__slave = None
+        self.__thread = None
+        self.__running = False
+
+    def start(self) -> str:
+        """
+        Opens the pty pair and starts answering.
+
+        Returns:
+            Device file of the bus
+        """
+        self.__master, self.__slave = pty.openpty()
+        tty.setraw(self.__slave)
+        self.device_file = os.ttyname(self.__slave)
+        self.__running = True
+        self.__thread = threading.Thread(target=self._run, name='RTUSlave-sim', daemon=True)
+        self.__thread.start()
+        _LOGGER.info('RTUSlave:: ModBus RTU on {}'.format(self.device_file))
+        return self.device_file
+
+    def stop(self):
+        """
+        Stops answering and closes the pty pair.
+        """
+        self.__running = False
+        if self.__thread:
+            self.__thread.join()
+        os.close(self.__master)
+        os.close(self.__slave)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        frame = b''
+        while self.__running:
+            readable, _, _ = select.select([self.__master], [], [], .1)
+            if not readable:
+                continue
+            try:
+                frame += os.read(self.__master, 256)
+            except OSError:
+                return
+            while len(frame) >= REQUEST_SIZE:
+                if crc16(frame[:REQUEST_SIZE - 2]) != frame[REQUEST_SIZE - 2:REQUEST_SIZE]:
+                    # not a frame boundary (or line noise), resynchronise on the next byte
+                    frame = frame[1:]
+                    continue
+                request, frame = frame[:REQUEST_SIZE], frame[REQUEST_SIZE:]
+                self.handle(request)
+
+    def handle(self, request: bytes):
+        """
+        Answers one request frame, or not.
+        """
+        unit, function, register, count = struct.unpack('>BBHH', request[:6])
+        self.requests += 1
+        if function != READ_HOLDING_REGISTERS or self.random.random() < self.drops:
+            return
+        values = [self.answer(unit, register + i) for i in range(count)]
+        if None in values:
+            return
+        body = struct.pack('>BBB{}H'.format(count), unit, function, 2 * count, *values)
+        crc = crc16(body)
+        if self.random.random() < self.crc_errors:
+            crc = bytes((crc[0] ^ 0xFF, crc[1]))
+        if self.realistic:
+            # the request came in and the answer goes out at 9600 baud
+            time.sleep(self.latency + (len(request) + len(body) + 2) * CHAR_TIME)
+        os.write(self.__master, body + crc)
+        self.answered += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulated ModBus RTU slave on a pty.')
+    parser.add_argument('--value', type=int, default=1234, help='Register 9998 of unit 254 (1234 LD2100)')
+    parser.add_argument('--latency', type=float, default=.005, help='Seconds before answering')
+    parser.add_argument('--crc', type=float, default=0, help='Share of answers with a bad CRC')
+    parser.add_argument('--drop', type=float, default=0, help='Share of requests not answered')
+    parser.add_argument('--bench', type=int, default=0, help='Time this many reads through components.ModBus')
+    args = vars(parser.parse_args())
+    slave = RTUSlave(lambda unit, register: args['value'] if (unit, register) == (254, 9998) else None,
+                     args['latency'], args['crc'], args['drop'])
+    with slave:
+        if args['bench']:
+            from components.ModBus import ModBus
+            modbus = ModBus(device_file=slave.device_file, timeout=1)
+            good = 0
+            start = time.monotonic()
+            for _ in range(args['bench']):
+                response = modbus.read_holding_registers(9998, 1, 254, port=0)
+                good += bool(response) and response.registers[0] == args['value']
+            elapsed = time.monotonic() - start
+            print('{} of {} reads good in {:.2f} s ({:.1f} ms per read), timeout now {:.0f} ms'
+                  .format(good, args['bench'], elapsed, elapsed / args['bench'] * 1e3, modbus.timeout_for(0) * 1e3))
+            modbus.close()
+        else:
+            print('ModBus RTU on {}'.format(slave.device_file))
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
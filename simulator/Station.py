@@ -0,0 +1,274 @@
+"""
+simulator/Station.py
+
+Author:
+    Zachary Smith
+"""
+import logging
+import threading
+
+from components import ADC
+from components import Clock
+from components.Clock import sleep
+from components.GPIO import GPIO
+from components.LDBoardTester import LDBoardTester
+from simulator.Bootloader import Bootloader, SimulatedBoard, LD2100, LD5200
+from simulator.RTUSlave import RTUSlave
+
+_LOGGER = logging.getLogger()
+
+# Ohms reported for each emulator selection (see truth tables in components/GPIO.py)
+LENGTH_OHMS = [0, 1500, 7100, 14778, 22067, 29502]
+SHORT_OHMS = [29459, 21982, 14557, 7061, 1468, 0]
+# Both loops open
+BREAK_OHMS = {LD2100: 24927, LD5200: 40731}
+
+# 12 bit positive range of the ADS1015
+_ADC_MAX = 0x7FF
+
+
+class SimulatedGPIO(object):
+    """
+    Stand-in for the RPi.GPIO module. Remembers output levels and asks the station for inputs.
+    """
+    HIGH = 1
+    LOW = 0
+    BOARD = 'board'
+    OUT = 'out'
+    IN = 'in'
+
+    def __init__(self, station):
+        self.__station = station
+        self.levels = dict()
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pins, direction):
+        pass
+
+    def cleanup(self):
+        pass
+
+    def output(self, pins, values):
+        if isinstance(pins, int):
+            pins = [pins]
+        if not isinstance(values, (list, tuple)):
+            values = [values] * len(pins)
+        for pin, value in zip(pins, values):
+            self.levels[pin] = value
+        self.__station.update()
+
+    def input(self, pin):
+        return self.__station.input(pin)
+
+    def selection(self, what) -> int:
+        """
+        Decodes the state of a GPIO selector from its C, B, A pins.
+        """
+        state = 0
+        for pin in GPIO.pins(what):
+            state = (state << 1) | (1 if self.levels.get(pin) else 0)
+        return state
+
+
+class SimulatedADS1015(object):
+    """
+    Stand-in for Adafruit_ADS1x15.ADS1015. Conversions take 1/data_rate on the station clock.
+    In continuous mode get_last_result converts the input as it is at that moment.
+    """
+    DATA_RATE = 1600
+
+    def __init__(self, station):
+        self.__station = station
+        self.__continuous = None
+
+    def start_adc(self, channel, gain=1, data_rate=None):
+        self.__continuous = (lambda: self.__station.voltage(channel), gain)
+        return self._convert(self.__station.voltage(channel), gain, data_rate)
+
+    def start_adc_difference(self, differential, gain=1, data_rate=None):
+        self.__continuous = (lambda: self.__station.differential(differential), gain)
+        return self._convert(self.__station.differential(differential), gain, data_rate)
+
+    def get_last_result(self):
+        volts, gain = self.__continuous
+        return self._raw(volts(), gain)
+
+    def stop_adc(self):
+        self.__continuous = None
+
+    def _convert(self, volts, gain, data_rate):
+        sleep(1 / (data_rate if data_rate else self.DATA_RATE))
+        return self._raw(volts, gain)
+
+    @staticmethod
+    def _raw(volts, gain):
+        raw = int(round(volts / ADC.FULL_SCALE[gain] * _ADC_MAX))
+        return max(-_ADC_MAX - 1, min(_ADC_MAX, raw))
+
+    def read_adc(self, channel, gain=1, data_rate=None):
+        return self._convert(self.__station.voltage(channel), gain, data_rate)
+
+    def read_adc_difference(self, differential, gain=1, data_rate=None):
+        return self._convert(self.__station.differential(differential), gain, data_rate)
+
+
+class SimulatedStation(object):
+    """
+    Six simulated boards behind one RS232 console and one RS485 bus, driven by the station's
+    own GPIO and ADC code through simulated backends. `start` points LDBoardTester, GPIO and
+    ADC at the simulation and installs a VirtualClock.
+    """
+
+    # GPIO address -> board type (see gui.objects in RunMainWindow)
+    TRAYS = {3: LD2100, 4: LD2100, 5: LD2100, 0: LD5200, 1: LD5200, 2: LD5200}
+
+    # test plan steps needing hardware the simulation lacks (network)
+    UNSIMULATED = ('ethernet_test',)
+
+    LED_VOLTS = .23     # LED sense voltage of a good board on ADC channel 3
+    SENSE_OHMS = 100    # 4-20mA loop sense resistor across ADC channels 0-1
+
+    def __init__(self, speed=100.0, realistic=True, latencies=None, switch_time=0, rs485=None):
+        """
+        Args:
+            speed: Virtual clock speed (1 for wall time)
+            realistic: Realistic console latencies (see simulator/Bootloader.py)
+            latencies: Overrides of the console latencies
+            switch_time: Seconds the emulator relays take, the board measures the old cable until then
+            rs485: RTUSlave options (latency, crc_errors, drops, seed)
+        """
+        self.speed = speed
+        self.switch_time = switch_time
+        self.__switches = 0
+        self.boards = dict()
+        for address, board_type in self.TRAYS.items():
+            self.boards[address] = SimulatedBoard(board_type, mac='00:25:96:FF:FE:00:00:{:02X}'.format(address))
+        self.console = Bootloader(self.boards[0], realistic=realistic, latencies=latencies)
+        self.rs485 = RTUSlave(self.modbus_answer, realistic=realistic, **(rs485 if rs485 else {}))
+        self.io = SimulatedGPIO(self)
+        self.gpio = None
+        self.__lock = threading.Lock()
+        self.__saved = None
+
+    def start(self):
+        """
+        Starts the console and redirects the station's hardware to the simulation.
+
+        Returns:
+            GPIO instance driving the simulated station
+        """
+        self.__saved = (Clock.get_clock(), LDBoardTester.serial_device, LDBoardTester.modbus_device)
+        Clock.set_clock(Clock.VirtualClock(self.speed))
+        self.console.start()
+        LDBoardTester.serial_device = self.console.device_file
+        LDBoardTester.modbus_device = self.rs485.start()
+        ADC.set_backend(lambda: SimulatedADS1015(self))
+        self.gpio = GPIO(backend=self.io)
+        _LOGGER.info('SimulatedStation:: Started at {}x on {}'.format(self.speed, self.console.device_file))
+        return self.gpio
+
+    def stop(self):
+        """
+        Stops the console and restores the real hardware.
+        """
+        self.console.stop()
+        self.rs485.stop()
+        ADC.set_backend(None)
+        clock, LDBoardTester.serial_device, LDBoardTester.modbus_device = self.__saved
+        Clock.set_clock(clock)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def selected(self) -> SimulatedBoard:
+        """
+        Board currently routed by the board mux (None for an unused address).
+        """
+        return self.boards.get(self.io.selection(GPIO.BOARD))
+
+    def update(self):
+        """
+        Re-evaluates the mux and emulators after an output change.
+        """
+        with self.__lock:
+            board = self.selected()
+            if board is None:
+                return
+            self.console.board = board
+            length = self.io.selection(GPIO.LENGTH_EMULATOR)
+            short = self.io.selection(GPIO.SHORT_EMULATOR)
+            if length < len(LENGTH_OHMS):
+                legs = LENGTH_OHMS[length]
+            else:
+                legs = BREAK_OHMS[board.board_type]
+            leak = SHORT_OHMS[short] if short < len(SHORT_OHMS) and length >= len(LENGTH_OHMS) else 0
+            cable = (legs, legs, leak)
+            if not self.switch_time or cable == board.cable:
+                board.cable = cable
+                return
+            self.__switches += 1
+            threading.Thread(target=self.__switch, args=(board, cable, self.__switches), daemon=True).start()
+
+    def __switch(self, board, cable, switch):
+        sleep(self.switch_time)
+        with self.__lock:
+            # a later switch supersedes this one
+            if switch == self.__switches:
+                board.cable = cable
+
+    def modbus_answer(self, unit, register):
+        """
+        Register value answered on the RS485 bus at the mux's current port, None for silence.
+        An LD5200 in `modbustest` answers on every port, an LD2100 on the port wired to its address.
+        """
+        if (unit, register) != (LDBoardTester.MODBUS_SLAVE, LDBoardTester.MODBUS_REGISTER):
+            return None
+        port = self.io.selection(GPIO.RS485)
+        board = self.selected()
+        if board is not None and board.board_type == LD5200 and board.modbustest:
+            return LDBoardTester.MODBUS_PORTS.get(port)
+        for address, wired in LDBoardTester.rs485_ports.items():
+            if wired == port and self.boards[address].board_type == LD2100:
+                return LDBoardTester.MODBUS_LD2100
+        return None
+
+    def input(self, pin) -> int:
+        """
+        Relay inputs I0-I3 of the selected board.
+        LD2100: I0/I1 are the NO/NC contacts of relay 1.
+        LD5200: I0 any relay on, I1 not all on, I2 relay 4 or 5 on, I3 not both of 4 and 5.
+        """
+        board = self.selected()
+        index = GPIO.pins('relays').index(pin)
+        if board is None:
+            return 0
+        relays = board.relays
+        if board.board_type == LD2100:
+            on = relays.get('1', False)
+            return int([on, not on, on, not on][index])
+        r4, r5, r6 = relays.get('4', False), relays.get('5', False), relays.get('6', False)
+        return int([r4 or r5 or r6, not (r4 and r5 and r6), r4 or r5, not (r4 and r5)][index])
+
+    def voltage(self, channel) -> float:
+        """
+        Single ended ADC input of the selected board.
+        """
+        board = self.selected()
+        if channel == 3 and board is not None:
+            return self.LED_VOLTS
+        return 0
+
+    def differential(self, differential) -> float:
+        """
+        ADC channels 0-1, across the 4-20mA sense resistor.
+        """
+        board = self.selected()
+        if differential == 0 and board is not None:
+            return board.dac * 1e-3 * self.SENSE_OHMS
+        return 0
@@ -0,0 +1,18 @@
+"""
+tests/conftest.py
+
+Author:
+    Zachary Smith
+"""
+import pytest
+
+from simulator.Station import SimulatedStation
+
+
+@pytest.fixture
+def station():
+    """
+    Simulated station on a virtual clock, as debug runs use (see view/SeaLionThread.py).
+    """
+    with SimulatedStation(speed=20) as simulated:
+        yield simulated
@@ -0,0 +1,102 @@
+"""
+tests/test_ADC.py
+
+Author:
+    Zachary Smith
+"""
+import itertools
+
+import pytest
+
+from components import ADC, Clock
+
+GAIN = 2
+COUNT = ADC.FULL_SCALE[GAIN] / 0x7FF    # volts per count
+# counts around the level: the median absolute deviation is 1 count, so 3.5 deviations keep +/-3
+NOISE = [-3, -1, 0, 1, 3, 2, -2, 0]
+
+
+def noisy(level, glitches=None):
+    """
+    Raw samples of `level` volts with NOISE, the samples at the indices of `glitches` replaced by their value.
+    """
+    glitches = glitches if glitches else dict()
+    for i, noise in enumerate(itertools.cycle(NOISE)):
+        yield glitches.get(i, round(level / COUNT) + noise)
+
+
+def test_statistics_rejects_outliers():
+    raw = list(itertools.islice(noisy(.23, {3: 2047, 10: 0, 17: 900}), 40))
+    result = ADC.statistics(raw, GAIN)
+    assert result.rejected == 3
+    assert result.n == 37
+    assert result.min >= (round(.23 / COUNT) - 3) * COUNT and result.max <= (round(.23 / COUNT) + 3) * COUNT
+    assert result.mean == pytest.approx(.23, abs=COUNT)
+    assert result.interval == pytest.approx(3 * result.std / 37 ** .5)
+
+
+def test_statistics_of_a_constant_input():
+    result = ADC.statistics([230] * 16, GAIN)
+    assert (result.n, result.rejected, result.std, result.interval) == (16, 0, 0.0, 0.0)
+
+
+@pytest.fixture
+def led(station, monkeypatch):
+    """
+    Feeds the samples set in `led.samples` to ADC channel 3, in volts.
+    """
+    def voltage(channel):
+        return next(led.samples) * COUNT if channel == 3 else 0
+    led.samples = iter(())
+    monkeypatch.setattr(station, 'voltage', voltage)
+    return led
+
+
+def stopping_n(raw, limit, min_samples=4, max_samples=40, batch=4):
+    """
+    Samples Session.measure is expected to take: whole batches until the interval clears the limit.
+    """
+    for n in range(batch, max_samples + 1, batch):
+        result = ADC.statistics(raw[:n], GAIN)
+        if n >= min_samples and abs(result.mean - limit) > result.interval:
+            return n
+    return max_samples
+
+
+def test_measure_stops_early_far_from_the_limit(led):
+    raw = list(itertools.islice(noisy(.23, {2: 2047}), 40))
+    led.samples = iter(raw)
+    result = ADC.Session().measure(3, gain=GAIN, low=.2025)
+    assert result.n + result.rejected == 4
+    assert result.rejected == 1
+
+
+def test_measure_samples_longer_near_the_limit(led):
+    raw = list(itertools.islice(noisy(.23, {1: 0, 6: 2047}), 40))
+    # about two standard errors of a few samples above the limit
+    limit = .23 - 2 * COUNT
+    expected = stopping_n(raw, limit)
+    assert 4 < expected < 40
+    led.samples = iter(raw)
+    result = ADC.Session().measure(3, gain=GAIN, low=limit)
+    assert result.n + result.rejected == expected
+    assert result.rejected == 2
+    assert result.mean - limit > result.interval
+
+
+def test_measure_gives_up_at_max_samples(led):
+    raw = list(itertools.islice(noisy(.23), 40))
+    led.samples = iter(raw)
+    result = ADC.Session().measure(3, gain=GAIN, low=.23)
+    assert result.n + result.rejected == 40
+
+
+def test_sampler_window_rejects_glitches(led):
+    led.samples = noisy(.23, {i: 2047 for i in range(20, 23)})
+    sampler = ADC.Sampler(3, gain=GAIN, interval=.01)
+    start = Clock.monotonic()
+    with sampler:
+        Clock.sleep(.6)
+    result = sampler.window(start, Clock.monotonic())
+    assert result.rejected == 3
+    assert result.mean == pytest.approx(.23, abs=COUNT)
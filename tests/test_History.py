@@ -0,0 +1,88 @@
+"""
+tests/test_History.py
+
+Author:
+    Zachary Smith
+"""
+import os
+
+import pytest
+
+from components.GPIO import GPIO
+from components.History import ResultHistory
+from components.IOUtilities import HISTORY_PATH, SIMULATED_HISTORY_PATH, JOURNAL_PATH, SIMULATED_JOURNAL_PATH
+from components.LD5200Tester import LD5200Tester
+from components.LDBoard import LDBoard
+
+
+def board(serial, mac, results, blocked=None):
+    tested = LDBoard(serial, mac, 'T', 'LD5200')
+    for name, result in results.items():
+        tested.process_test_result(name, result)
+    for name, blocker in (blocked or {}).items():
+        tested.process_test_skipped(name, blocker)
+    return tested
+
+
+def test_latest_result_per_board(tmp_path):
+    history = ResultHistory(str(tmp_path / 'history.jsonl'))
+    history.record(board('S1', 'M1', {'ps_voltage': False, 'relay_test': True}))
+    history.record(board('S2', 'M2', {'ps_voltage': True}))
+    history.record(board('S1', 'M1', {'ps_voltage': True}))
+    history.record(board('S1', 'M9', {'relay_test': False}))
+    assert history.load('S1', 'M1') == {'ps_voltage': True, 'relay_test': True}
+    assert history.load('S1') == {'ps_voltage': True, 'relay_test': False}
+    assert history.load('S3') == {}
+
+
+def test_blocked_steps_keep_their_result(tmp_path):
+    history = ResultHistory(str(tmp_path / 'history.jsonl'))
+    history.record(board('S1', 'M1', {'rs232_connection': True, 'relay_test': True}))
+    history.record(board('S1', 'M1', {'rs232_connection': True, 'ps_voltage': False},
+                         {'relay_test': 'ps_voltage'}))
+    assert history.load('S1', 'M1') == {'rs232_connection': True, 'relay_test': True, 'ps_voltage': False}
+
+
+def cli_args(**options):
+    args = dict(port=0, serial=None, all=False, rs232=True, length=False, short=False, rs485=False, eth=False,
+                led=False, current=False, relay=False, retest_failed=False, stop_on_failure=False,
+                safe_delays=False)
+    args.update(options)
+    return args
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # the history is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_command_line_board_without_serial_not_recorded(station, workdir):
+    station.gpio.stage(GPIO.BOARD, 0)
+    station.gpio.commit()
+    tested = LD5200Tester(serial='LD5200_BOARD1', mac=station.boards[0].mac)
+    assert tested.test(station.gpio, '10.0.0.188', cli_args())
+    assert not os.path.exists(HISTORY_PATH)
+
+
+def test_command_line_board_with_serial_recorded(station, workdir):
+    station.gpio.stage(GPIO.BOARD, 0)
+    station.gpio.commit()
+    tested = LD5200Tester(serial='S0', mac=station.boards[0].mac)
+    assert tested.test(station.gpio, '10.0.0.188', cli_args(serial='S0'))
+    assert ResultHistory().load('S0') == {'rs232_connection': True}
+
+
+def test_debug_runs_keep_their_own_history_and_journal():
+    pytest.importorskip('PyQt5')
+    from view.SeaLionThread import SeaLionThread
+
+    class Gui(object):
+        debug = True
+    worker = SeaLionThread(Gui())
+    assert worker.history.path == SIMULATED_HISTORY_PATH != HISTORY_PATH
+    assert worker.journal.path == SIMULATED_JOURNAL_PATH != JOURNAL_PATH
+    Gui.debug = False
+    worker = SeaLionThread(Gui())
+    assert (worker.history.path, worker.journal.path) == (HISTORY_PATH, JOURNAL_PATH)
@@ -0,0 +1,72 @@
+"""
+tests/test_Journal.py
+
+Author:
+    Zachary Smith
+"""
+import os
+
+from components.Journal import BatchJournal, StepRecord
+
+MANIFEST = {0: {'board_type': 'LD5200', 'identifier': 'T0', 'GPIO_address': 0, 'mac': 'M0', 'serial': 'S0'},
+            1: {'board_type': 'LD2100', 'identifier': 'T1', 'GPIO_address': 3, 'mac': 'M1', 'serial': 'S1'}}
+
+
+def interrupted(path):
+    journal = BatchJournal(path)
+    journal.begin(MANIFEST)
+    journal.step(0, 'rs232_connection', True)
+    journal.step(0, 'datetime_set', True)
+    journal.step(1, 'rs232_connection', False)
+    journal.step(1, 'datetime_set', False, 'rs232_connection')
+    journal.assigned(0, '10.0.0.189')
+    journal.close()
+
+
+def test_load_interrupted_batch(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted(path)
+    checkpoint = BatchJournal.load(path)
+    assert checkpoint.trays == MANIFEST
+    assert list(checkpoint.steps[0]) == ['rs232_connection', 'datetime_set']
+    assert checkpoint.steps[1]['datetime_set'] == StepRecord(False, 'rs232_connection', True)
+    assert checkpoint.ips == {0: '10.0.0.189'}
+
+
+def test_load_ignores_truncated_last_line(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted(path)
+    # a crash in the middle of a write
+    with open(path, 'a') as file:
+        file.write('{"kind": "step", "tray": 0, "step": "startup_seq')
+    checkpoint = BatchJournal.load(path)
+    assert list(checkpoint.steps[0]) == ['rs232_connection', 'datetime_set']
+
+
+def test_ended_and_abandoned_batches_do_not_resume(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = BatchJournal(path)
+    journal.begin(MANIFEST)
+    journal.step(0, 'rs232_connection', True)
+    journal.end()
+    assert BatchJournal.load(path) is None
+    interrupted(path)
+    BatchJournal.abandon(path)
+    assert BatchJournal.load(path) is None
+    assert BatchJournal.load(str(tmp_path / 'none.jsonl')) is None
+
+
+def test_begin_replaces_the_journal(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted(path)
+    checkpoint = BatchJournal.load(path)
+    journal = BatchJournal(path)
+    journal.begin(checkpoint.trays, checkpoint)
+    journal.step(1, 'rs232_connection', True)
+    journal.close()
+    assert os.listdir(str(tmp_path)) == ['journal.jsonl']
+    resumed = BatchJournal.load(path)
+    assert resumed.started == checkpoint.started
+    assert list(resumed.steps[0]) == ['rs232_connection', 'datetime_set']
+    assert resumed.steps[1]['rs232_connection'] == StepRecord(True, None, True)
+    assert resumed.ips == {0: '10.0.0.189'}
@@ -0,0 +1,56 @@
+"""
+tests/test_Responses.py
+
+Author:
+    Zachary Smith
+"""
+import datetime
+
+from components import Responses
+
+
+def test_samples_parse_completely():
+    for name, (grammar, sample) in Responses.SAMPLES.items():
+        assert None not in grammar.parse(sample), name
+
+
+def test_adc1():
+    reading = Responses.ADC1.parse(Responses.SAMPLES['adc1'][1])
+    assert reading == Responses.CableReading(14778, 14778, 0)
+
+
+def test_adc1_leak_label_of_the_firmware():
+    # the baseline only required `distance (ohms):`
+    reading = Responses.ADC1.parse(b'external cable\r\nleg1 resistance (ohms): 1500\r\n'
+                                   b'leg2 resistance (ohms): 1501\r\ndistance (ohms): 7061\r\nok\r\n')
+    assert reading == Responses.CableReading(1500, 1501, 7061)
+
+
+def test_missing_field_is_none():
+    reading = Responses.ADC1.parse(b'external cable\r\nleg1 resistance (ohms): 1500\r\nok\r\n')
+    assert reading.leg1 == 1500
+    assert reading.leg2 is None and reading.leak is None
+
+
+def test_supply():
+    assert Responses.SUPPLY.parse(b'15v\r\n15V Supply: 15.1V\r\nok\r\n').volts == 15.1
+    assert Responses.SUPPLY.parse(b'15V Supply: 14\r\n').volts == 14.0
+    assert Responses.SUPPLY.parse(b'Unknown command\r\n').volts is None
+
+
+def test_time():
+    clock = Responses.TIME.parse(Responses.SAMPLES['time'][1]).clock
+    assert clock == datetime.datetime(2026, 10, 18, 12, 0, 0)
+
+
+def test_banner():
+    banner = Responses.BANNER.parse(Responses.SAMPLES['banner'][1])
+    assert banner.board_type == 'LD5200'
+    assert banner.mac == '00:25:96:FF:FE:12:34:56'
+    assert banner.mram and banner.duart1 and banner.duart2 and banner.ready
+
+
+def test_banner_failed_duart():
+    banner = Responses.BANNER.parse(b'Testing duart1: 1000{lc:0} failed\r\nTesting duart2: 1000{lc:0} passed\r\n')
+    assert banner.duart1 is False
+    assert banner.duart2 is True
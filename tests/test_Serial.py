@@ -0,0 +1,75 @@
+"""
+tests/test_Serial.py
+
+Author:
+    Zachary Smith
+"""
+import pytest
+
+from components.Exceptions import TimeoutException
+from components.LDBoardTester import CONSOLE_ERRORS
+from components.Serial import RingBuffer, Serial
+
+
+def wrapped(capacity=8):
+    """
+    Buffer holding b'efghijk', wrapped after its 4th byte (b'efgh' at the end of the storage).
+    """
+    buffer = RingBuffer(capacity)
+    buffer.write(b'abcdefgh')
+    buffer.read(4)
+    buffer.write(b'ijk')
+    return buffer
+
+
+def test_find_in_wrapped_buffer():
+    buffer = wrapped()
+    assert buffer.peek() == b'efghijk'
+    # tail, seam, head
+    assert buffer.find(b'fg') == 1
+    assert buffer.find(b'ghij') == 2
+    assert buffer.find(b'hi') == 3
+    assert buffer.find(b'jk') == 5
+    assert buffer.find(b'kx') == -1
+
+
+def test_find_from_offset_across_seam():
+    buffer = wrapped()
+    assert buffer.find(b'h', 3) == 3
+    assert buffer.find(b'hi', 4) == -1
+    assert buffer.find(b'i', 4) == 4
+    assert buffer.find(b'e', 1) == -1
+    assert buffer.find(b'k', 7) == -1
+
+
+def test_overwrite_drops_oldest():
+    buffer = RingBuffer(4)
+    assert buffer.write(b'abc') == 0
+    assert buffer.write(b'def') == 2
+    assert buffer.peek() == b'cdef'
+    assert buffer.find(b'cd') == 0
+    assert buffer.offset(buffer.total - 1) == 3
+
+
+@pytest.fixture
+def console(station):
+    serial = Serial(station.console.device_file)
+    yield serial
+    serial.close()
+
+
+def test_expect_success_pattern(console):
+    result = console.send_expect(b'15v\n', [r'15V Supply:[^\r\n]*\r?\n'] + CONSOLE_ERRORS)
+    assert result.index == 0
+    assert b'15V Supply: 15.1V' in result.response
+
+
+def test_expect_fails_fast_on_console_error(console):
+    result = console.send_expect(b'bogus\n', [r'15V Supply:[^\r\n]*\r?\n'] + CONSOLE_ERRORS, timeout=5)
+    assert result.index == 1
+    assert result.pattern == CONSOLE_ERRORS[0]
+
+
+def test_expect_timeout(console):
+    with pytest.raises(TimeoutException):
+        console.send_expect(b'15v\n', [r'never printed'], timeout=.5)
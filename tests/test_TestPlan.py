@@ -0,0 +1,171 @@
+"""
+tests/test_TestPlan.py
+
+Author:
+    Zachary Smith
+"""
+import pytest
+
+from components.GPIO import GPIO
+from components.LDBoard import LDBoard
+from components.LDBoardTester import LDBoardTester
+# imported under another name, pytest would collect TestPlan as a test class
+from components.TestPlan import TestPlan as Plan, PlanListener, Target, LD2100, LD5200
+from simulator.Bootloader import Bootloader
+
+
+class FakeTester(object):
+    """
+    Answers every step with the result given for its LDBoardTester method (passed by default).
+    """
+
+    def __init__(self, results=None, alive=True):
+        self.results = results if results else dict()
+        self.alive = alive
+        self.ran = list()
+
+    def console_alive(self) -> bool:
+        return self.alive
+
+    def __getattr__(self, method):
+        def run(*args):
+            self.ran.append(method)
+            return self.results.get(method, True)
+        return run
+
+
+class Recorder(PlanListener):
+
+    def __init__(self):
+        self.skipped_by = dict()
+
+    def skipped(self, step, blocker):
+        self.skipped_by[step.name] = blocker
+
+
+def names(steps):
+    return [step.name for step in steps]
+
+
+def run(board_type, results=None, alive=True, stop_on_failure=False, selected=None):
+    board = LDBoard('S1', '00:25:96:FF:FE:00:00:01', 'T1', board_type)
+    tester = FakeTester(results, alive)
+    listener = Recorder()
+    assert Plan().run(tester, board, Target(board_type, 0, None, '10.0.0.189'), names=selected,
+                          listener=listener, stop_on_failure=stop_on_failure)
+    return board, tester, listener.skipped_by
+
+
+def test_select_adds_requirements():
+    assert names(Plan().select(LD5200, ['datetime_read'])) == ['rs232_connection', 'datetime_set',
+                                                                   'datetime_read']
+    assert names(Plan().select(LD5200, ['ethernet_test'])) == ['rs232_connection', 'ip_address',
+                                                                   'ethernet_test']
+
+
+def test_select_per_board_type():
+    plan = Plan()
+    assert 'output_current' not in names(plan.select(LD2100))
+    assert 'output_current' in names(plan.select(LD5200))
+    # an LD2100's LED is read without the console
+    assert names(plan.select(LD2100, ['led_test'])) == ['led_test']
+    assert names(plan.select(LD5200, ['led_test'])) == ['rs232_connection', 'led_test']
+
+
+def test_retest_failed_and_never_run():
+    plan = Plan()
+    history = {step.name: True for step in plan.select(LD2100) if step.report}
+    history['ps_voltage'] = False
+    del history['led_test']
+    assert plan.retest(LD2100, history) == ['ps_voltage', 'led_test']
+    history.update(ps_voltage=True, led_test=True)
+    assert plan.retest(LD2100, history) == []
+
+
+def test_retest_adds_housekeeping():
+    plan = Plan()
+    history = {step.name: True for step in plan.select(LD5200) if step.report}
+    history['ip_address'] = False
+    assert plan.retest(LD5200, history) == ['ip_address', 'ip_reset']
+
+
+def test_resume_runs_what_was_not_done():
+    plan = Plan()
+    done = ['rs232_connection', 'datetime_set', 'startup_sequence', 'ps_voltage']
+    remaining = plan.resume(LD5200, done)
+    assert remaining == [name for name in names(plan.select(LD5200)) if name not in done]
+    assert plan.resume(LD5200, names(plan.select(LD5200))) == []
+
+
+def test_failed_requirement_blocks_dependents():
+    board, tester, skipped = run(LD5200, {'test_datetime_set': False})
+    assert skipped == {'datetime_read': 'datetime_set'}
+    assert board.blocked == {'datetime_read': 'datetime_set'}
+    assert 'test_datetime_read' not in tester.ran
+    assert 'test_relay' in tester.ran
+
+
+def test_lost_console_blocks_on_the_step_that_lost_it():
+    board, tester, skipped = run(LD5200, {'test_voltage': False}, alive=False)
+    assert board.test_status['rs232_connection']
+    assert not board.test_status['ps_voltage']
+    assert set(skipped.values()) == {'ps_voltage'}
+    # the network test hangs on ip_address, blocked in turn
+    assert 'ethernet_test' in skipped and 'led_test' in skipped
+    assert tester.ran[-1] == 'test_voltage'
+
+
+def test_lost_console_spares_the_ld2100_led():
+    board, tester, skipped = run(LD2100, {'test_voltage': False}, alive=False)
+    assert 'led_test' not in skipped
+    assert board.test_status['led_test']
+    assert tester.ran[-1] == 'test_led'
+
+
+def test_stop_on_failure():
+    board, tester, skipped = run(LD5200, {'test_voltage': False}, stop_on_failure=True)
+    assert not board.passing
+    assert set(skipped.values()) == {'ps_voltage'}
+    assert tester.ran == ['connect_serial', 'test_datetime_set', 'test_startup_sequence', 'test_voltage']
+
+
+def test_console_lost_on_simulated_station(station, monkeypatch):
+    board = station.boards[0]
+    handle = Bootloader.handle
+
+    def dies_on_15v(console, command, target=None):
+        if command == '15v':
+            # reboots and never comes back
+            board.booting = True
+            return
+        return handle(console, command, target)
+    monkeypatch.setattr(Bootloader, 'handle', dies_on_15v)
+    station.gpio.stage(GPIO.BOARD, 0)
+    station.gpio.commit()
+    tester = LDBoardTester(station.gpio)
+    result = LDBoard('S1', board.mac, 'T1', LD5200)
+    listener = Recorder()
+    try:
+        Plan().run(tester, result, Target(LD5200, 0, None, '10.0.0.189'),
+                       names=['ps_voltage', 'relay_test', 'datetime_read'], listener=listener)
+    finally:
+        tester.disconnect_serial()
+    assert result.test_status['rs232_connection'] and result.test_status['datetime_set']
+    assert not result.test_status['ps_voltage']
+    assert listener.skipped_by == {'relay_test': 'ps_voltage', 'datetime_read': 'ps_voltage'}
+
+
+def test_failure_on_simulated_station(station):
+    station.boards[3].supply_voltage = 12.0
+    station.gpio.stage(GPIO.BOARD, 3)
+    station.gpio.commit()
+    tester = LDBoardTester(station.gpio)
+    result = LDBoard('S3', station.boards[3].mac, 'T3', LD2100)
+    try:
+        Plan().run(tester, result, Target(LD2100, 3, None, '10.0.0.189'),
+                       names=['ps_voltage', 'datetime_read'])
+    finally:
+        tester.disconnect_serial()
+    assert dict(result.test_status) == {'rs232_connection': True, 'datetime_set': True, 'ps_voltage': False,
+                                        'datetime_read': True}
+    assert not result.passing
@@ -7,8 +7,8 @@ Author:
 
 from PyQt5.QtCore import QRunnable, QObject, pyqtSignal, pyqtSlot
 import logging
-from time import sleep
-from datetime import datetime
+import threading
+import time
 
 from pymodbus.exceptions import ConnectionException
 from components.Exceptions import ConnectionRefusalException
@@ -17,7 +17,13 @@ from serial.serialutil import SerialException
 from components.LDBoard import LDBoard
 from components.LDBoardTester import LDBoardTester
 from components.GPIO import GPIO
-from components.IOUtilities import get_log_path
+from components.TestPlan import TestPlan, PlanListener, Step, Target
+from components.IOUtilities import get_log_path, HISTORY_PATH, SIMULATED_HISTORY_PATH, JOURNAL_PATH, \
+    SIMULATED_JOURNAL_PATH
+from components.Scheduler import Scheduler, Tray
+from components.ConnectionPool import ConnectionPool
+from components.History import ResultHistory
+from components.Journal import BatchJournal
 
 _LOGGER = logging.getLogger()
 
@@ -31,12 +37,81 @@ class WorkerSignals(QObject):
     debug_update = pyqtSignal(tuple)
     alert = pyqtSignal(tuple)
     status_bar = pyqtSignal(str)
+    tray_finished = pyqtSignal(int)     # rolling loading: the tray's board can be swapped
+
+
+class _TrayLogFilter(logging.Filter):
+    """
+    Passes the records of the tray whose thread created it: those of its thread and of the threads
+    named after it (see Scheduler.THREAD). Warnings and errors of threads working for no tray
+    (station, simulator) go to every tray's log, so none is lost.
+    """
+
+    def __init__(self):
+        super(_TrayLogFilter, self).__init__()
+        self.thread = threading.current_thread().name
+
+    def filter(self, record) -> bool:
+        if record.threadName == self.thread or record.threadName.startswith(self.thread + '-'):
+            return True
+        return record.levelno >= logging.WARNING and not record.threadName.startswith(Scheduler.THREAD.format(''))
+
+
+class _TrayListener(PlanListener):
+    """
+    Reports a tray's test plan to the GUI, and journals it.
+    """
+
+    def __init__(self, thread, tray: int, target: Target):
+        self.thread = thread
+        self.tray = tray
+        self.target = target
+        self.curr = thread.gui.objects[tray]
+
+    def proceed(self, step: Step) -> bool:
+        return not self.thread.check_signals(self.tray)
+
+    def started(self, step: Step):
+        self.thread.signals.debug_update.emit((self.tray, "Running: " + step.label))
+
+    def finished(self, step: Step, result: bool):
+        self.thread.journal.step(self.tray, step.name, result, report=step.report)
+        if step.method == 'configure_ip_address' and result:
+            self.thread.journal.assigned(self.tray, step.args(self.target)[0])
+        if step.report:
+            self.curr['tests_finished'] += 1
+        self.curr['passing'] = self.curr['passing'] and result
+        self.thread.signals.update.emit((self.tray, "Done: " + step.label))
+
+    def skipped(self, step: Step, blocker: str):
+        self.thread.journal.step(self.tray, step.name, False, blocker, step.report)
+        if step.report:
+            self.curr['tests_finished'] += 1
+        self.curr['passing'] = False
+        self.thread.signals.update.emit((self.tray, "Skipped: {} (blocked by {})".format(step.label, blocker)))
+
+    def error(self, step: Step, exception: Exception) -> bool:
+        if not isinstance(exception, ConnectionException):
+            return False
+        if exception.string:
+            _LOGGER.error(exception.string)
+        _LOGGER.error('USB to RS485(ModBus) adapter failed to connect.')
+        self.thread.signals.alert.emit(("USB/RS485 Connection Refused",
+                                        "Check that no other processes are using"
+                                        "it and that it is plugged in."))
+        return True
 
 
 class SeaLionThread(QRunnable):
     """
     Worker thread. Executes all tests on LDBoards.
     """
+
+    SIMULATION_SPEED = 100  # virtual seconds per second in debug mode
+    # what the journal keeps of each tray to resume it (see gui.objects below)
+    MANIFEST = ('board_type', 'identifier', 'GPIO_address', 'mac', 'serial', 'stop_on_failure', 'retest_failed')
+    LOGGING_FORMAT = '%(levelname)s::%(message)s'
+
     def __init__(self, gui_instance):
         """
         Constructor
@@ -47,19 +122,30 @@ class SeaLionThread(QRunnable):
         super(SeaLionThread, self).__init__()
         self.gui = gui_instance
         self.signals = WorkerSignals()
-
-    def __check_signals(self, tray: int) -> bool:
+        self.plan = TestPlan()
+        self.pool = None    # ConnectionPool of the running batch
+        self.scheduler = None
+        # simulated boards are kept out of the station's history and journal
+        self.history = ResultHistory(SIMULATED_HISTORY_PATH if self.gui.debug else HISTORY_PATH)
+        self.journal = BatchJournal(SIMULATED_JOURNAL_PATH if self.gui.debug else JOURNAL_PATH)
+        # debug runs against a simulated station on a virtual clock (started by run)
+        self.station = None
+        if self.gui.debug:
+            from simulator.Station import SimulatedStation
+            self.station = SimulatedStation(speed=self.SIMULATION_SPEED)
+
+    def check_signals(self, tray: int) -> bool:
         while self.gui.pause:
             print('Pause ack')
+            # blink on wall time, whatever the station clock
             self.signals.debug_update.emit((tray, "Paused"))
-            sleep(0.35)
+            time.sleep(0.35)
             self.signals.debug_update.emit((tray, ""))
-            sleep(0.35)
+            time.sleep(0.35)
             pass
         if self.gui.cancel:
             print('Cancel ack')
             self.signals.debug_update.emit((tray, "Cancelled"))
-            self.signals.finished.emit()
             return True
         return False
 
@@ -76,366 +162,188 @@ class SeaLionThread(QRunnable):
         ['tests_total'] = int
         ['tests_finished'] = int
         ['passing'] = bool
-        ['ethernet_participate'] = bool
+        ['stop_on_failure'] = True (skip the tray's remaining tests after its first failure)
+        ['retest_failed'] = True (run only the tests the board failed or never ran, see ResultHistory)
+        ['checkpoint'] = Checkpoint of the interrupted batch this one resumes (see BatchJournal.load)
     """
     @pyqtSlot()
     def run(self):
+        gpio = self.station.start() if self.station else GPIO()
+        # an exception ending a helper thread is logged by that thread, into its tray's log
+        excepthook, threading.excepthook = threading.excepthook, self._log_thread_exception
+        try:
+            self._run_batch(gpio)
+        finally:
+            threading.excepthook = excepthook
+            if self.station:
+                self.station.stop()
+
+    @staticmethod
+    def _log_thread_exception(args):
+        _LOGGER.error('SeaLionThread::run:: {} died.'.format(args.thread.name if args.thread else 'Thread'),
+                      exc_info=(args.exc_type, args.exc_value, args.exc_traceback))
+
+    def _run_batch(self, gpio: GPIO):
         gui = self.gui
-        logging_format = '%(levelname)s::%(message)s'
-        if not gui.debug:
-            gpio = GPIO()
-        else:
-            gpio = None
+        # trays run concurrently, each thread logs to its tray's file (see _TrayLogFilter)
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+        logging.root.setLevel(logging.INFO)
+        scheduler = self.scheduler = Scheduler(gpio)
+        jobs = dict()
+        manifest = dict()
+        checkpoint = None
         for i in range(6):
-            # check for signals
-            if self.__check_signals(i):
-                return
-
             # ensure object is active
             if not gui.objects[i]['active']:
                 gui.objects[i]['log_path'] = None
                 continue
-            curr = gui.objects[i]
-            test_container = LDBoard(curr['serial'], curr['mac'],
-                                     curr['identifier'], curr['board_type'])
-            curr['test_container'] = test_container
-
-            # setup logging
-            # writes to logging directory with identifier
-            for handler in logging.root.handlers[:]:
-                logging.root.removeHandler(handler)
-            path = get_log_path(curr['identifier'])
-            logging.basicConfig(filename=path, filemode='a', level=logging.INFO,
-                                format=logging_format)
-            curr['log_path'] = path
-
-            # Info log
-            _LOGGER.info('Current log path: {}'.format(curr['log_path']))
-            _LOGGER.info('Board/tray: {}'.format(curr['identifier']))
-            _LOGGER.info('Serial number: {}'.format(curr['serial']))
-            _LOGGER.info('MAC address: {}\n'.format(curr['mac']))
-
-            # GPIO
-            if not gui.debug:
-                gpio.stage(GPIO.BOARD, state=curr['GPIO_address'])
-                gpio.commit()
-
-            # Setup progress bar
-            curr['tests_total'] = 13 if curr['board_type'] == LDBoardTester.LD5200 else 12
-            curr['tests_finished'] = 0
-
-            curr['passing'] = True
-            curr['ethernet_participate'] = False
-
-            ld_board = LDBoardTester(gpio)
-            try:
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # serial connection
-                self.signals.debug_update.emit((i, "Writing MAC address"))
-                if not gui.debug:
-                    result = ld_board.connect_serial(curr['mac'])
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('rs232_connection', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Writing MAC address"))
-                if not result:
-                    continue
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # datetime set
-                self.signals.debug_update.emit((i, "Running: Datetime write"))
-                if not gui.debug:
-                    result = ld_board.test_datetime_set()
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('datetime_set', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Datetime write"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # startup sequence
-                self.signals.debug_update.emit((i, "Running: Startup sequence test"))
-                if not gui.debug:
-                    result = ld_board.test_startup_sequence(curr['board_type'])
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('startup_sequence', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Startup sequence test"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # power supply voltage
-                self.signals.debug_update.emit((i, "Running: Voltage level check"))
-                if not gui.debug:
-                    result = ld_board.test_voltage()
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('ps_voltage', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Voltage level check"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # relay test
-                self.signals.debug_update.emit((i, "Running: Relay test"))
-                if not gui.debug:
-                    # signalling test to use either (I0, I1) or (I2, I3)
-                    relays = None
-                    if curr['board_type'] == LDBoardTester.LD2100:
-                        relays = 'last2' if curr['GPIO_address'] == 4 else 'first2'
-                    result = ld_board.test_relay(curr['board_type'], relays)
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('relay_test', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Relay test"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # length emulator
-                self.signals.debug_update.emit((i, "Running: Cable emulator (length)"))
-                if not gui.debug:
-                    result = ld_board.test_length_detector(curr['board_type'])
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('length_detection', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Cable emulator (length)"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # short emulator
-                self.signals.debug_update.emit((i, "Running: Cable emulator (short)"))
-                if not gui.debug:
-                    result = ld_board.test_short_detector(curr['board_type'])
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('short_detection', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Cable emulator (short)"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # RS485 modbus
-                try:
-                    self.signals.debug_update.emit((i, "Running: RS485 ModBus"))
-                    if not gui.debug:
-                        # LD5200 3 -> 3
-                        # LD5200 4 -> 2
-                        # LD5200 5 -> 1
-                        if curr['GPIO_address'] == 3:
-                            gpio.stage(GPIO.RS485, 2)
-                            gpio.commit()
-                        elif curr['GPIO_address'] == 4:
-                            gpio.stage(GPIO.RS485, 1)
-                            gpio.commit()
-                        elif curr['GPIO_address'] == 5:
-                            gpio.stage(GPIO.RS485, 0)
-                            gpio.commit()
-                        sleep(.1)
-                        result = ld_board.test_modbus(curr['board_type'])
-                    else:
-                        result = True
-                        sleep(2)
-                    test_container.process_test_result('rs485_modbus', result)
-                    curr['tests_finished'] += 1
-                    curr['passing'] = curr['passing'] and result
-                    self.signals.update.emit((i, "Done: RS485 ModBus"))
-                except ConnectionException as e:
-                    if e.string:
-                        _LOGGER.error(e.string)
-                    _LOGGER.error('USB to RS485(ModBus) adapter failed to connect.')
-                    self.signals.alert.emit(("USB/RS485 Connection Refused",
-                                             "Check that no other processes are using"
-                                             "it and that it is plugged in."))
-                    curr['passing'] = False
-                # turn off
-                gpio.stage(GPIO.RS485, 3)
-                gpio.commit()
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # RS485 ModBus
-                self.signals.debug_update.emit((i, "Running: Datetime read"))
-                if not gui.debug:
-                    result = ld_board.test_datetime_read()
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('datetime_read', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: Datetime read"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # write ip address
-                self.signals.debug_update.emit((i, "Assigned " + LDBoardTester.ip_addresses[i]))
-                if not gui.debug:
-                    result = ld_board.configure_ip_address(LDBoardTester.ip_addresses[i])
-                else:
-                    result = True
-                    sleep(2)
-                curr['tests_finished'] += 1
-                curr['ethernet_participate'] = result
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done writing IP address"))
-
-                _LOGGER.info('--')  # line break in log
-                # check for signals
-                if self.__check_signals(i):
-                    return
-
-                # LED test
-                self.signals.debug_update.emit((i, "Running: LED test"))
-                if not gui.debug:
-                    result = ld_board.test_led(curr['board_type'])
-                else:
-                    result = True
-                    sleep(2)
-                test_container.process_test_result('led_test', result)
-                curr['tests_finished'] += 1
-                curr['passing'] = curr['passing'] and result
-                self.signals.update.emit((i, "Done: LED test"))
-
-                _LOGGER.info('--')  # line break in log
-                # 4-20 mA test
-                if curr['board_type'] == LDBoardTester.LD5200:
-                    # check for signals
-                    if self.__check_signals(i):
-                        return
-
-                    self.signals.debug_update.emit((i, "Running: Current source"))
-                    if not gui.debug:
-                        result = ld_board.output_current()
-                    else:
-                        result = True
-                        sleep(2)
-                    test_container.process_test_result('output_current', result)
-                    curr['tests_finished'] += 1
-                    curr['passing'] = curr['passing'] and result
-                    self.signals.update.emit((i, "Done: Current source"))
-
-                self.signals.update.emit((i, "Waiting for others"))
-            except ConnectionRefusalException:
-                _LOGGER.error("RS232 connection refused.")
-                test_container.process_test_result('rs232_connection', False)
-                curr['active'] = False
-                curr['passing'] = False
-                self.signals.update.emit((i, "RS232 connection issue"))
-            except SerialException as e:
-                if e.strerror:
-                    _LOGGER.error(e.strerror)
-                _LOGGER.error('USB to RS232 adapter failed to connect.')
-                self.signals.alert.emit(("USB/RS232 Connection Refused",
-                                         "Check that no other processes are using it."))
-                curr['active'] = False
-                curr['passing'] = False
-                self.signals.update.emit((i, "RS232 connection issue"))
-            except OSError as e:
-                if e.strerror:
-                    _LOGGER.error(e.strerror)
-                _LOGGER.error('I2C connection issue. Check wires.')
-                self.signals.alert.emit(("I2C Connection Failed", "Check signal wires for ADC."))
-                curr['active'] = False
-                curr['passing'] = False
-                self.signals.update.emit((i, "I2C connection issue"))
-
-        # conduct ethernet tests
-        for i in range(6):
-            if not gui.objects[i]['active']:
-                continue
-            # setup logging
-            # writes to logging directory with identifier
-            for handler in logging.root.handlers[:]:
-                logging.root.removeHandler(handler)
-            path = curr['log_path']
-            logging.basicConfig(filename=path, filemode='a', level=logging.INFO,
-                                format=logging_format)
-
-            curr = gui.objects[i]
-            test_container = curr['test_container']
-
-            if not gui.objects[i]['ethernet_participate']:
-                _LOGGER.info(test_container.results())
-                continue
-
-            # check for signals
-            if self.__check_signals(i):
-                return
-
-            ld_board = LDBoardTester(gpio)
-            # ethernet test
-            self.signals.debug_update.emit((i, "Running: Ethernet test"))
-            if not gui.debug:
-                result = ld_board.test_ethernet(LDBoardTester.ip_addresses[i])
-                self.signals.debug_update.emit((i, "Running: Resetting IP to 10.0.0.188"))
-                gpio.stage(GPIO.BOARD, state=curr['GPIO_address'])
-                gpio.commit()
-                ld_board.connect_serial()
-                if not ld_board.configure_ip_address('10.0.0.188'):
-                    self.signals.debug_update.emit((i, "Error with IP address assignment"))
-                    sleep(3)
-                    curr['passing'] = False
+            jobs[scheduler.tray(i, gui.objects[i]['GPIO_address'])] = self._run_tray
+            manifest[i] = {key: gui.objects[i].get(key) for key in self.MANIFEST}
+            checkpoint = gui.objects[i].get('checkpoint') or checkpoint
+        self.journal.begin(manifest, checkpoint)
+        try:
+            # the trays take turns on the same ports, opened once for the batch
+            with ConnectionPool() as self.pool:
+                scheduler.run(jobs)
+        finally:
+            # a cancelled batch stays resumable
+            if gui.cancel:
+                self.journal.close()
             else:
-                result = True
-                sleep(2)
-            test_container.process_test_result('ethernet_test', result)
-            _LOGGER.info(test_container.results())
-            curr['tests_finished'] += 1
-            curr['passing'] = curr['passing'] and result
-            self.signals.update.emit((i, "Done: Ethernet test"))
+                self.journal.end()
 
         # signal to GUI
         # process finished
         self.signals.finished.emit()
 
+    def admit(self, tray: int):
+        """
+        Tests a tray reloaded while the batch runs (gui.rolling), see tray_finished.
+        Called from the GUI once gui.objects[tray] has the new board's identifiers.
+
+        Args:
+            tray: Tray index (0-5)
+        """
+        curr = self.gui.objects[tray]
+        curr['checkpoint'] = None
+        self.journal.admitted(tray, {key: curr.get(key) for key in self.MANIFEST})
+        self.scheduler.admit(self.scheduler.tray(tray, curr['GPIO_address']), self._run_tray)
+
+    def withdraw(self, tray: int):
+        """
+        The tray announced by tray_finished stays empty.
+        """
+        _LOGGER.info('SeaLionThread::withdraw:: Tray {} left empty.'.format(tray))
+        self.scheduler.withdraw()
+
+    def _run_tray(self, tray: Tray):
+        """
+        Tests one tray. Runs on the tray's own thread (see Scheduler.run).
+
+        Args:
+            tray: Tray to test
+        """
+        gui = self.gui
+        i = tray.index
+        # check for signals
+        if self.check_signals(i):
+            return
+        curr = gui.objects[i]
+        test_container = LDBoard(curr['serial'], curr['mac'],
+                                 curr['identifier'], curr['board_type'])
+        curr['test_container'] = test_container
+
+        # setup logging
+        # writes to logging directory with identifier
+        path = get_log_path(curr['identifier'])
+        handler = logging.FileHandler(path, mode='a')
+        handler.setFormatter(logging.Formatter(self.LOGGING_FORMAT))
+        handler.addFilter(_TrayLogFilter())
+        logging.root.addHandler(handler)
+        curr['log_path'] = path
+        try:
+            self._test_tray(tray)
+        finally:
+            logging.root.removeHandler(handler)
+            handler.close()
+        if gui.rolling and not gui.cancel:
+            # the batch goes on while the operator swaps the board (see admit, withdraw)
+            tray.scheduler.expect()
+            self.signals.tray_finished.emit(i)
+
+    def _test_tray(self, tray: Tray):
+        """
+        Runs the test plan (see components/TestPlan.py) for one tray.
 
+        Args:
+            tray: Tray to test
+        """
+        gui = self.gui
+        i = tray.index
+        curr = gui.objects[i]
+        test_container = curr['test_container']
+
+        # Info log
+        _LOGGER.info('Current log path: {}'.format(curr['log_path']))
+        _LOGGER.info('Board/tray: {}'.format(curr['identifier']))
+        _LOGGER.info('Serial number: {}'.format(curr['serial']))
+        _LOGGER.info('MAC address: {}\n'.format(curr['mac']))
+
+        names = None
+        if curr.get('retest_failed'):
+            names = self.plan.retest(curr['board_type'], self.history.load(curr['serial'], curr['mac']))
+            _LOGGER.info('Retesting: {}\n'.format(', '.join(names) if names else 'nothing, every test passed'))
+        done = curr['checkpoint'].steps.get(i, dict()) if curr.get('checkpoint') else dict()
+        if done:
+            # results of the interrupted batch stand, its unfinished steps run
+            for name, record in done.items():
+                if not record.report:
+                    continue
+                if record.blocker:
+                    test_container.process_test_skipped(name, record.blocker)
+                else:
+                    test_container.process_test_result(name, record.result)
+            names = self.plan.resume(curr['board_type'], done, names)
+            _LOGGER.info('Resuming: {}\n'.format(', '.join(names) if names else 'nothing, the tray had finished'))
+
+        # Setup progress bar, the tests passed before count as done
+        curr['tests_total'] = self.plan.total(curr['board_type'])
+        curr['tests_finished'] = curr['tests_total'] - self.plan.total(curr['board_type'], names)
+
+        curr['passing'] = test_container.passing
+
+        ld_board = LDBoardTester(tray.scheduler.gpio, tray=tray, pool=self.pool)
+        target = Target(curr['board_type'], curr['GPIO_address'], curr['mac'], LDBoardTester.ip_addresses[i])
+        stubbed = self.station.UNSIMULATED if self.station else ()
+        try:
+            if not self.plan.run(ld_board, test_container, target, names=names, tray=tray, stubbed=stubbed,
+                                 listener=_TrayListener(self, i, target), stop_on_failure=curr.get('stop_on_failure')):
+                return
+        except ConnectionRefusalException:
+            _LOGGER.error("RS232 connection refused.")
+            test_container.process_test_result('rs232_connection', False)
+            curr['active'] = False
+            curr['passing'] = False
+            self.signals.update.emit((i, "RS232 connection issue"))
+        except SerialException as e:
+            if e.strerror:
+                _LOGGER.error(e.strerror)
+            _LOGGER.error('USB to RS232 adapter failed to connect.')
+            self.signals.alert.emit(("USB/RS232 Connection Refused",
+                                     "Check that no other processes are using it."))
+            curr['active'] = False
+            curr['passing'] = False
+            self.signals.update.emit((i, "RS232 connection issue"))
+        except OSError as e:
+            if e.strerror:
+                _LOGGER.error(e.strerror)
+            _LOGGER.error('I2C connection issue. Check wires.')
+            self.signals.alert.emit(("I2C Connection Failed", "Check signal wires for ADC."))
+            curr['active'] = False
+            curr['passing'] = False
+            self.signals.update.emit((i, "I2C connection issue"))
+        finally:
+            ld_board.disconnect_serial()
+            self.history.record(test_container)
+        _LOGGER.info(test_container.results())
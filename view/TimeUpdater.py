@@ -7,9 +7,7 @@ Author:
 
 from PyQt5.QtCore import QRunnable, pyqtSlot
 import logging
-from datetime import datetime
-from time import sleep
-
+from components.Clock import now, sleep
 from view.SeaLionThread import WorkerSignals
 
 _LOGGER = logging.getLogger()
@@ -28,7 +26,7 @@ class TimeUpdater(QRunnable):
     def run(self):
         while self.gui.testing:
             sleep(1)
-            difference = datetime.now() - self.gui.test_start
+            difference = now() - self.gui.test_start
             difference = divmod(difference.total_seconds(), 60)
             self.signals.status_bar.emit('{} min {} sec'.format(int(difference[0]),
                                                                 int(difference[1])))